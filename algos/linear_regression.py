@@ -1,10 +1,138 @@
 """Linear regression algo module."""
-import constants
 import datetime
 import logger
-import pandas
-import statistics
-from sklearn import linear_model
+import metrics
+import numpy
+
+class LinearRegressionAnalysis:
+    """Object to store results from a least-squares fit of price over time."""
+    def __init__(self, slope, intercept, residualStandardDeviation, trendPrice, count):
+        self.slope = slope  # price change per second
+        self.intercept = intercept  # price at unix timestamp 0
+        self.residual_standard_deviation = residualStandardDeviation
+        self.trend_price = trendPrice
+        self.count = count
+
+class RegressionAccumulator:
+    """Object to maintain running sums of a one-variable least-squares fit of prices over timestamps.
+
+    Timestamps are offset by the first timestamp added so the sums of squares
+    keep their precision.
+    """
+    def __init__(self, origin=None, count=0, xSum=0.0, ySum=0.0, xySum=0.0, xSquaredSum=0.0, ySquaredSum=0.0):
+        self.origin = origin
+        self.count = count
+        self.xSum = xSum
+        self.ySum = ySum
+        self.xySum = xySum
+        self.xSquaredSum = xSquaredSum
+        self.ySquaredSum = ySquaredSum
+
+    def add(self, timestamps, prices):
+        """Add prices to the running sums."""
+        x, y = self._center(timestamps, prices)
+        self.count += x.size
+        self.xSum += float(x.sum())
+        self.ySum += float(y.sum())
+        self.xySum += float(numpy.dot(x, y))
+        self.xSquaredSum += float(numpy.dot(x, x))
+        self.ySquaredSum += float(numpy.dot(y, y))
+
+    def remove(self, timestamps, prices):
+        """Remove prices that aged out of the window from the running sums."""
+        x, y = self._center(timestamps, prices)
+        self.count -= x.size
+        self.xSum -= float(x.sum())
+        self.ySum -= float(y.sum())
+        self.xySum -= float(numpy.dot(x, y))
+        self.xSquaredSum -= float(numpy.dot(x, x))
+        self.ySquaredSum -= float(numpy.dot(y, y))
+
+    def fit(self, timestamp=None):
+        """Fit the least-squares line of the accumulated prices (trend price at a timestamp, defaulting to now)."""
+        if self.count < 2:
+            raise RuntimeError("at least 2 prices are required to fit a line")
+        slope, centeredIntercept, residualStandardDeviation = _solve(self.count, self.xSum, self.ySum, self.xySum,
+                                                                     self.xSquaredSum, self.ySquaredSum)
+        timestamp = timestamp or datetime.datetime.utcnow().timestamp()
+        return LinearRegressionAnalysis(slope,
+                                        centeredIntercept - slope * self.origin,
+                                        residualStandardDeviation,
+                                        centeredIntercept + slope * (timestamp - self.origin),
+                                        self.count)
+
+    def _center(self, timestamps, prices):
+        """Offset timestamps by the origin (set on the first addition)."""
+        timestamps = numpy.asarray(timestamps, dtype=float)
+        if self.origin is None and timestamps.size:
+            self.origin = float(timestamps[0])
+        return timestamps - (self.origin or 0.0), numpy.asarray(prices, dtype=float)
+
+class RollingRegression:
+    """Object to fit prices within a rolling time window, updated one snapshot at a time.
+
+    Prices within the window are held in a ring buffer (grown only when the
+    window outgrows it), so each price is copied and removed once.
+    """
+    def __init__(self, windowSec, capacity=1024):
+        self.windowSec = windowSec
+        self.accumulator = RegressionAccumulator()
+        self.timestamps = numpy.empty(capacity)
+        self.prices = numpy.empty(capacity)
+        self.start = 0  # index of the oldest price
+        self.count = 0
+
+    def update(self, timestamps, prices):
+        """Add new prices, remove prices older than the window and fit the window (None until 2 prices are held)."""
+        timestamps, prices = numpy.atleast_1d(numpy.asarray(timestamps, dtype=float)), numpy.atleast_1d(numpy.asarray(prices, dtype=float))
+        if not timestamps.size:
+            return self._fit()
+        self.accumulator.add(timestamps, prices)
+        self._append(timestamps, prices)
+
+        # remove prices that aged out of the window
+        cutoff = timestamps[-1] - self.windowSec
+        expired = 0
+        for windowTimestamps, windowPrices in self._segments(self.count):
+            segmentExpired = int(numpy.searchsorted(windowTimestamps, cutoff, side="left"))
+            if segmentExpired:
+                self.accumulator.remove(windowTimestamps[:segmentExpired], windowPrices[:segmentExpired])
+            expired += segmentExpired
+            if segmentExpired < len(windowTimestamps):
+                break
+        self.start = (self.start + expired) % len(self.timestamps)
+        self.count -= expired
+        return self._fit()
+
+    def _fit(self):
+        """Fit the window at its latest price."""
+        if self.accumulator.count < 2:
+            return None
+        latest = (self.start + self.count - 1) % len(self.timestamps)
+        return self.accumulator.fit(timestamp=float(self.timestamps[latest]))
+
+    def _append(self, timestamps, prices):
+        """Append prices to the ring buffer, growing it if full."""
+        capacity = len(self.timestamps)
+        if self.count + timestamps.size > capacity:
+            capacity = max(2 * capacity, self.count + timestamps.size)
+            segments = self._segments(self.count)
+            self.timestamps = numpy.concatenate([segment for segment, _ in segments] + [numpy.empty(capacity - self.count)])
+            self.prices = numpy.concatenate([segment for _, segment in segments] + [numpy.empty(capacity - self.count)])
+            self.start = 0
+        positions = (self.start + self.count + numpy.arange(timestamps.size)) % capacity
+        self.timestamps[positions] = timestamps
+        self.prices[positions] = prices
+        self.count += timestamps.size
+
+    def _segments(self, count):
+        """Get views of the oldest prices in the ring buffer (in up to two contiguous segments)."""
+        capacity = len(self.timestamps)
+        end = self.start + count
+        if end <= capacity:
+            return [(self.timestamps[self.start:end], self.prices[self.start:end])]
+        return [(self.timestamps[self.start:], self.prices[self.start:]),
+                (self.timestamps[:end - capacity], self.prices[:end - capacity])]
 
 class LinearRegression:
     """Object to represent a linear regression model."""
@@ -16,28 +144,73 @@ class LinearRegression:
         # generate model
         self.generate()
 
+    @metrics.timed("linear_regression.generate")
     def generate(self):
         """Generate a linear regression model from historical price data."""
-        # format dataset
-        self.dataset = {"unix_timestamp": [], "price": []}
-        for prices in self.priceHistory:
-            unixTimestamp = prices.get("utc_datetime").timestamp()
-            price = statistics.mean([prices.get("ask"), prices.get("bid")])
-            self.dataset["unix_timestamp"].append(unixTimestamp)
-            self.dataset["price"].append(price)
-
         # add current price to dataset
-        self.dataset["unix_timestamp"].append(datetime.datetime.utcnow().timestamp())
-        self.dataset["price"].append(self.currentPrice)
-
-        # instantiate pandas dataframe
-        self.dataframe = pandas.DataFrame.from_dict(self.dataset)
-        self.timestamps = self.dataframe.iloc[:, 0].values.reshape(-1, 1)
-        self.prices = self.dataframe.iloc[:, 1].values.reshape(-1, 1)
-
-        # generate sklearn linear regression model
-        self.model = linear_model.LinearRegression()
-        self.model.fit(self.timestamps, self.prices)
-        self.trend = self.model.predict(self.timestamps)
-        self.trendPrice = self.trend[-1][0]
-        self.logger.log("generated model from %i price points" % len(self.prices))
+        self.timestamps = numpy.append(self.priceHistory.timestamps, datetime.datetime.utcnow().timestamp())
+        self.prices = numpy.append(self.priceHistory.mid, self.currentPrice)
+
+        # fit least-squares line from running sums
+        self.accumulator = RegressionAccumulator()
+        self.accumulator.add(self.timestamps, self.prices)
+        self.analysis = self.accumulator.fit(timestamp=float(self.timestamps[-1]))
+        self.trend = self.analysis.intercept + self.analysis.slope * self.timestamps
+        self.trendPrice = self.analysis.trend_price
+        self.logger.debug("generated model", fields={"prices": len(self.prices)})
+        return self.analysis
+
+    @classmethod
+    @metrics.timed("linear_regression.generateMany")
+    def generateMany(cls, currentPrices, priceHistories):
+        """Fit the price histories of multiple cryptocurrencies (with current prices) at once."""
+        now = datetime.datetime.utcnow().timestamp()
+        tickers = [ticker for ticker in priceHistories if ticker in currentPrices]
+        if not tickers:
+            return {}
+        sizes = numpy.array([len(priceHistories.get(ticker)) + 1 for ticker in tickers])
+        starts = numpy.concatenate([[0], numpy.cumsum(sizes)[:-1]])
+
+        # concatenate histories with current prices, offset by the first timestamp of each cryptocurrency
+        timestamps = numpy.concatenate([numpy.append(priceHistories.get(ticker).timestamps, now) for ticker in tickers])
+        prices = numpy.concatenate([numpy.append(priceHistories.get(ticker).mid, _midPrice(currentPrices.get(ticker)))
+                                    for ticker in tickers])
+        origins = timestamps[starts]
+        x = timestamps - numpy.repeat(origins, sizes)
+
+        # sum each cryptocurrency at once and solve all fits
+        slopes, centeredIntercepts, residualStandardDeviations = _solve(sizes,
+                                                                        numpy.add.reduceat(x, starts),
+                                                                        numpy.add.reduceat(prices, starts),
+                                                                        numpy.add.reduceat(x * prices, starts),
+                                                                        numpy.add.reduceat(x * x, starts),
+                                                                        numpy.add.reduceat(prices * prices, starts))
+        analyses = {}
+        for i, ticker in enumerate(tickers):
+            analyses[ticker] = LinearRegressionAnalysis(float(slopes[i]),
+                                                        float(centeredIntercepts[i] - slopes[i] * origins[i]),
+                                                        float(residualStandardDeviations[i]),
+                                                        float(centeredIntercepts[i] + slopes[i] * (now - origins[i])),
+                                                        int(sizes[i]))
+        return analyses
+
+def _midPrice(prices):
+    """Get the mid price of current prices."""
+    return (prices.get("ask") + prices.get("bid")) / 2
+
+def _solve(count, xSum, ySum, xySum, xSquaredSum, ySquaredSum):
+    """Solve least-squares lines from running sums (scalars or arrays of sums).
+
+    Returns:
+        slope, intercept and residual standard deviation (n - 2 degrees of freedom)
+    """
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        xVariance = xSquaredSum - xSum * xSum / count
+        covariance = xySum - xSum * ySum / count
+        slope = numpy.where(xVariance > 0, covariance / xVariance, 0.0)
+        intercept = (ySum - slope * xSum) / count
+        residualsSquaredSum = numpy.maximum(ySquaredSum - ySum * ySum / count - slope * covariance, 0.0)
+        residualStandardDeviation = numpy.sqrt(numpy.where(count > 2, residualsSquaredSum / (count - 2), 0.0))
+    if numpy.ndim(slope) == 0:
+        return float(slope), float(intercept), float(residualStandardDeviation)
+    return slope, intercept, residualStandardDeviation
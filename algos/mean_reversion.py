@@ -2,6 +2,8 @@
 import constants
 import logger
 import math
+import metrics
+import numpy
 import statistics
 
 class MeanReversionAnalysis:
@@ -14,6 +16,42 @@ class MeanReversionAnalysis:
         self.lookback_days = constants.LOOKBACK_DAYS
         self.standard_deviation = standardDeviation
 
+class DeviationAccumulator:
+    """Object to maintain running sums of price deviations from the VWAP."""
+    def __init__(self, count=0, deviationSum=0.0, deviationsSquaredSum=0.0):
+        self.count = count
+        self.deviationSum = deviationSum
+        self.deviationsSquaredSum = deviationsSquaredSum
+
+    @property
+    def standardDeviation(self):
+        """Standard deviation of prices from the VWAP."""
+        if not self.count:
+            raise RuntimeError("no price deviations accumulated")
+        return math.sqrt(max(self.deviationsSquaredSum, 0.0) / self.count)
+
+    def add(self, prices, vwaps):
+        """Add price deviations to the running sums."""
+        deviations = numpy.asarray(prices, dtype=float) - numpy.asarray(vwaps, dtype=float)
+        self.count += deviations.size
+        self.deviationSum += float(deviations.sum())
+        self.deviationsSquaredSum += float(numpy.square(deviations).sum())
+
+    def addMoving(self, prices, vwaps):
+        """Add price deviations and get the cumulative moving standard deviation after each one."""
+        deviationsSquared = numpy.square(numpy.asarray(prices, dtype=float) - numpy.asarray(vwaps, dtype=float))
+        deviationsSquaredSums = self.deviationsSquaredSum + numpy.cumsum(deviationsSquared)
+        counts = self.count + numpy.arange(1, deviationsSquared.size + 1)
+        self.add(prices, vwaps)
+        return numpy.sqrt(deviationsSquaredSums / counts)
+
+    def remove(self, prices, vwaps):
+        """Remove price deviations that aged out of the lookback window from the running sums."""
+        deviations = numpy.asarray(prices, dtype=float) - numpy.asarray(vwaps, dtype=float)
+        self.count -= deviations.size
+        self.deviationSum -= float(deviations.sum())
+        self.deviationsSquaredSum -= float(numpy.square(deviations).sum())
+
 class MeanReversion:
     """Object to analyze price deviation from the mean."""
     def __init__(self, currentPrices, priceHistory):
@@ -23,43 +61,87 @@ class MeanReversion:
         self.priceHistory = priceHistory
 
         # expose for visualizations
-        self.upperBollinger = []
-        self.lowerBollinger = []
+        self.upperBollinger = numpy.array([])
+        self.lowerBollinger = numpy.array([])
 
+    @metrics.timed("mean_reversion.analyze")
     def analyze(self):
         """Analyze the current price deviation from the mean."""
-        # collect price deviations from the volume-weighted average price
-        deviationsSquaredSum = 0.0
-        for i, historicalPrices in enumerate(self.priceHistory, 1):
-            price = self.calculatePrice(historicalPrices)
-            vwap = historicalPrices.get("vwap")
-            priceDeviation = abs(price - vwap)
-            deviationsSquaredSum += priceDeviation ** 2
-
-            # aggregate bollinger bands for visualizations
-            movingStandardDeviation = math.sqrt(deviationsSquaredSum / i)
-            self.upperBollinger.append([vwap + (movingStandardDeviation * constants.PERCENT_DEVIATION_OPEN_THRESHOLD)])
-            self.lowerBollinger.append([vwap - (movingStandardDeviation * constants.PERCENT_DEVIATION_OPEN_THRESHOLD)])
-
-        # calculate standard deviation
-        standardDeviation = math.sqrt(deviationsSquaredSum / len(self.priceHistory))
-
-        # add final bollinger band
-        self.upperBollinger.append([self.currentVWAP + (standardDeviation * constants.PERCENT_DEVIATION_OPEN_THRESHOLD)])
-        self.lowerBollinger.append([self.currentVWAP - (standardDeviation * constants.PERCENT_DEVIATION_OPEN_THRESHOLD)])
+        # calculate moving standard deviation of prices from the volume-weighted average price
+        vwaps = self.priceHistory.vwap
+        movingStandardDeviations = calculateMovingStandardDeviations(self.priceHistory.mid, vwaps)
+        standardDeviation = float(movingStandardDeviations[-1])
+
+        # aggregate bollinger bands (including current) for visualizations
+        vwaps = numpy.append(vwaps, self.currentVWAP)
+        movingStandardDeviations = numpy.append(movingStandardDeviations, standardDeviation)
+        self.upperBollinger, self.lowerBollinger = calculateBollingerBands(vwaps, movingStandardDeviations)
+
+        # log and return analysis
+        self.logger.debug("analyzed price deviations", fields={"prices": len(self.priceHistory)})
+        return self._analysis(standardDeviation)
+
+    def analyzeAccumulated(self, accumulator):
+        """Analyze the current price deviation from running deviation sums."""
+        standardDeviation = accumulator.standardDeviation
+        self.logger.debug("analyzed accumulated price deviations", fields={"prices": accumulator.count})
+        return self._analysis(standardDeviation)
+
+    def analyzeStandardDeviation(self, standardDeviation):
+        """Analyze the current price deviation given a previously calculated standard deviation."""
+        self.logger.debug("analyzed price deviation", fields={"standard_deviation": standardDeviation})
+        return self._analysis(standardDeviation)
+
+    @classmethod
+    @metrics.timed("mean_reversion.analyzeMany")
+    def analyzeMany(cls, currentPrices, priceHistories):
+        """Analyze the current price deviations of multiple cryptocurrencies as a single batch."""
+        priceHistories = {ticker: priceHistory for ticker, priceHistory in priceHistories.items() if len(priceHistory)}
+        if not priceHistories:
+            return {}
+
+        # right-align histories in a 2-D batch (zero deviation padding leaves the sums unchanged)
+        tickers = list(priceHistories.keys())
+        lengths = numpy.array([len(priceHistories.get(ticker)) for ticker in tickers])
+        prices = numpy.zeros((len(tickers), lengths.max()))
+        vwaps = numpy.zeros(prices.shape)
+        for row, ticker in enumerate(tickers):
+            priceHistory = priceHistories.get(ticker)
+            prices[row, prices.shape[1] - len(priceHistory):] = priceHistory.mid
+            vwaps[row, prices.shape[1] - len(priceHistory):] = priceHistory.vwap
 
+        # calculate standard deviations of all tickers at once
+        deviationsSquaredSums = numpy.cumsum(numpy.square(prices - vwaps), axis=-1)[:, -1]
+        standardDeviations = numpy.sqrt(deviationsSquaredSums / lengths)
+
+        # return analysis of each ticker
+        analyses = {}
+        for ticker, standardDeviation in zip(tickers, standardDeviations.tolist()):
+            analyses[ticker] = cls(currentPrices.get(ticker), priceHistories.get(ticker))._analysis(standardDeviation)
+        return analyses
+
+    def calculatePrice(self, allPrices):
+        """Calculate the price given all price types."""
+        return statistics.mean([allPrices.get("ask"), allPrices.get("bid")])
+
+    def _analysis(self, standardDeviation):
+        """Analyze the current price deviation given the standard deviation."""
         # calculate current price deviation from current weighted average
         currentDeviation = abs(self.currentPrice - self.currentVWAP)
         currentPercentDeviation = currentDeviation / standardDeviation
-
-        # log and return analysis
-        self.logger.log("analyzed %i price deviations" % len(self.priceHistory))
         return MeanReversionAnalysis(self.currentVWAP,
                                      currentDeviation,
                                      currentPercentDeviation,
                                      self.currentPrice,
                                      standardDeviation)
 
-    def calculatePrice(self, allPrices):
-        """Calculate the price given all price types."""
-        return statistics.mean([allPrices.get("ask"), allPrices.get("bid")])
+def calculateMovingStandardDeviations(prices, vwaps):
+    """Calculate the cumulative moving standard deviation of prices from the VWAP (along the last axis)."""
+    deviationsSquaredSums = numpy.cumsum(numpy.square(prices - vwaps), axis=-1)
+    counts = numpy.arange(1, deviationsSquaredSums.shape[-1] + 1)
+    return numpy.sqrt(deviationsSquaredSums / counts)
+
+def calculateBollingerBands(vwaps, movingStandardDeviations):
+    """Calculate upper and lower bollinger bands around the VWAP."""
+    bandWidths = movingStandardDeviations * constants.PERCENT_DEVIATION_OPEN_THRESHOLD
+    return vwaps + bandWidths, vwaps - bandWidths
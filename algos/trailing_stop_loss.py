@@ -1,5 +1,7 @@
 """Trailing stop-loss algo module."""
 import logger
+import metrics
+import numpy
 
 class TrailingStopLossAnalysis:
     """Object to store results from trailing stop-loss analysis."""
@@ -18,7 +20,7 @@ class TrailingStopLossAnalysis:
 
 class TrailingStopLoss:
     """Object to perform trailing stop-loss analysis on open positons."""
-    def __init__(self, ticker, initialOrderType, leverage, volume, currentPrice, currentVWAP, initialPrice, priceHistory):
+    def __init__(self, ticker, initialOrderType, leverage, volume, currentPrice, currentVWAP, initialPrice, priceHistory, actionablePrice=None, actionableDatetime=None):
         self.logger = logger.Logger("TrailingStopLoss")
         self.ticker = ticker
         self.initialOrderType = initialOrderType
@@ -29,29 +31,35 @@ class TrailingStopLoss:
         self.initialPrice = initialPrice
         self.priceHistory = priceHistory
 
+        # resume from previously tracked extreme if provided (price history then only holds newer prices)
+        self.actionablePrice = actionablePrice or initialPrice
+        self.actionableDatetime = actionableDatetime
+
+    @metrics.timed("trailing_stop_loss.analyze")
     def analyze(self):
         """Determine price deviation from extreme (peak / valley)."""
         # determine actionable price
         # actionable price: most profitable price since position was opened
-        actionablePrice = self.initialPrice
-        actionableDatetime = None
-        for price in self.priceHistory:
+        actionablePrice = self.actionablePrice
+        actionableDatetime = self.actionableDatetime
+        if len(self.priceHistory):
 
             # if initial buy: actionable price = peak since buy
             if self.initialOrderType == "buy":
-                _price = price.get("bid")
-                _datetime = price.get("utc_datetime")
-                if not actionablePrice or _price > actionablePrice:
-                    actionablePrice = _price
-                    actionableDatetime = str(_datetime)
+                index = int(numpy.argmax(self.priceHistory.bid))
+                extremePrice = float(self.priceHistory.bid[index])
+                isMoreProfitable = extremePrice > actionablePrice if actionablePrice else True
 
             # if initial sell: actionable price = valley since sell
             else:
-                _price = price.get("ask")
-                _datetime = price.get("utc_datetime")
-                if not actionablePrice or _price < actionablePrice:
-                    actionablePrice = _price
-                    actionableDatetime = str(_datetime)
+                index = int(numpy.argmin(self.priceHistory.ask))
+                extremePrice = float(self.priceHistory.ask[index])
+                isMoreProfitable = extremePrice < actionablePrice if actionablePrice else True
+
+            # use first occurence of the extreme if more profitable
+            if isMoreProfitable:
+                actionablePrice = extremePrice
+                actionableDatetime = str(self.priceHistory.datetimeAt(index))
 
         # calulate trailing percentage between current and actionable prices
         # if initial buy: trailing percentage = how much price has fallen from max
@@ -64,7 +72,7 @@ class TrailingStopLoss:
             unrealizedProfit = (self.initialPrice - self.currentPrice) * self.volume
 
         # price trailing stop-loss analysis
-        self.logger.log("analyzed trailing stop-loss over %i prices" % len(self.priceHistory))
+        self.logger.debug("analyzed trailing stop-loss", fields={"ticker": self.ticker, "prices": len(self.priceHistory)})
         return TrailingStopLossAnalysis(self.ticker,
                                         self.initialOrderType,
                                         self.leverage,
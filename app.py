@@ -1,19 +1,30 @@
 """BitBot APIs module."""
 import assistant
+import backtester
 import constants
+import csv
 import datetime
 import flask
-import io
+import ingestor
 import json
 import logger
+import math
+import metrics
+import network
+import numpy
 import notifier
+import renderer
+import threading
 import visualizer
 from algos import mean_reversion
 from algos import trailing_stop_loss
 from trading import opener
 from trading import closer
+from db import buckets
 from db import db
+from db import history
 from db import models
+from db import rollup
 
 # initialize flask app
 app = flask.Flask(__name__)
@@ -30,6 +41,9 @@ assistant = assistant.Assistant(mongodb)
 # initialize notifier
 notifier = notifier.Notifier()
 
+# initialize renderer
+renderer = renderer.Renderer(mongodb)
+
 #################################
 ##  Public APIs
 #################################
@@ -37,13 +51,24 @@ notifier = notifier.Notifier()
 @app.route("%s/analyze" % constants.API_ROOT)
 def analyze():
     """Analyze the price deviations of all supported cryptocurrencies."""
-    currentPrices = assistant.getPrices()
+    # serve materialized analyses of the latest price snapshots
+    analyses = {}
+    watermarkDatetimes = {}
+    for ticker, storedAnalysis in assistant.getMeanReversionAnalyses().items():
+        watermarkDatetimes[ticker] = storedAnalysis.pop("watermark_utc_datetime")
+        analyses[ticker] = storedAnalysis
+
+    # analyze cryptos without up-to-date analyses on demand
+    outdatedTickers = [ticker for ticker in constants.SUPPORTED_TICKERS if ticker not in analyses]
+    if outdatedTickers:
+        currentPrices = assistant.getPrices()
+        priceHistories = assistant.getPriceHistories(outdatedTickers)
+        for ticker, _analysis in mean_reversion.MeanReversion.analyzeMany(currentPrices, priceHistories).items():
+            watermarkDatetimes[ticker] = datetime.datetime.utcnow()
+            analyses[ticker] = _analysis.__dict__
     analysis = []
     for ticker in constants.SUPPORTED_TICKERS:
-        _currentPrices = currentPrices.get(ticker)
-        priceHistory = assistant.getPriceHistory(ticker)
-        analysis.append({"ticker": ticker,
-                         "analysis": mean_reversion.MeanReversion(_currentPrices, priceHistory).analyze().__dict__})
+        analysis.append({"ticker": ticker, "analysis": analyses.get(ticker), "watermark_utc_datetime": watermarkDatetimes.get(ticker)})
     return _successResp(analysis)
 
 @app.route("%s/equity" % constants.API_ROOT)
@@ -56,13 +81,24 @@ def equity():
     marginLevel = accountBalances.get("margin_level")
     return _successResp({"balances": balances, "equity_usd": equity, "margin_level_percent": marginLevel})
 
+@app.route("%s/metrics" % constants.API_ROOT)
+def stage_metrics():
+    """Get stage latency histograms and counters in the Prometheus text format."""
+    return flask.Response(metrics.registry.prometheus(), mimetype="text/plain; version=0.0.4")
+
+@app.route("%s/connections" % constants.API_ROOT)
+def connections():
+    """Get outbound connection reuse stats of each host."""
+    return _successResp(network.getSession().connectionStats())
+
 @app.route("%s/positions" % constants.API_ROOT)
 def positions():
     """Analyze the profit and trailing stop-loss of open positions."""
     positions = {}
     total = 0
     combinedProfit = 0
-    for ticker, transactionId, analysis in analyzeOpenPositions():
+    openPositions = analyzeOpenPositions()  # read only (tracking is written when closing positions)
+    for ticker, transactionId, analysis in openPositions:
         if ticker not in positions:
             positions[ticker] = []
         positions[ticker].append({"transaction_id": transactionId, "analysis": analysis.__dict__})
@@ -73,17 +109,20 @@ def positions():
 @app.route("%s/visualize" % constants.API_ROOT)
 def visualize_equity():
     """View visualization of account equity balance."""
+    # serve pre-rendered visualization
+    rendering = renderer.get("equity")
+    if rendering:
+        return _imageResp(rendering)
+
     # generate visualization
     currentBalanceUSD = assistant.getAssetBalances().get("USD")
     currentBalances = assistant.getAccountBalances()
     currentEquity = currentBalances.get("equivalent_balance") + currentBalances.get("unrealized_net_profit")
     equityHistory = assistant.getEquityHistory()
-    visualization = visualizer.visualizeEquity(currentEquity, currentBalanceUSD, equityHistory)
+    image = visualizer.visualizeEquity(currentEquity, currentBalanceUSD, equityHistory)
 
     # display visualization
-    image = io.BytesIO()
-    visualization.print_png(image)
-    return flask.Response(image.getvalue(), mimetype="image/png")
+    return flask.Response(image, mimetype="image/png")
 
 @app.route("%s/visualize/<ticker>" % constants.API_ROOT)
 def visualize_price(ticker):
@@ -91,15 +130,58 @@ def visualize_price(ticker):
     if ticker not in constants.SUPPORTED_TICKERS:
         return _failedResp("ticker not supported: %s" % ticker, statusCode=400)  # 400 bad request
 
+    # parse requested rollup resolution and lookback
+    resolution = flask.request.args.get("resolution")
+    if resolution and resolution not in rollup.RESOLUTION_UNITS:
+        return _failedResp("price resolution not supported: %s" % resolution, statusCode=400)  # 400 bad request
+    startingDatetime = None  # defaults to the cached lookback window
+    if "days" in flask.request.args:
+        try:
+            lookbackDays = float(flask.request.args.get("days"))
+            if not math.isfinite(lookbackDays) or lookbackDays <= 0:
+                raise ValueError("lookback days must be positive")
+            startingDatetime = datetime.datetime.utcnow() - datetime.timedelta(days=lookbackDays)
+        except (ValueError, OverflowError):
+            return _failedResp("invalid lookback days: %s" % flask.request.args.get("days"), statusCode=400)  # 400 bad request
+
+    # serve pre-rendered visualization of the default view
+    rendering = renderer.get(ticker) if not flask.request.args else None
+    if rendering:
+        return _imageResp(rendering)
+
     # generate visualization
     currentPrices = assistant.getPrices().get(ticker)
-    priceHistory = assistant.getPriceHistory(ticker)
-    visualization = visualizer.visualizePrice(ticker, currentPrices, priceHistory)
+    priceHistory = assistant.getPriceHistory(ticker, startingDatetime=startingDatetime, resolution=resolution)
+    image = visualizer.visualizePrice(ticker, currentPrices, priceHistory)
 
     # display visualization
-    image = io.BytesIO()
-    visualization.print_png(image)
-    return flask.Response(image.getvalue(), mimetype="image/png")
+    return flask.Response(image, mimetype="image/png")
+
+@app.route("%s/series/equity" % constants.API_ROOT)
+def series_equity():
+    """Stream account equity history as newline-delimited JSON."""
+    try:
+        startingDatetime, endingDatetime, maxPoints = _parseSeriesArgs()
+    except ValueError as err:
+        return _failedResp(str(err), statusCode=400)  # 400 bad request
+
+    # stream equity history in chunks
+    entries = assistant.streamEquityHistory(startingDatetime, endingDatetime)
+    return _ndjsonResp(_seriesLines(_equitySeriesChunks(entries), "equity", maxPoints, startingDatetime, endingDatetime))
+
+@app.route("%s/series/<ticker>" % constants.API_ROOT)
+def series_price(ticker):
+    """Stream price, VWAP and bollinger band history of a cryptocurrency as newline-delimited JSON."""
+    if ticker not in constants.SUPPORTED_TICKERS:
+        return _failedResp("ticker not supported: %s" % ticker, statusCode=400)  # 400 bad request
+    try:
+        startingDatetime, endingDatetime, maxPoints = _parseSeriesArgs()
+    except ValueError as err:
+        return _failedResp(str(err), statusCode=400)  # 400 bad request
+
+    # stream price history in chunks (bollinger bands are measured from the start of the range)
+    priceHistories = assistant.streamPriceHistory(ticker, startingDatetime, endingDatetime)
+    return _ndjsonResp(_seriesLines(_priceSeriesChunks(priceHistories), "price", maxPoints, startingDatetime, endingDatetime))
 
 @app.route("/")
 def root():
@@ -116,11 +198,70 @@ def root_api():
 #################################
 
 def clean():
-    """Remove outdated database entries."""
-    retentionDatetime = datetime.datetime.utcnow() - datetime.timedelta(days=constants.HISTORY_RETENTION_DAYS)
-    filter = {"utc_datetime": {"$lt": retentionDatetime}}
-    mongodb.deleteMany("price", filter)
-    mongodb.deleteMany("equity", filter)
+    """Ensure outdated database entries are removed (TTL indexes expire them in the background)."""
+    ensure_indexes()
+
+def ensure_indexes():
+    """Create declared database indexes (run in the release phase of each deploy)."""
+    mongodb.ensureIndexes()
+
+def migrate_prices():
+    """Copy stored price documents into hourly buckets (safe to rerun before or after enabling bucketed storage)."""
+    now = datetime.datetime.utcnow()
+    startingDatetime = buckets.bucketDatetime(now - datetime.timedelta(days=constants.HISTORY_RETENTION_DAYS))
+    while startingDatetime < now:
+        endingDatetime = startingDatetime + datetime.timedelta(days=1)
+        datetimeFilter = {"$gte": startingDatetime, "$lt": endingDatetime}
+
+        # copy a day of prices of all tickers at a time
+        datetimeFilters = {ticker: datetimeFilter for ticker in constants.SUPPORTED_TICKERS}
+        priceHistories = history.fetchPriceHistories(mongodb, datetimeFilters, columns=history.PRICE_COLUMNS, bucketed=False)
+        updates = []
+        for ticker, priceHistory in priceHistories.items():
+            firstDatetimes = buckets.fetchFirstDatetimes(mongodb, ticker, datetimeFilter)
+            updates.extend(buckets.migrationUpdates(priceHistory, firstDatetimes))
+        mongodb.upsertMany(buckets.COLLECTION_NAME, updates)
+        startingDatetime = endingDatetime
+
+def rollup_prices():
+    """Rebuild hourly and daily price rollups from stored prices (rollups older than stored prices are kept)."""
+    horizonDatetime = rollup.retentionHorizon()
+    startingDatetime = min(rollup.firstCompleteDatetime(horizonDatetime, resolution) for resolution in rollup.RESOLUTION_UNITS)
+    for ticker in constants.SUPPORTED_TICKERS:
+        priceHistory = assistant.getPriceHistory(ticker, startingDatetime=startingDatetime, verify=False)
+        for resolution in rollup.RESOLUTION_UNITS:
+            mongodb.upsertMany(rollup.collectionName(resolution), rollup.replacementUpdates(priceHistory, resolution, horizonDatetime))
+
+def backtest(days=None):
+    """Replay stored price history through the trading strategy, writing trades and equity curve to .csv files."""
+    days = float(days or constants.HISTORY_RETENTION_DAYS)
+    startingDatetime = datetime.datetime.utcnow() - datetime.timedelta(days=days)
+    datetimeFilters = {ticker: {"$gte": startingDatetime} for ticker in constants.SUPPORTED_TICKERS}
+    result = backtester.Backtester(history.fetchPriceHistories(mongodb, datetimeFilters)).run()
+
+    # write results
+    trades = result.tradeRecords()
+    _writeCSV("backtest_trades.csv", list(result.trades.keys()), trades)
+    equityCurve = [{"utc_datetime": utcDatetime, "equity": equity}
+                   for utcDatetime, equity in zip(result.utc_datetime.astype(datetime.datetime).tolist(), result.equity.tolist())]
+    _writeCSV("backtest_equity.csv", ["utc_datetime", "equity"], equityCurve)
+    logger.log("backtest summary: %s" % json.dumps(result.summary()))
+
+def sweep(openThresholds=None, closeThresholds=None, lookbackDays=None, days=None):
+    """Backtest a grid of comma-separated strategy parameters, writing results ranked by net profit to a .csv file."""
+    openThresholds = _parseFloats(openThresholds, constants.PERCENT_DEVIATION_OPEN_THRESHOLD)
+    closeThresholds = _parseFloats(closeThresholds, constants.PERCENT_TRAILING_CLOSE_THRESHOLD)
+    lookbackDays = _parseFloats(lookbackDays, constants.LOOKBACK_DAYS)
+    days = float(days or constants.HISTORY_RETENTION_DAYS)
+    startingDatetime = datetime.datetime.utcnow() - datetime.timedelta(days=days)
+    datetimeFilters = {ticker: {"$gte": startingDatetime} for ticker in constants.SUPPORTED_TICKERS}
+    results = backtester.sweep(history.fetchPriceHistories(mongodb, datetimeFilters), openThresholds, closeThresholds, lookbackDays)
+
+    # write ranked results
+    rankedResults = [dict({"rank": rank}, **result) for rank, result in enumerate(results, start=1)]
+    _writeCSV("sweep_results.csv", list(rankedResults[0].keys()) if rankedResults else ["rank"], rankedResults)
+    if rankedResults:
+        logger.log("best of %i parameter combinations: %s" % (len(rankedResults), json.dumps(rankedResults[0])))
 
 def snapshot_equity():
     """Store relevant account balances."""
@@ -131,7 +272,14 @@ def snapshot_equity():
     marginUsed = currentBalances.get("margin_used")
 
     # store relevant account balances in database
-    mongodb.insert(models.Equity(balanceUSD, equity, marginUsed))
+    model = models.Equity(balanceUSD, equity, marginUsed)
+    mongodb.insert(model)
+
+    # pre-render equity visualization up to the new snapshot
+    def visualize():
+        equityHistory = [entry for entry in assistant.getEquityHistory() if entry.get("utc_datetime") < model.utc_datetime]
+        return visualizer.visualizeEquity(equity, balanceUSD, equityHistory)
+    renderer.render("equity", model.utc_datetime, visualize)
 
 def snapshot_price():
     """Store the relevant prices of all supported cryptocurrencies."""
@@ -146,7 +294,11 @@ def snapshot_price():
         snapshots.append(models.Price(ticker, ask, bid, high, low, vwap))
 
     # store relevant prices in database
-    mongodb.insertMany(snapshots)
+    _storePriceSnapshots(snapshots)
+
+def ingest():
+    """Continuously store streaming prices of all supported cryptocurrencies."""
+    ingestor.PriceIngestor(_storePriceSnapshots).run()
 
 def notify():
     """Sends a daily activity summary notification."""
@@ -179,28 +331,36 @@ def notify():
     emailBody += "\n" + json.dumps(openPositions, indent=6)
     notifier.email(emailSubject, emailBody)
 
+@metrics.timed("trade_close")
 def trade_close():
     """Close qualified cryptocurrency trading positions."""
     tickersClosed = set()
 
-    # fetch analysis on all open positions
-    openPositions = analyzeOpenPositions()
-    logger.log("found %i open positions" % len(openPositions))
-    for ticker, transactionId, analysis in openPositions:
+    # batch position tracking updates and deletions into a single database write
+    with mongodb.unitOfWork() as unitOfWork:
 
-        # consult closer on the potential close of position
-        _trader = closer.Closer(ticker, analysis, assistant)
-        logger.log("consulting closer on potential %s close" % ticker)
-        if _trader.approves:
+        # fetch analysis on all open positions
+        openPositions = analyzeOpenPositions(unitOfWork)
+        logger.log("found %i open positions" % len(openPositions))
+        for ticker, transactionId, analysis in openPositions:
 
-            # close position
-            success, order, profit = _trader.execute()
-            if success:
-                tickersClosed.add(ticker)
-                logger.log("position closed successfully (profit=$%.3f)" % profit, moneyExchanged=True)
+            # consult closer on the potential close of position
+            _trader = closer.Closer(ticker, analysis, assistant)
+            logger.log("consulting closer on potential %s close" % ticker)
+            if _trader.approves:
+
+                # close position
+                success, order, profit = _trader.execute()
+                if success:
+                    tickersClosed.add(ticker)
+                    logger.log("position closed successfully (profit=$%.3f)" % profit, moneyExchanged=True)
 
-                # delete open position from the database
-                mongodb.delete("position", filter={"transaction_id": transactionId})
+                    # delete closed position from the database immediately (alerting if it is still tracked)
+                    try:
+                        mongodb.delete("position", filter={"transaction_id": transactionId})
+                    except Exception as err:
+                        _alertUntrackedTrade("closed", ticker, transactionId, err)
+    _alertFailedWrites("trade_close", unitOfWork.failures)
 
     # log clossing session summary
     numCloses = len(tickersClosed)
@@ -209,18 +369,31 @@ def trade_close():
         sessionSummary += ": %s" % str(list(tickersClosed))
     logger.log(sessionSummary)
 
+@metrics.timed("trade_open")
 def trade_open():
     """Open qualified cryptocurrency trading positions."""
     tickersOpened = set()
     currentPrices = assistant.getPrices()
     logger.log("found %i tradeable cryptocurrencies" % len(constants.SUPPORTED_TICKERS))
+
+    # only fetch price history of cryptos without up-to-date materialized analyses
+    storedAnalyses = assistant.getMeanReversionAnalyses()
+    outdatedTickers = [ticker for ticker in constants.SUPPORTED_TICKERS if ticker not in storedAnalyses]
+    priceHistories = assistant.getPriceHistories(outdatedTickers, verify=False) if outdatedTickers else {}
+
     for ticker in constants.SUPPORTED_TICKERS:
 
         # analyze price deviation from the mean for all supported cryptos
         try:
             _currentPrices = currentPrices.get(ticker)
-            priceHistory = assistant.getPriceHistory(ticker)
-            analysis = mean_reversion.MeanReversion(_currentPrices, priceHistory).analyze()
+            if ticker in storedAnalyses:
+                standardDeviation = storedAnalyses.get(ticker).get("standard_deviation")
+                analysis = mean_reversion.MeanReversion(_currentPrices, None).analyzeStandardDeviation(standardDeviation)
+            else:
+                priceHistory = priceHistories.get(ticker)
+                if not priceHistory:
+                    raise RuntimeError("%s price history is empty" % ticker)
+                analysis = mean_reversion.MeanReversion(_currentPrices, priceHistory).analyze()
         except Exception as err:
             logger.log("unable to analyze %s mean reversion: %s" % (ticker, repr(err)))
             continue
@@ -236,11 +409,14 @@ def trade_open():
                 tickersOpened.add(ticker)
                 logger.log("position opened successfully", moneyExchanged=True)
 
-                # add new position to the database
+                # add new position to the database immediately (alerting if it is not tracked)
                 transactionId = position.get("transaction_id")
                 description = position.get("description")
                 openPositionModel = models.Position(ticker, transactionId, description)
-                mongodb.insert(openPositionModel)
+                try:
+                    mongodb.insert(openPositionModel)
+                except Exception as err:
+                    _alertUntrackedTrade("opened", ticker, transactionId, err)
 
     # log trading session summary
     numTrades = len(tickersOpened)
@@ -253,13 +429,33 @@ def trade_open():
 ##  Helper methods
 ###############################
 
-def analyzeOpenPositions():
-    """Get analysis (e.g. unrealized profit, etc.) on open positions."""
+def _alertFailedWrites(sessionName, failures):
+    """Send an alert of writes of a unit of work that failed."""
+    if not failures:
+        return
+    emailSubject = "Failed Writes: %s" % sessionName
+    emailBody = "\n".join("unable to %s in the %s collection: %s" % (description, collectionName, error)
+                          for collectionName, description, error in failures)
+    notifier.email(emailSubject, emailBody)
+
+def _alertUntrackedTrade(action, ticker, transactionId, err):
+    """Send an alert of a position opened or closed on the exchange but not updated in the database."""
+    logger.error("unable to store %s position" % action, fields={"ticker": ticker, "transaction_id": transactionId, "error": repr(err)})
+    emailSubject = "Untracked Position: %s" % ticker
+    emailBody = "%s position %s but not updated in the database: %s" % (ticker, action, repr(err))
+    emailBody += "\n\nTransaction ID: %s" % transactionId
+    notifier.email(emailSubject, emailBody)
+
+@metrics.timed("analyzeOpenPositions")
+def analyzeOpenPositions(unitOfWork=None):
+    """Get analysis (e.g. unrealized profit, etc.) on open positions, recording position writes in a unit of work if given."""
     openPositionAnalysis = []
 
     # fetch open positions from the database
     transactionIds = []
-    openPositions = assistant.getOpenPositions()
+    projection = {"_id": False, "ticker": True, "transaction_id": True,
+                  "actionable_price": True, "actionable_datetime_utc": True, "tracked_utc_datetime": True}
+    openPositions = assistant.getOpenPositions(projection=projection)
     for position in openPositions:
         transactionIds.append(position.get("transaction_id"))
 
@@ -270,10 +466,24 @@ def analyzeOpenPositions():
     # fetch information on orders that opened positions
     currentPrices = assistant.getPrices()
     orders = assistant.getOrders(transactionIds)
+
+    # fetch price history of each ticker once since its earliest untracked price
+    startingDatetimes = {}
+    for position in openPositions:
+        order = orders.get(position.get("transaction_id"))
+        if order and order.get("status") == "closed":
+            ticker = position.get("ticker")
+            startingDatetime = _trackingDatetime(position, order)
+            startingDatetimes[ticker] = min(startingDatetimes.get(ticker, startingDatetime), startingDatetime)
+    priceHistories = {ticker: assistant.getPriceHistory(ticker, startingDatetime=startingDatetime, verify=False)
+                      for ticker, startingDatetime in startingDatetimes.items()}
     for position in openPositions:
         ticker = position.get("ticker")
         transactionId = position.get("transaction_id")
         order = orders.get(transactionId)
+        if not order:
+            logger.error("order not found", fields={"ticker": ticker, "transaction_id": transactionId})
+            continue
 
         # determine if action needs to be taken on the order
         # possible order statuses: ["pending", "open", "closed", "cancelled", "expired"]
@@ -281,7 +491,8 @@ def analyzeOpenPositions():
 
         # delete open positions for failed orders
         if orderStatus == "cancelled" or orderStatus == "expired":
-            mongodb.delete("position", filter={"transaction_id": transactionId})
+            if unitOfWork:
+                unitOfWork.delete("position", filter={"transaction_id": transactionId})
             continue
         elif orderStatus != "closed":
             continue
@@ -304,9 +515,13 @@ def analyzeOpenPositions():
             logger.log("unknown initial order type for %s: %s" % (transactionId, initialOrderType))
             continue
 
-        # analyze trailing stop-loss order potential
+        # analyze trailing stop-loss order potential (resuming from the tracked peak / valley)
         try:
-            priceHistory = assistant.getPriceHistory(ticker, startingDatetime=initialOrderDatetime, verify=False)
+            trackedDatetime = position.get("tracked_utc_datetime")
+            if trackedDatetime:
+                priceHistory = priceHistories.get(ticker).after(trackedDatetime)
+            else:
+                priceHistory = priceHistories.get(ticker).since(initialOrderDatetime)
             analysis = trailing_stop_loss.TrailingStopLoss(ticker,
                                                            initialOrderType,
                                                            leverage,
@@ -314,16 +529,280 @@ def analyzeOpenPositions():
                                                            currentPrice,
                                                            currentVWAP,
                                                            initialPrice,
-                                                           priceHistory).analyze()
+                                                           priceHistory,
+                                                           actionablePrice=position.get("actionable_price"),
+                                                           actionableDatetime=position.get("actionable_datetime_utc")).analyze()
         except Exception as err:
             logger.log("unable to analyze %s trailing stop loss potential: %s" % (ticker, repr(err)))
             continue
         else:
             openPositionAnalysis.append((ticker, transactionId, analysis))
 
+        # track peak / valley on the position so the next analysis only covers newer prices
+        if unitOfWork and priceHistory:
+            unitOfWork.update("position", {"transaction_id": transactionId}, {"actionable_price": analysis.actionable_price,
+                                                                              "actionable_datetime_utc": analysis.actionable_datetime_utc,
+                                                                              "tracked_utc_datetime": priceHistory.latestDatetime})
+
     # return analysis on open positions
     return openPositionAnalysis
 
+def _parseSeriesArgs():
+    """Parse the datetime range and downsampling arguments of a series request."""
+    now = datetime.datetime.utcnow()
+    startingDatetime = _parseDatetimeArg("start", now - datetime.timedelta(days=constants.LOOKBACK_DAYS))
+    endingDatetime = _parseDatetimeArg("end", now)
+    maxPoints = flask.request.args.get("max_points")
+    if maxPoints is not None:
+        if not maxPoints.isdigit() or int(maxPoints) < 3:
+            raise ValueError("max_points must be an integer of at least 3: %s" % maxPoints)
+        maxPoints = int(maxPoints)
+    return startingDatetime, endingDatetime, maxPoints
+
+def _parseDatetimeArg(name, default):
+    """Parse a UTC datetime argument given as a Unix timestamp or ISO 8601 string."""
+    value = flask.request.args.get(name)
+    if value is None:
+        return default
+    try:
+        # parse unix timestamp (out of range timestamps raise overflow or OS errors)
+        try:
+            timestamp = float(value)
+        except ValueError:
+            pass
+        else:
+            return datetime.datetime.utcfromtimestamp(timestamp)
+
+        # parse ISO 8601 string
+        utcDatetime = datetime.datetime.fromisoformat(value[:-1] if value.endswith("Z") else value)
+        if utcDatetime.tzinfo:
+            utcDatetime = utcDatetime.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+        return utcDatetime
+    except (ValueError, OverflowError, OSError):
+        raise ValueError("invalid %s datetime: %s" % (name, value))
+
+def _equitySeriesChunks(entries):
+    """Group streamed equity entries into chunks of columns."""
+    chunk = []
+    for entry in entries:
+        chunk.append(entry)
+        if len(chunk) == constants.MONGODB_BATCH_SIZE:
+            yield _equitySeriesColumns(chunk)
+            chunk = []
+    if chunk:
+        yield _equitySeriesColumns(chunk)
+
+def _equitySeriesColumns(entries):
+    """Convert equity entries into columns."""
+    return {"utc_datetime": numpy.array([entry.get("utc_datetime") for entry in entries], dtype="datetime64[us]"),
+            "equity": numpy.array([entry.get("equity") for entry in entries], dtype=float),
+            "usd_balance": numpy.array([entry.get("usd_balance") for entry in entries], dtype=float)}
+
+def _priceSeriesChunks(priceHistories):
+    """Convert streamed price history chunks into price, VWAP and bollinger band columns."""
+    accumulator = mean_reversion.DeviationAccumulator()
+    for priceHistory in priceHistories:
+        prices = priceHistory.mid
+        movingStandardDeviations = accumulator.addMoving(prices, priceHistory.vwap)
+        upperBollinger, lowerBollinger = mean_reversion.calculateBollingerBands(priceHistory.vwap, movingStandardDeviations)
+        yield {"utc_datetime": priceHistory.utc_datetime,
+               "price": prices,
+               "vwap": priceHistory.vwap,
+               "upper_bollinger": upperBollinger,
+               "lower_bollinger": lowerBollinger}
+
+def _seriesLines(chunks, downsampledColumn, maxPoints=None, startingDatetime=None, endingDatetime=None):
+    """Format series chunks as newline-delimited JSON (downsampling the series while streaming if requested)."""
+    if maxPoints:
+        chunks = _downsampledChunks(chunks, downsampledColumn, maxPoints, startingDatetime, endingDatetime)
+
+    # format each chunk at once
+    for chunk in chunks:
+        utcDatetimes = numpy.datetime_as_string(chunk.get("utc_datetime"), unit="s").tolist()
+        columns = [(column, values.tolist()) for column, values in chunk.items() if column != "utc_datetime"]
+        yield "".join(json.dumps(dict({"utc_datetime": utcDatetime}, **{column: values[i] for column, values in columns})) + "\n"
+                      for i, utcDatetime in enumerate(utcDatetimes))
+
+def _downsampledChunks(chunks, downsampledColumn, maxPoints, startingDatetime, endingDatetime):
+    """Downsample streamed series chunks to at most a number of points in one chunk.
+
+    Splits the datetime range into maxPoints / 2 equal buckets and keeps the
+    points with the lowest and highest value of each bucket, reducing each chunk
+    as it arrives so memory is bounded by the number of points kept.
+    """
+    bucketCount = maxPoints // 2
+    start = numpy.datetime64(startingDatetime, "us").astype("int64")
+    span = max(numpy.datetime64(endingDatetime, "us").astype("int64") - start, 1)
+    lowValues = numpy.full(bucketCount, numpy.inf)
+    highValues = numpy.full(bucketCount, -numpy.inf)
+    lowPoints, highPoints = {}, {}
+    for chunk in chunks:
+        if not lowPoints:
+            lowPoints = {column: numpy.zeros(bucketCount, dtype=values.dtype) for column, values in chunk.items()}
+            highPoints = {column: numpy.zeros(bucketCount, dtype=values.dtype) for column, values in chunk.items()}
+
+        # find the lowest and highest point of each bucket in the chunk (ignoring missing values)
+        values = chunk.get(downsampledColumn)
+        timestamps = chunk.get("utc_datetime").astype("datetime64[us]").astype("int64")
+        buckets = numpy.clip((timestamps - start) * bucketCount // span, 0, bucketCount - 1)
+        order = numpy.lexsort((values, buckets))
+        order = order[~numpy.isnan(values[order])]
+        if not len(order):
+            continue
+        isNewBucket = numpy.append(True, buckets[order][1:] != buckets[order][:-1])
+        lowest, highest = order[isNewBucket], order[numpy.append(isNewBucket[1:], True)]
+
+        # replace points kept from earlier chunks that are exceeded
+        for indices, keptValues, keptPoints, isBetter in [(lowest, lowValues, lowPoints, numpy.less),
+                                                          (highest, highValues, highPoints, numpy.greater)]:
+            chunkBuckets = buckets[indices]
+            isReplaced = isBetter(values[indices], keptValues[chunkBuckets])
+            keptValues[chunkBuckets[isReplaced]] = values[indices[isReplaced]]
+            for column, points in keptPoints.items():
+                points[chunkBuckets[isReplaced]] = chunk.get(column)[indices[isReplaced]]
+
+    # combine kept points of all buckets in datetime order
+    if not lowPoints:
+        return
+    isKept = numpy.isfinite(lowValues)
+    series = {column: numpy.concatenate([lowPoints.get(column)[isKept], highPoints.get(column)[isKept]]) for column in lowPoints}
+    timestamps = series.get("utc_datetime").astype("datetime64[us]").astype("int64")
+    _, indices = numpy.unique(timestamps, return_index=True)
+    yield {column: values[indices] for column, values in series.items()}
+
+def _parseFloats(values, default):
+    """Parse comma-separated numbers of a command-line argument."""
+    if not values:
+        return [default]
+    return [float(value) for value in values.split(",")]
+
+def _writeCSV(path, fieldnames, rows):
+    """Write rows to a .csv file."""
+    with open(path, "w", newline="") as csvFile:
+        writer = csv.DictWriter(csvFile, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(rows)
+
+def _trackingDatetime(position, order):
+    """Get the datetime from which a position's peak / valley is untracked."""
+    trackedDatetime = position.get("tracked_utc_datetime")
+    if trackedDatetime:
+        return trackedDatetime
+    return datetime.datetime.utcfromtimestamp(order.get("closetm"))
+
+@metrics.timed("storePriceSnapshots")
+def _storePriceSnapshots(snapshots):
+    """Store price snapshots and feed them to in-process analysis."""
+    # group new prices into columnar price histories
+    snapshotsByTicker = {}
+    for snapshot in snapshots:
+        snapshotsByTicker.setdefault(snapshot.ticker, []).append(snapshot.__dict__)
+    priceHistories = {ticker: history.PriceHistory.fromDocuments(ticker, _snapshots)
+                      for ticker, _snapshots in snapshotsByTicker.items()}
+
+    # store new prices as documents or append them to hourly buckets
+    if constants.PRICE_BUCKETED_STORAGE:
+        updates = []
+        for priceHistory in priceHistories.values():
+            updates.extend(buckets.appendUpdates(priceHistory))
+        mongodb.upsertMany(buckets.COLLECTION_NAME, updates)
+    else:
+        mongodb.insertMany(snapshots)
+
+    # merge new prices into hourly and daily rollups
+    for resolution in rollup.RESOLUTION_UNITS:
+        updates = []
+        for priceHistory in priceHistories.values():
+            updates.extend(rollup.incrementalUpdates(priceHistory, resolution))
+        mongodb.upsertMany(rollup.collectionName(resolution), updates)
+
+    # update cached price history and running price deviations with new prices
+    assistant.priceHistoryCache.add(priceHistories)
+    accumulators = _updatePriceDeviations(priceHistories)
+
+    # materialize mean reversion analysis of the latest prices
+    with mongodb.unitOfWork() as unitOfWork:
+        for ticker, accumulator in accumulators.items():
+            if not accumulator.count:
+                continue
+            snapshot = snapshotsByTicker.get(ticker)[-1]
+            analysis = mean_reversion.MeanReversion(snapshot, None).analyzeAccumulated(accumulator)
+            model = models.MeanReversionAnalysis(ticker, analysis, snapshot.get("utc_datetime"))
+            unitOfWork.update(model.collectionName, {"ticker": ticker}, model.__dict__, upsert=True)
+
+    # pre-render price visualizations up to the new prices
+    _renderPriceVisualizations({ticker: snapshotsByTicker.get(ticker)[-1] for ticker in priceHistories})
+
+def _renderPriceVisualizations(snapshots):
+    """Render the price visualizations of cryptocurrencies in the background from one batched price history fetch."""
+    priceHistories = {}
+    priceHistoriesLock = threading.Lock()
+    def getPriceHistory(ticker):
+        with priceHistoriesLock:
+            if not priceHistories:
+                priceHistories.update(assistant.getPriceHistories(list(snapshots), verify=False))
+        return priceHistories.get(ticker)
+
+    # render each visualization up to its latest prices
+    for ticker, snapshot in snapshots.items():
+        latestDatetime = snapshot.get("utc_datetime")
+        latestPrices = {priceType: snapshot.get(priceType) for priceType in constants.SUPPORTED_PRICE_TYPES}
+        def visualize(ticker=ticker, latestDatetime=latestDatetime, latestPrices=latestPrices):
+            priceHistory = getPriceHistory(ticker).before(latestDatetime)
+            return visualizer.visualizePrice(ticker, latestPrices, priceHistory)
+        renderer.render(ticker, latestDatetime, visualize)
+
+def _updatePriceDeviations(newPriceHistories):
+    """Update running price deviation sums with new prices (returns updated sums by ticker)."""
+    now = datetime.datetime.utcnow()
+    windowStartingDatetime = now - datetime.timedelta(days=constants.LOOKBACK_DAYS)
+    rebuildDatetime = now - datetime.timedelta(hours=constants.PRICE_DEVIATION_REBUILD_HOURS)
+    priceDeviations = assistant.getPriceDeviations()
+
+    # rebuild sums that are missing, outdated or drifting, otherwise remove prices that aged out of the window
+    datetimeFilters = {}
+    rebuiltTickers = set()
+    for ticker in newPriceHistories:
+        priceDeviation = priceDeviations.get(ticker)
+        if not priceDeviation \
+                or priceDeviation.get("lookback_days") != constants.LOOKBACK_DAYS \
+                or priceDeviation.get("latest_utc_datetime") < windowStartingDatetime \
+                or priceDeviation.get("rebuilt_utc_datetime") < rebuildDatetime:
+            datetimeFilters[ticker] = {"$gte": windowStartingDatetime}
+            rebuiltTickers.add(ticker)
+        else:
+            datetimeFilters[ticker] = {"$gte": priceDeviation.get("window_utc_datetime"), "$lt": windowStartingDatetime}
+    priceHistories = assistant.getPriceHistoryRanges(datetimeFilters)
+
+    # update and store running sums
+    accumulators = {}
+    for ticker, newPriceHistory in newPriceHistories.items():
+        priceHistory = priceHistories.get(ticker)
+        if ticker in rebuiltTickers:
+            accumulator = mean_reversion.DeviationAccumulator()
+            rebuiltDatetime = now
+            if priceHistory:
+                accumulator.add(priceHistory.mid, priceHistory.vwap)
+        else:
+            priceDeviation = priceDeviations.get(ticker)
+            accumulator = mean_reversion.DeviationAccumulator(priceDeviation.get("count"),
+                                                              priceDeviation.get("deviation_sum"),
+                                                              priceDeviation.get("deviations_squared_sum"))
+            rebuiltDatetime = priceDeviation.get("rebuilt_utc_datetime")
+            accumulator.add(newPriceHistory.mid, newPriceHistory.vwap)
+            if priceHistory:
+                accumulator.remove(priceHistory.mid, priceHistory.vwap)
+        model = models.PriceDeviation(ticker,
+                                      accumulator.count,
+                                      accumulator.deviationSum,
+                                      accumulator.deviationsSquaredSum,
+                                      windowStartingDatetime,
+                                      newPriceHistory.latestDatetime,
+                                      rebuiltDatetime)
+        mongodb.update(model.collectionName, {"ticker": ticker}, model.__dict__, upsert=True)
+        accumulators[ticker] = accumulator
+    return accumulators
+
 ###############################
 ##  Response formatting
 ###############################
@@ -334,6 +813,18 @@ def _failedResp(error, statusCode=500):  # 500 internal server error
         error = repr(error)
     return {"success": False, "error": error}, statusCode
 
+def _imageResp(rendering):
+    """Image response of a rendering that browsers revalidate with its ETag and Last-Modified date."""
+    resp = flask.Response(rendering.image, mimetype="image/png")
+    resp.set_etag(rendering.etag)
+    resp.last_modified = rendering.rendered_utc_datetime.replace(tzinfo=datetime.timezone.utc)
+    resp.cache_control.no_cache = True
+    return resp.make_conditional(flask.request)
+
+def _ndjsonResp(lines):
+    """Streamed newline-delimited JSON response."""
+    return flask.Response(flask.stream_with_context(lines), mimetype="application/x-ndjson")
+
 def _successResp(resp):
     """Successful request response."""
     return {"success": True, "resp": resp}, 200
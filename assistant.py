@@ -2,6 +2,9 @@
 import constants
 import datetime
 import logger
+import metrics
+from db import history
+from db import rollup
 from kraken import kraken
 
 MINIMUM_ASSET_BALANCE = 0.0001
@@ -11,46 +14,39 @@ class Assistant:
     def __init__(self, mongodb):
         self.mongodb = mongodb
         self.logger = logger.Logger("Assistant")
+        self.priceHistoryCache = history.PriceHistoryCache(mongodb)
 
     ############################
     ##  Prices
     ############################
 
+    @metrics.timed("assistant.getPrices")
     def getPrices(self):
         """Get all current prices of all supported cryptocurrencies."""
-        self.logger.log("fetching current prices")
         _prices = kraken.getPrices()
-
-        # parse supported price types out of response
-        prices = {}
-        for ticker in _prices:
-            prices[ticker] = {}
-            for priceType in constants.KRAKEN_PRICE_CONFIGS:
-                config = constants.KRAKEN_PRICE_CONFIGS.get(priceType)
-                price = _prices.get(ticker).get(config.get("code"))[config.get("api_index")]
-                prices[ticker][priceType] = float(price)
+        self.logger.debug("fetched current prices", fields={"cache": kraken.priceCache.stats()})
 
         # return all converted prices
-        return prices
+        return {ticker: parsePrices(_prices.get(ticker)) for ticker in _prices}
 
-    def getPriceHistory(self, ticker, startingDatetime=None, verify=True):
-        """Get the historical price data of a cryptocurrency."""
+    @metrics.timed("assistant.getPriceHistory")
+    def getPriceHistory(self, ticker, startingDatetime=None, verify=True, resolution=None):
+        """Get the historical price data of a cryptocurrency (rolled up to an hourly or daily resolution if requested)."""
         if ticker not in constants.SUPPORTED_TICKERS:
             raise RuntimeError("ticker not supported: %s" % ticker)
 
-        # get starting datetime based on lookback days if none provided
+        # log requested price history range
         if not startingDatetime:
-            self.logger.log("fetching %s price history" % ticker)
-            now = datetime.datetime.utcnow()
-            delta = datetime.timedelta(days=constants.LOOKBACK_DAYS)
-            startingDatetime = now - delta
+            self.logger.debug("fetching price history", fields={"ticker": ticker})
         else:
-            self.logger.log("fetching %s price since %s UTC" % (ticker, startingDatetime.strftime("%Y-%m-%d %H:%M")))
+            self.logger.debug("fetching price history", fields={"ticker": ticker, "starting_utc_datetime": startingDatetime})
 
-        # fetch price history
-        queryFilter = {"ticker": ticker, "utc_datetime": {"$gte": startingDatetime}}
-        querySort = ("utc_datetime", constants.MONGODB_SORT_ASC)
-        priceHistory = self.mongodb.find("price", filter=queryFilter, sort=querySort)
+        # fetch columnar price history through the cache or from rollups
+        if not resolution:
+            priceHistory = self.priceHistoryCache.get(ticker, startingDatetime=startingDatetime)
+        else:
+            startingDatetime = startingDatetime or datetime.datetime.utcnow() - datetime.timedelta(days=constants.LOOKBACK_DAYS)
+            priceHistory = rollup.fetchHistory(self.mongodb, ticker, startingDatetime, resolution)
 
         # verify history exists
         if not priceHistory and verify:
@@ -59,6 +55,53 @@ class Assistant:
         # return price history
         return priceHistory
 
+    @metrics.timed("assistant.getPriceHistories")
+    def getPriceHistories(self, tickers, verify=True):
+        """Get the historical price data of multiple cryptocurrencies in a single query."""
+        for ticker in tickers:
+            if ticker not in constants.SUPPORTED_TICKERS:
+                raise RuntimeError("ticker not supported: %s" % ticker)
+        self.logger.log("fetching price history of %i cryptocurrencies" % len(tickers))
+
+        # fetch columnar price histories through the cache
+        priceHistories = self.priceHistoryCache.getMany(tickers)
+
+        # verify histories exist
+        for ticker, priceHistory in priceHistories.items():
+            if not priceHistory and verify:
+                raise RuntimeError("%s price history is empty" % ticker)
+
+        # return price histories by ticker
+        return priceHistories
+
+    def getPriceHistoryRanges(self, datetimeFilters):
+        """Get the historical price data of multiple cryptocurrencies within per-ticker datetime ranges."""
+        self.logger.log("fetching price history ranges of %i cryptocurrencies" % len(datetimeFilters))
+        return history.fetchPriceHistories(self.mongodb, datetimeFilters)
+
+    def streamPriceHistory(self, ticker, startingDatetime, endingDatetime):
+        """Stream the historical price data of a cryptocurrency within a datetime range in chunks."""
+        if ticker not in constants.SUPPORTED_TICKERS:
+            raise RuntimeError("ticker not supported: %s" % ticker)
+        self.logger.log("streaming %s price since %s UTC" % (ticker, startingDatetime.strftime("%Y-%m-%d %H:%M")))
+        return history.streamPriceHistory(self.mongodb, ticker, {"$gte": startingDatetime, "$lte": endingDatetime})
+
+    def getPriceDeviations(self):
+        """Get the running price deviation sums of all supported cryptocurrencies."""
+        self.logger.log("fetching running price deviations")
+        priceDeviations = self.mongodb.find("price_deviation", projection={"_id": False})
+        return {priceDeviation.get("ticker"): priceDeviation for priceDeviation in priceDeviations}
+
+    @metrics.timed("assistant.getMeanReversionAnalyses")
+    def getMeanReversionAnalyses(self):
+        """Get up-to-date mean reversion analyses materialized from the latest price snapshots."""
+        self.logger.log("fetching materialized mean reversion analyses")
+        minimumDatetime = datetime.datetime.utcnow() - datetime.timedelta(minutes=constants.PRICE_DEVIATION_MAX_AGE_MIN)
+        queryFilter = {"watermark_utc_datetime": {"$gte": minimumDatetime}, "lookback_days": constants.LOOKBACK_DAYS}
+        projection = {"_id": False, "utc_datetime": False}
+        analyses = self.mongodb.find("mean_reversion_analysis", filter=queryFilter, projection=projection)
+        return {analysis.pop("ticker"): analysis for analysis in analyses}
+
     ############################
     ##  Account info
     ############################
@@ -107,7 +150,8 @@ class Assistant:
         # fetch equity history
         queryFilter = {"utc_datetime": {"$gte": startingDatetime}}
         querySort = ("utc_datetime", constants.MONGODB_SORT_ASC)
-        equityHistory = self.mongodb.find("equity", filter=queryFilter, sort=querySort)
+        projection = {"_id": False, "usd_balance": True, "equity": True, "utc_datetime": True}
+        equityHistory = self.mongodb.find("equity", filter=queryFilter, sort=querySort, projection=projection)
 
         # verify history exists
         if not equityHistory and verify:
@@ -116,23 +160,33 @@ class Assistant:
         # return equity history
         return equityHistory
 
+    def streamEquityHistory(self, startingDatetime, endingDatetime):
+        """Stream the historical account equity balance within a datetime range."""
+        self.logger.log("streaming equity balance since %s UTC" % startingDatetime.strftime("%Y-%m-%d %H:%M"))
+        queryFilter = {"utc_datetime": {"$gte": startingDatetime, "$lte": endingDatetime}}
+        querySort = ("utc_datetime", constants.MONGODB_SORT_ASC)
+        projection = {"_id": False, "usd_balance": True, "equity": True, "utc_datetime": True}
+        return self.mongodb.find("equity", filter=queryFilter, sort=querySort, projection=projection,
+                                 batchSize=constants.MONGODB_BATCH_SIZE, lazy=True)
+
     ############################
     ##  Order info
     ############################
 
-    def getOpenPositions(self, startingDatetime=None):
+    def getOpenPositions(self, startingDatetime=None, projection=None):
         """Get open positions."""
         if not startingDatetime:
             self.logger.log("fetching open positions")
-            return self.mongodb.find("position")
+            return self.mongodb.find("position", projection=projection)
 
         # filter positions by date if one provided
         self.logger.log("fetching positions opened %s UTC or later" % startingDatetime.strftime("%Y-%m-%d %H:%M"))
-        return self.mongodb.find("position", filter={"utc_datetime": {"$gte": startingDatetime}})
+        return self.mongodb.find("position", filter={"utc_datetime": {"$gte": startingDatetime}}, projection=projection)
 
+    @metrics.timed("assistant.getOrders")
     def getOrders(self, transactionIds):
         """Get order information."""
-        self.logger.log("fetching order information for transactions: %s" % str(transactionIds))
+        self.logger.debug("fetching order information", fields={"transaction_ids": transactionIds})
         return kraken.getOrders(transactionIds)
 
     ############################
@@ -185,3 +239,12 @@ class Assistant:
         if confirmation:
             return True, {"transaction_id": confirmation.get("txid")[0], "description": confirmation.get("descr").get("order")}
         return False, {}
+
+def parsePrices(tickerInfo):
+    """Parse supported price types out of Kraken ticker information."""
+    prices = {}
+    for priceType in constants.KRAKEN_PRICE_CONFIGS:
+        config = constants.KRAKEN_PRICE_CONFIGS.get(priceType)
+        price = tickerInfo.get(config.get("code"))[config.get("api_index")]
+        prices[priceType] = float(price)
+    return prices
@@ -0,0 +1,269 @@
+"""BitBot strategy backtesting module."""
+import constants
+import datetime
+import itertools
+import logger
+import numpy
+import os
+import tempfile
+from concurrent import futures
+from db import history
+
+CLOSE_REASONS = ["open", "trailing_stop_loss", "mean_reverted"]
+INITIAL_CLOSE_WINDOW = 64
+SECONDS_IN_DAY = 3600 * 24
+
+# price histories memory-mapped by each parameter sweep worker
+_sweepPriceHistories = None
+_sweepStartingDatetime = None
+
+class BacktestResult:
+    """Object to store the trades and equity curve of a backtest."""
+    def __init__(self, trades, utcDatetimes, equity):
+        self.trades = trades  # columns of all trades
+        self.utc_datetime = utcDatetimes
+        self.equity = equity  # net profit (realized and unrealized) over time
+
+    def __len__(self):
+        return len(self.trades.get("ticker"))
+
+    def tradeRecords(self):
+        """Get a record of each trade."""
+        columns = {column: values.tolist() for column, values in self.trades.items()}
+        records = [dict(zip(columns.keys(), values)) for values in zip(*columns.values())]
+        for record in records:
+            record["close_reason"] = CLOSE_REASONS[record.get("close_reason")]
+            if record.get("close_reason") == "open":
+                record["close_utc_datetime"] = None
+        return records
+
+    def summary(self):
+        """Summarize the profitability of the backtest."""
+        closed = self.trades.get("close_reason") > 0
+        profits = self.trades.get("profit_usd")
+        drawdowns = numpy.maximum.accumulate(self.equity) - self.equity if len(self.equity) else numpy.zeros(1)
+        return {"trades": len(self),
+                "open_trades": int((~closed).sum()),
+                "win_rate": float((profits[closed] > 0).mean()) if closed.any() else None,
+                "fees_usd": float(self.trades.get("fees_usd").sum()),
+                "net_profit_usd": float(self.equity[-1]) if len(self.equity) else 0.0,
+                "max_drawdown_usd": float(drawdowns.max())}
+
+class Backtester:
+    """Object to replay price history through the mean reversion open rule and trailing stop-loss close rule.
+
+    Positions are opened at every price where the open rule is met (as each
+    scheduled trading session would), filled at the ask when buying and the bid
+    when selling, and closed at the first later price that meets the close rule.
+    """
+    def __init__(self, priceHistories, openThreshold=None, closeThreshold=None, lookbackDays=None,
+                 feeRate=None, marginFeeRate=None, leverage=None, startingDatetime=None):
+        self.logger = logger.Logger("Backtester")
+        self.priceHistories = {ticker: priceHistory for ticker, priceHistory in priceHistories.items() if len(priceHistory)}
+        self.openThreshold = openThreshold or constants.PERCENT_DEVIATION_OPEN_THRESHOLD
+        self.closeThreshold = closeThreshold or constants.PERCENT_TRAILING_CLOSE_THRESHOLD
+        self.lookbackDays = lookbackDays or constants.LOOKBACK_DAYS
+        self.feeRate = constants.BACKTEST_FEE_RATE if feeRate is None else feeRate
+        self.marginFeeRate = constants.BACKTEST_MARGIN_FEE_RATE if marginFeeRate is None else marginFeeRate
+        self.leverage = leverage or constants.DEFAULT_LEVERAGE
+        self.startingDatetime = startingDatetime  # no positions are opened before this datetime
+
+    def run(self):
+        """Replay the price history of all cryptocurrencies."""
+        trades, curves = [], []
+        for ticker, priceHistory in self.priceHistories.items():
+            tickerTrades, equity = self._replay(ticker, priceHistory)
+            trades.append(tickerTrades)
+            curves.append((priceHistory.utc_datetime, equity))
+
+        # combine trades and the equity curves of all cryptocurrencies
+        if not trades:
+            return BacktestResult(_emptyTrades(), numpy.array([], dtype="datetime64[us]"), numpy.array([]))
+        trades = {column: numpy.concatenate([tickerTrades.get(column) for tickerTrades in trades]) for column in trades[0]}
+        utcDatetimes = numpy.unique(numpy.concatenate([utcDatetimes for utcDatetimes, _ in curves]))
+        equity = numpy.zeros(len(utcDatetimes))
+        for tickerDatetimes, tickerEquity in curves:
+            positions = numpy.searchsorted(tickerDatetimes, utcDatetimes, side="right") - 1
+            equity += numpy.where(positions >= 0, tickerEquity[numpy.maximum(positions, 0)], 0.0)
+        self.logger.log("replayed %i trades over %i prices" % (len(trades.get("ticker")), len(utcDatetimes)))
+        return BacktestResult(trades, utcDatetimes, equity)
+
+    def _replay(self, ticker, priceHistory):
+        """Replay the price history of a cryptocurrency."""
+        mids, vwaps, asks, bids = priceHistory.mid, priceHistory.vwap, priceHistory.ask, priceHistory.bid
+        utcDatetimes = priceHistory.utc_datetime
+        lookback = numpy.timedelta64(int(self.lookbackDays * SECONDS_IN_DAY * 1e6), "us")
+        standardDeviations = self._standardDeviations(priceHistory)
+
+        # open wherever the deviation exceeds the threshold once a full lookback window is available
+        with numpy.errstate(divide="ignore", invalid="ignore"):
+            percentDeviations = numpy.abs(mids - vwaps) / standardDeviations
+        isWarm = utcDatetimes - utcDatetimes[0] >= lookback
+        if self.startingDatetime:
+            isWarm &= utcDatetimes >= numpy.datetime64(self.startingDatetime, "us")
+        opens = numpy.flatnonzero(isWarm & (standardDeviations > 0) & (percentDeviations >= self.openThreshold))
+        isBuy = vwaps[opens] > mids[opens]
+        openPrices = numpy.where(isBuy, asks[opens], bids[opens])
+        minimumVolume = constants.KRAKEN_CRYPTO_CONFIGS.get(ticker).get("minimum_volume")
+        volumes = numpy.maximum(constants.BASE_COST_USD / mids[opens], minimumVolume)
+
+        # close at the first price meeting the close rule (positions still open are marked at the last price)
+        closes, closeReasons = self._closes(opens, isBuy, openPrices, asks, bids, vwaps)
+        isClosed = closes >= 0
+        exits = numpy.where(isClosed, closes, len(mids) - 1)
+        closePrices = numpy.where(isBuy, bids[exits], asks[exits])
+        directions = numpy.where(isBuy, 1.0, -1.0)
+
+        # fees: taker fees on both fills plus opening and rollover fees of leveraged (short) positions
+        holdingHours = (utcDatetimes[exits] - utcDatetimes[opens]) / numpy.timedelta64(1, "h")
+        rollovers = numpy.where(isClosed, 1 + numpy.floor(holdingHours / constants.BACKTEST_ROLLOVER_HOURS), 1)
+        openFees = self.feeRate * openPrices * volumes + numpy.where(isBuy, 0.0, self.marginFeeRate * openPrices * volumes)
+        closeFees = numpy.where(isClosed, self.feeRate * closePrices * volumes, 0.0) \
+            + numpy.where(isBuy, 0.0, self.marginFeeRate * openPrices * volumes * (rollovers - 1))
+        grossProfits = directions * (closePrices - openPrices) * volumes
+
+        # equity: realized profit net of fees plus unrealized profit of open positions
+        size = len(mids)
+        realized = numpy.bincount(opens, weights=-openFees, minlength=size) \
+            + numpy.bincount(closes[isClosed], weights=(grossProfits - closeFees)[isClosed], minlength=size)
+
+        def openTotals(values):
+            """Total values of the positions open at each price."""
+            return numpy.cumsum(numpy.bincount(opens, weights=values, minlength=size)
+                                - numpy.bincount(closes[isClosed], weights=values[isClosed], minlength=size))
+
+        longVolumes = openTotals(numpy.where(isBuy, volumes, 0.0))
+        shortVolumes = openTotals(numpy.where(isBuy, 0.0, volumes))
+        costs = openTotals(directions * volumes * openPrices)
+        equity = numpy.cumsum(realized) + longVolumes * bids - shortVolumes * asks - costs
+
+        # return trades and equity curve
+        trades = {"ticker": numpy.full(len(opens), ticker),
+                  "order_type": numpy.where(isBuy, "buy", "sell"),
+                  "leverage": numpy.where(isBuy, 0.0, self.leverage),
+                  "volume": volumes,
+                  "open_utc_datetime": utcDatetimes[opens].astype(datetime.datetime),
+                  "close_utc_datetime": utcDatetimes[exits].astype(datetime.datetime),
+                  "open_price": openPrices,
+                  "close_price": closePrices,
+                  "close_reason": closeReasons,
+                  "fees_usd": openFees + closeFees,
+                  "profit_usd": grossProfits - openFees - closeFees}
+        return trades, equity
+
+    def _standardDeviations(self, priceHistory):
+        """Standard deviation of prices from the VWAP over the lookback window before each price (0 if there are none).
+
+        Matches the live analysis, where the stored price history excludes the
+        current price being analyzed.
+        """
+        mids, vwaps, utcDatetimes = priceHistory.mid, priceHistory.vwap, priceHistory.utc_datetime
+        lookback = numpy.timedelta64(int(self.lookbackDays * SECONDS_IN_DAY * 1e6), "us")
+        deviationsSquaredSums = numpy.concatenate([[0.0], numpy.cumsum(numpy.square(mids - vwaps))])
+        starts = numpy.searchsorted(utcDatetimes, utcDatetimes - lookback, side="left")
+        counts = numpy.arange(len(mids)) - starts
+        return numpy.sqrt(numpy.maximum(deviationsSquaredSums[:-1] - deviationsSquaredSums[starts], 0.0) / numpy.maximum(counts, 1))
+
+    def _closes(self, opens, isBuy, openPrices, asks, bids, vwaps):
+        """Find the first price meeting the close rule after each open (-1 if never met).
+
+        Scans a window of prices after all pending positions at once, widening the
+        window for positions that are not closed within it.
+        """
+        closes = numpy.full(len(opens), -1)
+        closeReasons = numpy.zeros(len(opens), dtype=int)
+        pending = numpy.arange(len(opens))
+        window = INITIAL_CLOSE_WINDOW
+        while len(pending):
+            indices = opens[pending][:, None] + numpy.arange(1, window + 1)
+            isValid = indices < len(asks)
+            indices = numpy.minimum(indices, len(asks) - 1)
+            isPendingBuy = isBuy[pending][:, None]
+
+            # trailing stop-loss from the most profitable price since open
+            currentPrices = numpy.where(isPendingBuy, bids[indices], asks[indices])
+            peaks = numpy.maximum(numpy.maximum.accumulate(bids[indices], axis=1), openPrices[pending][:, None])
+            valleys = numpy.minimum(numpy.minimum.accumulate(asks[indices], axis=1), openPrices[pending][:, None])
+            trailingPercentages = numpy.where(isPendingBuy, (peaks - currentPrices) / peaks, (currentPrices - valleys) / valleys)
+            isTrailing = trailingPercentages >= self.closeThreshold
+
+            # reversion to the VWAP
+            isReverted = numpy.where(isPendingBuy, currentPrices >= vwaps[indices], currentPrices <= vwaps[indices])
+
+            # record the first close of each position
+            isClose = (isTrailing | isReverted) & isValid
+            isFound = isClose.any(axis=1)
+            firsts = isClose.argmax(axis=1)
+            found = pending[isFound]
+            closes[found] = indices[isFound, firsts[isFound]]
+            closeReasons[found] = numpy.where(isReverted[isFound, firsts[isFound]], 2, 1)
+
+            # widen the window for positions not closed before the end of the window
+            pending = pending[~isFound & isValid[:, -1]]
+            window *= 4
+        return closes, closeReasons
+
+def sweep(priceHistories, openThresholds, closeThresholds, lookbackDays):
+    """Backtest every combination of strategy parameters, ranked by net profit.
+
+    Price histories are written once to memory-mapped files that every worker
+    process maps read-only, rather than being copied into each worker. Every
+    combination trades the same period, starting after the longest lookback window.
+    """
+    priceHistories = {ticker: priceHistory for ticker, priceHistory in priceHistories.items() if len(priceHistory)}
+    if not priceHistories:
+        return []
+    firstDatetime = min(priceHistory.utc_datetime[0] for priceHistory in priceHistories.values())
+    startingDatetime = (firstDatetime + numpy.timedelta64(int(max(lookbackDays) * SECONDS_IN_DAY * 1e6), "us")).astype(datetime.datetime)
+
+    # backtest each combination in the worker pool
+    grid = list(itertools.product(openThresholds, closeThresholds, lookbackDays))
+    with tempfile.TemporaryDirectory() as directory:
+        layout = _mapPriceHistories(directory, priceHistories)
+        with futures.ProcessPoolExecutor(max_workers=constants.BACKTEST_SWEEP_WORKERS or None,
+                                         initializer=_initSweepWorker, initargs=(layout, startingDatetime)) as pool:
+            results = list(pool.map(_sweepBacktest, grid))
+    return sorted(results, key=lambda result: result.get("net_profit_usd"), reverse=True)
+
+def _mapPriceHistories(directory, priceHistories):
+    """Write price histories to memory-mapped files, returning the layout of each ticker."""
+    size = sum(len(priceHistory) for priceHistory in priceHistories.values())
+    utcDatetimes = numpy.memmap(os.path.join(directory, "utc_datetime.dat"), dtype="int64", mode="w+", shape=(size,))
+    prices = numpy.memmap(os.path.join(directory, "prices.dat"), dtype=float, mode="w+", shape=(3, size))
+    tickerLayouts, start = [], 0
+    for ticker, priceHistory in priceHistories.items():
+        end = start + len(priceHistory)
+        utcDatetimes[start:end] = priceHistory.utc_datetime.astype("datetime64[us]").astype("int64")
+        prices[:, start:end] = [priceHistory.ask, priceHistory.bid, priceHistory.vwap]
+        tickerLayouts.append((ticker, start, end))
+        start = end
+    utcDatetimes.flush()
+    prices.flush()
+    return directory, size, tickerLayouts
+
+def _initSweepWorker(layout, startingDatetime):
+    """Map the price histories shared by all sweep workers (read-only)."""
+    global _sweepPriceHistories, _sweepStartingDatetime
+    directory, size, tickerLayouts = layout
+    utcDatetimes = numpy.memmap(os.path.join(directory, "utc_datetime.dat"), dtype="int64", mode="r", shape=(size,))
+    prices = numpy.memmap(os.path.join(directory, "prices.dat"), dtype=float, mode="r", shape=(3, size))
+    _sweepPriceHistories = {ticker: history.PriceHistory(ticker, utcDatetimes[start:end].view("datetime64[us]"),
+                                                         prices[0, start:end], prices[1, start:end], None, None,
+                                                         prices[2, start:end])
+                            for ticker, start, end in tickerLayouts}
+    _sweepStartingDatetime = startingDatetime
+
+def _sweepBacktest(parameters):
+    """Backtest a combination of strategy parameters in a sweep worker."""
+    openThreshold, closeThreshold, lookbackDays = parameters
+    result = Backtester(_sweepPriceHistories, openThreshold=openThreshold, closeThreshold=closeThreshold,
+                        lookbackDays=lookbackDays, startingDatetime=_sweepStartingDatetime).run()
+    return dict({"open_threshold": openThreshold, "close_threshold": closeThreshold, "lookback_days": lookbackDays},
+                **result.summary())
+
+def _emptyTrades():
+    """Get trade columns without trades."""
+    return {"ticker": numpy.array([], dtype=str), "order_type": numpy.array([], dtype=str), "leverage": numpy.array([]),
+            "volume": numpy.array([]), "open_utc_datetime": numpy.array([], dtype=object),
+            "close_utc_datetime": numpy.array([], dtype=object), "open_price": numpy.array([]), "close_price": numpy.array([]),
+            "close_reason": numpy.array([], dtype=int), "fees_usd": numpy.array([]), "profit_usd": numpy.array([])}
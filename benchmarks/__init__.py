@@ -0,0 +1,10 @@
+"""BitBot benchmarks package."""
+import testenv
+
+testenv.setDefaults("benchmark")
+
+# keep benchmark results on stdout parseable by writing log records to stderr
+import logger
+import sys
+
+logger.writer.stream = sys.stderr
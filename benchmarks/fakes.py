@@ -0,0 +1,112 @@
+"""Benchmark database and Kraken API stand-ins module."""
+import operator
+
+# comparisons of query filter operators
+COMPARISONS = {"$gt": operator.gt, "$gte": operator.ge, "$lt": operator.lt, "$lte": operator.le, "$ne": operator.ne}
+
+class InMemoryDB:
+    """Object to stand in for BitBotDB with collections held in memory.
+
+    Supports the queries of the benchmarked paths: equality and comparison
+    filters combined with $or, a single sort key, top-level projections, and
+    $match/$sort/$group ($push) aggregation pipelines.
+    """
+    def __init__(self):
+        self.collections = {}
+
+    def insert(self, model):
+        """Insert a single entry into the collection."""
+        self.collections.setdefault(model.collectionName, []).append(dict(model.__dict__))
+
+    def insertMany(self, models):
+        """Insert mutliple entries into the collection."""
+        self.collections.setdefault(models[0].collectionName, []).extend(dict(model.__dict__) for model in models)
+
+    def aggregate(self, collectionName, pipeline):
+        """Run an aggregation pipeline on the collection."""
+        documents = self.collections.get(collectionName, [])
+        for stage in pipeline:
+            if "$match" in stage:
+                documents = [document for document in documents if _matches(document, stage.get("$match"))]
+            elif "$sort" in stage:
+                documents = _sort(documents, list(stage.get("$sort").items())[0])
+            elif "$group" in stage:
+                documents = _group(documents, stage.get("$group"))
+            else:
+                raise RuntimeError("aggregation stage not supported: %s" % str(stage))
+        return list(documents)
+
+    def find(self, collectionName, filter={}, sort=(), projection=None, batchSize=None, lazy=False):
+        """Find entries in the collection."""
+        documents = [document for document in self.collections.get(collectionName, []) if _matches(document, filter)]
+        if sort:
+            documents = _sort(documents, sort)
+        documents = [_project(document, projection) for document in documents]
+        if lazy:
+            return (document for document in documents)
+        return documents
+
+class FakeKrakenAPI:
+    """Object to answer public and private Kraken API queries from fixed prices and balances."""
+    def __init__(self, prices, balances):
+        self.prices = prices  # current prices by asset pair
+        self.balances = balances
+
+    def query_public(self, method, data=None):
+        """Answer a public API query."""
+        if method != "Ticker":
+            raise RuntimeError("public method not supported: %s" % method)
+        result = {pair: {"a": [str(prices.get("ask")), "1", "1.000"],
+                         "b": [str(prices.get("bid")), "1", "1.000"],
+                         "h": [str(prices.get("high")), str(prices.get("high"))],
+                         "l": [str(prices.get("low")), str(prices.get("low"))],
+                         "p": [str(prices.get("vwap")), str(prices.get("vwap"))]}
+                  for pair, prices in self.prices.items() if pair in data.get("pair").split(",")}
+        return {"error": [], "result": result}
+
+    def query_private(self, method, data=None):
+        """Answer a private API query."""
+        if method not in self.balances:
+            raise RuntimeError("private method not supported: %s" % method)
+        return {"error": [], "result": {code: str(balance) for code, balance in self.balances.get(method).items()}}
+
+def _matches(document, queryFilter):
+    """Determine if a document matches a query filter."""
+    for field, condition in queryFilter.items():
+        if field == "$or":
+            if not any(_matches(document, subfilter) for subfilter in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = document.get(field)
+            for _operator, operand in condition.items():
+                if value is None or not COMPARISONS.get(_operator)(value, operand):
+                    return False
+        elif document.get(field) != condition:
+            return False
+    return True
+
+def _sort(documents, sort):
+    """Sort documents by a single field."""
+    field, direction = sort
+    return sorted(documents, key=lambda document: document.get(field), reverse=direction < 0)
+
+def _project(document, projection):
+    """Apply a top-level inclusion or exclusion projection to a document."""
+    if not projection:
+        return dict(document)
+    included = [field for field, isIncluded in projection.items() if isIncluded]
+    if included:
+        return {field: document.get(field) for field in included if field in document}
+    return {field: value for field, value in document.items() if projection.get(field, True)}
+
+def _group(documents, group):
+    """Group documents by a field, pushing the values of other fields into arrays."""
+    keyField = group.get("_id").lstrip("$")
+    accumulators = {field: accumulator.get("$push").lstrip("$") for field, accumulator in group.items() if field != "_id"}
+    groups = {}
+    for document in documents:
+        key = document.get(keyField)
+        grouped = groups.setdefault(key, dict({"_id": key}, **{field: [] for field in accumulators}))
+        for field, sourceField in accumulators.items():
+            grouped[field].append(document.get(sourceField))
+    return list(groups.values())
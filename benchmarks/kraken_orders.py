@@ -0,0 +1,62 @@
+"""Kraken order query benchmark module.
+
+Runs kraken.getOrders against a local fake Kraken server to show how latency
+scales with the number of open positions.
+
+Usage: python -m benchmarks.kraken_orders
+"""
+import constants
+import http.server
+import json
+import threading
+import time
+import urllib.parse
+from kraken import kraken
+
+POSITION_COUNTS = [50, 250, 500, 750]
+SERVER_LATENCY_SEC = 0.1
+
+class FakeKrakenHandler(http.server.BaseHTTPRequestHandler):
+    """Object to answer QueryOrders requests like Kraken (after a fixed latency)."""
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length")))
+        transactionIds = urllib.parse.parse_qs(body.decode()).get("txid")[0].split(",")
+        time.sleep(SERVER_LATENCY_SEC)
+
+        # respond with a closed order per transaction
+        result = {transactionId: {"status": "closed", "closetm": time.time(), "descr": {"type": "buy"}}
+                  for transactionId in transactionIds}
+        resp = json.dumps({"error": [], "result": result}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(resp)))
+        self.end_headers()
+        self.wfile.write(resp)
+
+    def log_message(self, *args):
+        """Silence request logging."""
+
+def _timeOrders(transactionIds, workers):
+    """Time fetching orders with a number of workers and a fresh call counter."""
+    constants.KRAKEN_QUERY_WORKERS = workers
+    kraken.privateCallCounter.count = 0.0
+    start = time.perf_counter()
+    orders = kraken.getOrders(transactionIds)
+    elapsed = time.perf_counter() - start
+    if list(orders.keys()) != transactionIds:
+        raise RuntimeError("orders were not merged in order")
+    return elapsed
+
+if __name__ == "__main__":
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), FakeKrakenHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    kraken.kraken.uri = "http://127.0.0.1:%i" % server.server_address[1]
+
+    # compare sequential and concurrent chunk queries
+    workers = constants.KRAKEN_QUERY_WORKERS
+    for positionCount in POSITION_COUNTS:
+        transactionIds = ["O%06i-BENCH-MARK00" % i for i in range(positionCount)]
+        sequentialSeconds = _timeOrders(transactionIds, 1)
+        concurrentSeconds = _timeOrders(transactionIds, workers)
+        print("%i positions: sequential %.3fs, %i workers %.3fs" % (positionCount, sequentialSeconds, workers, concurrentSeconds))
+    server.shutdown()
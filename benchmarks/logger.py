@@ -0,0 +1,55 @@
+"""Logger benchmark module.
+
+Compares the per-call overhead of the original print-based logger with the
+queued structured logger (info records, and debug records while debug logging
+is disabled). All log output is written to the null device.
+
+Usage: python -m benchmarks.logger
+"""
+import contextlib
+import logger
+import os
+import sys
+import time
+
+CALLS = 100000
+
+# analysis dumped by each approved trade
+ANALYSIS = {"current_volume_weighted_average_price": 100.5,
+            "current_deviation": 1.25,
+            "current_percent_deviation": 2.4,
+            "current_price": 101.75,
+            "standard_deviation": 0.52}
+
+def _printLog(componentName, text):
+    """Reference implementation of the original print-based log call."""
+    prefix = "{%s} ::" % componentName
+    print("%s %s" % (prefix, text))
+
+def _time(method, *args, **kwargs):
+    """Get the mean execution time of a method in microseconds."""
+    start = time.perf_counter()
+    for _ in range(CALLS):
+        method(*args, **kwargs)
+    return 1e6 * (time.perf_counter() - start) / CALLS
+
+if __name__ == "__main__":
+    with open(os.devnull, "w") as devnull:
+        logger.writer.stream = devnull
+        logger.LEVEL = logger.LEVELS.get("info")
+        _logger = logger.Logger("Benchmark")
+
+        # time print-based, queued and discarded log calls
+        with contextlib.redirect_stdout(devnull):
+            printMicroseconds = _time(_printLog, "Benchmark", ANALYSIS)
+        queuedMicroseconds = _time(_logger.log, "BTC position approved!", fields=ANALYSIS)
+        start = time.perf_counter()
+        logger.flush()
+        flushSeconds = time.perf_counter() - start
+        debugMicroseconds = _time(_logger.debug, "analyzed price deviations", fields=ANALYSIS)
+        logger.writer.stream = sys.stderr
+
+    # display results
+    print("%i calls: print %.2fus, queued %.2fus (%.1fx), disabled debug %.2fus (%.1fx), writer drained %.3fs after last call"
+          % (CALLS, printMicroseconds, queuedMicroseconds, printMicroseconds / queuedMicroseconds,
+             debugMicroseconds, printMicroseconds / debugMicroseconds, flushSeconds))
@@ -0,0 +1,74 @@
+"""Mean reversion algo benchmark module.
+
+Usage: python -m benchmarks.mean_reversion
+"""
+import constants
+import datetime
+import math
+import numpy
+import statistics
+import time
+from algos import mean_reversion
+from db import history
+
+SIZES = [10000, 100000]
+REPETITIONS = 3
+
+def _syntheticHistory(size):
+    """Generate a random walk price history."""
+    random = numpy.random.RandomState(size)
+    mids = 100 + numpy.cumsum(random.normal(0, 0.1, size))
+    spreads = random.uniform(0.01, 0.1, size)
+    vwaps = mids + random.normal(0, 0.5, size)
+    utcDatetimes = numpy.datetime64(datetime.datetime.utcnow(), "us") - numpy.arange(size)[::-1] * numpy.timedelta64(5, "m")
+    return history.PriceHistory("BTC", utcDatetimes, mids + spreads, mids - spreads, mids, mids, vwaps)
+
+def _analyzeLoop(currentPrices, priceHistory):
+    """Reference implementation of the original per-row mean reversion loop."""
+    upperBollinger, lowerBollinger = [], []
+    deviationsSquaredSum = 0.0
+    rows = zip(priceHistory.ask.tolist(), priceHistory.bid.tolist(), priceHistory.vwap.tolist())
+    for i, (ask, bid, vwap) in enumerate(rows, 1):
+        price = statistics.mean([ask, bid])
+        priceDeviation = abs(price - vwap)
+        deviationsSquaredSum += priceDeviation ** 2
+        movingStandardDeviation = math.sqrt(deviationsSquaredSum / i)
+        upperBollinger.append([vwap + (movingStandardDeviation * constants.PERCENT_DEVIATION_OPEN_THRESHOLD)])
+        lowerBollinger.append([vwap - (movingStandardDeviation * constants.PERCENT_DEVIATION_OPEN_THRESHOLD)])
+    standardDeviation = math.sqrt(deviationsSquaredSum / len(priceHistory))
+    upperBollinger.append([currentPrices.get("vwap") + (standardDeviation * constants.PERCENT_DEVIATION_OPEN_THRESHOLD)])
+    lowerBollinger.append([currentPrices.get("vwap") - (standardDeviation * constants.PERCENT_DEVIATION_OPEN_THRESHOLD)])
+    return standardDeviation, upperBollinger, lowerBollinger
+
+def _time(method, *args):
+    """Get the best execution time of a method in seconds."""
+    best = None
+    for _ in range(REPETITIONS):
+        start = time.perf_counter()
+        result = method(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+if __name__ == "__main__":
+    currentPrices = {"ask": 100.05, "bid": 99.95, "vwap": 100.5}
+    for size in SIZES:
+        priceHistory = _syntheticHistory(size)
+
+        # time loop and vectorized implementations
+        loopSeconds, (standardDeviation, upperBollinger, lowerBollinger) = _time(_analyzeLoop, currentPrices, priceHistory)
+        meanReversion = mean_reversion.MeanReversion(currentPrices, priceHistory)
+        vectorizedSeconds, analysis = _time(meanReversion.analyze)
+        batchSeconds, _ = _time(mean_reversion.MeanReversion.analyzeMany,
+                                {ticker: currentPrices for ticker in constants.SUPPORTED_TICKERS},
+                                {ticker: priceHistory for ticker in constants.SUPPORTED_TICKERS})
+
+        # verify results match exactly
+        if analysis.standard_deviation != standardDeviation \
+                or meanReversion.upperBollinger.tolist() != [band[0] for band in upperBollinger] \
+                or meanReversion.lowerBollinger.tolist() != [band[0] for band in lowerBollinger]:
+            raise RuntimeError("vectorized analysis does not match loop analysis for %i prices" % size)
+
+        # display results
+        print("%i prices: loop %.4fs, vectorized %.4fs (%.1fx), batch of %i tickers %.4fs"
+              % (size, loopSeconds, vectorizedSeconds, loopSeconds / vectorizedSeconds, len(constants.SUPPORTED_TICKERS), batchSeconds))
@@ -0,0 +1,93 @@
+"""Price storage benchmark module.
+
+Stores the same synthetic prices as individual documents and as hourly buckets
+in a dedicated benchmark database (requires a running MongoDB at
+MONGODB_BENCHMARK_URI), then compares storage size and the latency of reading
+the prices of all tickers. The benchmark database is dropped afterwards, so
+MONGODB_URI is never used.
+
+Usage: python -m benchmarks.price_storage [days]
+"""
+import constants
+import datetime
+import flask
+import numpy
+import os
+import pymongo
+import sys
+import time
+from db import buckets
+from db import db
+from db import history
+from db import models
+from pymongo import uri_parser
+
+DEFAULT_DAYS = 30
+MONGODB_BENCHMARK_URI = os.environ.get("MONGODB_BENCHMARK_URI", "mongodb://127.0.0.1:27017/bitbot_benchmark")
+REPETITIONS = 3
+
+def _syntheticHistory(ticker, days):
+    """Generate a random walk price history at the ingestion resolution."""
+    size = int(days * 24 * 3600 / constants.INGEST_RESOLUTION_SEC)
+    random = numpy.random.RandomState(size)
+    mids = 100 + numpy.cumsum(random.normal(0, 0.1, size))
+    spreads = random.uniform(0.01, 0.1, size)
+    vwaps = mids + random.normal(0, 0.5, size)
+    utcDatetimes = numpy.datetime64(datetime.datetime.utcnow(), "s").astype("datetime64[us]") \
+        - numpy.arange(size)[::-1] * numpy.timedelta64(constants.INGEST_RESOLUTION_SEC, "s")
+    return history.PriceHistory(ticker, utcDatetimes, mids + spreads, mids - spreads, mids + 1, mids - 1, vwaps)
+
+def _collectionStats(mongodb, collectionName):
+    """Get the document count and sizes of a collection."""
+    stats = mongodb.mongo.db.command("collStats", collectionName)
+    return "%i documents, %.1f MB data, %.1f MB storage, %.1f MB indexes" % (stats.get("count"),
+                                                                           stats.get("size") / 1e6,
+                                                                           stats.get("storageSize") / 1e6,
+                                                                           stats.get("totalIndexSize") / 1e6)
+
+def _timeReads(mongodb, datetimeFilters, bucketed):
+    """Time reading price histories of all tickers (best of several repetitions)."""
+    timings = []
+    for _ in range(REPETITIONS):
+        start = time.perf_counter()
+        priceHistories = history.fetchPriceHistories(mongodb, datetimeFilters, bucketed=bucketed)
+        timings.append(time.perf_counter() - start)
+    return min(timings), sum(len(priceHistory) for priceHistory in priceHistories.values())
+
+def _benchmarkDatabaseName(uri):
+    """Get the name of the benchmark database, refusing the BitBot database."""
+    databaseName = uri_parser.parse_uri(uri).get("database")
+    if not databaseName or databaseName == constants.MONGODB_NAME:
+        raise RuntimeError("benchmark database must be a dedicated database: %s" % uri)
+    return databaseName
+
+if __name__ == "__main__":
+    days = float(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_DAYS
+    databaseName = _benchmarkDatabaseName(MONGODB_BENCHMARK_URI)
+    client = pymongo.MongoClient(MONGODB_BENCHMARK_URI, serverSelectionTimeoutMS=5000)
+    client.drop_database(databaseName)
+    mongodb = db.BitBotDB(flask.Flask(__name__), uri=MONGODB_BENCHMARK_URI)
+    mongodb.ensureIndexes()
+
+    # store the same prices in both formats
+    for ticker in constants.SUPPORTED_TICKERS:
+        priceHistory = _syntheticHistory(ticker, days)
+        snapshots = [models.Price(ticker, ask, bid, high, low, vwap, utcDatetime=utcDatetime)
+                     for utcDatetime, ask, bid, high, low, vwap in zip(priceHistory.utc_datetime.tolist(),
+                                                                       priceHistory.ask.tolist(),
+                                                                       priceHistory.bid.tolist(),
+                                                                       priceHistory.high.tolist(),
+                                                                       priceHistory.low.tolist(),
+                                                                       priceHistory.vwap.tolist())]
+        for i in range(0, len(snapshots), constants.MONGODB_BATCH_SIZE):
+            mongodb.mongo.db["price"].insert_many([snapshot.__dict__ for snapshot in snapshots[i:i + constants.MONGODB_BATCH_SIZE]])
+        mongodb.upsertMany(buckets.COLLECTION_NAME, buckets.appendUpdates(priceHistory))
+
+    # compare storage size and read latency
+    startingDatetime = datetime.datetime.utcnow() - datetime.timedelta(days=days)
+    datetimeFilters = {ticker: {"$gte": startingDatetime} for ticker in constants.SUPPORTED_TICKERS}
+    for storageName, collectionName, bucketed in [("documents", "price", False), ("buckets", buckets.COLLECTION_NAME, True)]:
+        seconds, count = _timeReads(mongodb, datetimeFilters, bucketed)
+        print("%s: %s" % (storageName, _collectionStats(mongodb, collectionName)))
+        print("%s: read %i prices over %g days in %.3fs" % (storageName, count, days, seconds))
+    client.drop_database(databaseName)
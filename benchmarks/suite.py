@@ -0,0 +1,191 @@
+"""Hot path benchmark suite module.
+
+Times the algos, assistant and visualizer hot paths over synthetic price and
+equity histories of each size, against an in-memory database and a fake Kraken
+API. Results (best time and peak traced memory) are written as JSON and can be
+compared against a saved baseline, failing when any result regresses.
+
+Usage: python -m benchmarks.suite [--sizes 1000,10000,100000] [--cases mean_reversion,assistant]
+                                  [--output results.json] [--baseline baseline.json] [--tolerance 0.25]
+"""
+import argparse
+import assistant
+import constants
+import json
+import numpy
+import platform
+import sys
+import time
+import tracemalloc
+import visualizer
+from algos import linear_regression
+from algos import mean_reversion
+from algos import trailing_stop_loss
+from benchmarks import fakes
+from benchmarks import synthetic
+from kraken import cache
+from kraken import kraken
+
+DEFAULT_SIZES = "1000,10000,100000"
+DEFAULT_TOLERANCE = 0.25
+MINIMUM_REGRESSION_BYTES = 64 * 1024  # ignore differences within allocator noise
+MINIMUM_REGRESSION_SEC = 0.002  # ignore differences within timer noise
+REPETITIONS = 5
+TICKER = "BTC"
+
+############################
+##  Cases
+############################
+
+def _meanReversion(size):
+    priceHistory = synthetic.priceHistory(TICKER, size)
+    return mean_reversion.MeanReversion(synthetic.currentPrices(priceHistory), priceHistory).analyze
+
+def _trailingStopLoss(size):
+    priceHistory = synthetic.priceHistory(TICKER, size)
+    currentPrices = synthetic.currentPrices(priceHistory)
+    trailingStopLoss = trailing_stop_loss.TrailingStopLoss(TICKER, "buy", None, 1.0, currentPrices.get("bid"), currentPrices.get("vwap"),
+                                                           float(priceHistory.ask[0]), priceHistory)
+    return trailingStopLoss.analyze
+
+def _linearRegression(size):
+    priceHistory = synthetic.priceHistory(TICKER, size)
+    currentPrice = float(priceHistory.mid[-1])
+    return lambda: linear_regression.LinearRegression(currentPrice, priceHistory)
+
+def _getPriceHistory(size):
+    mongodb = fakes.InMemoryDB()
+    mongodb.insertMany(synthetic.priceModels(synthetic.priceHistory(TICKER, size)))
+    return lambda: assistant.Assistant(mongodb).getPriceHistory(TICKER)  # cold cache
+
+def _getEquityHistory(size):
+    mongodb = fakes.InMemoryDB()
+    mongodb.insertMany(synthetic.equityModels(size))
+    return assistant.Assistant(mongodb).getEquityHistory
+
+def _getPrices(size):
+    prices = {}
+    for ticker in constants.SUPPORTED_TICKERS:
+        pair = constants.KRAKEN_CRYPTO_CONFIGS.get(ticker).get("usd_pair")
+        prices[pair] = synthetic.currentPrices(synthetic.priceHistory(ticker, 1))
+    kraken.kraken = fakes.FakeKrakenAPI(prices, {})
+    kraken.priceCache = cache.CoalescingCache(0)  # fetch on every call
+
+    def getPrices():
+        kraken.publicCallCounter.count = 0.0
+        return assistant.Assistant(fakes.InMemoryDB()).getPrices()
+    return getPrices
+
+def _visualizePrice(size):
+    priceHistory = synthetic.priceHistory(TICKER, size)
+    currentPrices = synthetic.currentPrices(priceHistory)
+    return lambda: visualizer.visualizePrice(TICKER, currentPrices, priceHistory)
+
+def _visualizeEquity(size):
+    equityHistory = [dict(entry.__dict__) for entry in synthetic.equityModels(size)]
+    return lambda: visualizer.visualizeEquity(equityHistory[-1].get("equity"), equityHistory[-1].get("usd_balance"), equityHistory)
+
+# cases by name: (setup returning the method to time, whether the case depends on history size)
+CASES = {"mean_reversion.analyze": (_meanReversion, True),
+         "trailing_stop_loss.analyze": (_trailingStopLoss, True),
+         "linear_regression.generate": (_linearRegression, True),
+         "assistant.getPriceHistory": (_getPriceHistory, True),
+         "assistant.getEquityHistory": (_getEquityHistory, True),
+         "assistant.getPrices": (_getPrices, False),
+         "visualizer.visualizePrice": (_visualizePrice, True),
+         "visualizer.visualizeEquity": (_visualizeEquity, True)}
+
+############################
+##  Measurements
+############################
+
+def measure(method, repetitions=REPETITIONS):
+    """Get the best execution time in seconds and the peak traced memory in bytes of a method."""
+    method()  # warm up
+    seconds = None
+    for _ in range(repetitions):
+        start = time.perf_counter()
+        method()
+        elapsed = time.perf_counter() - start
+        seconds = elapsed if seconds is None else min(seconds, elapsed)
+
+    # trace memory separately (tracing slows execution)
+    tracemalloc.start()
+    method()
+    _, peakMemory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return seconds, peakMemory
+
+def run(caseNames, sizes, repetitions=REPETITIONS):
+    """Run benchmark cases over each history size."""
+    results = []
+    for caseName in caseNames:
+        setup, isSized = CASES.get(caseName)
+        for size in sizes if isSized else [None]:
+            seconds, peakMemory = measure(setup(size or 0), repetitions=repetitions)
+            results.append({"case": caseName, "size": size, "seconds": seconds, "peak_memory_bytes": peakMemory})
+    return results
+
+def compare(results, baselineResults, tolerance):
+    """Compare results against baseline results, returning descriptions of regressions."""
+    baselines = {(result.get("case"), result.get("size")): result for result in baselineResults}
+    regressions = []
+    for result in results:
+        baseline = baselines.get((result.get("case"), result.get("size")))
+        if not baseline:
+            continue
+        result["baseline_seconds"] = baseline.get("seconds")
+        result["baseline_peak_memory_bytes"] = baseline.get("peak_memory_bytes")
+        seconds, baselineSeconds = result.get("seconds"), baseline.get("seconds")
+        if seconds > baselineSeconds * (1 + tolerance) and seconds - baselineSeconds > MINIMUM_REGRESSION_SEC:
+            regressions.append("%s took %.2fms, baseline %.2fms" % (_name(result), seconds * 1e3, baselineSeconds * 1e3))
+        peakMemory, baselinePeakMemory = result.get("peak_memory_bytes"), baseline.get("peak_memory_bytes")
+        if peakMemory > baselinePeakMemory * (1 + tolerance) and peakMemory - baselinePeakMemory > MINIMUM_REGRESSION_BYTES:
+            regressions.append("%s peaked at %.2f MB, baseline %.2f MB" % (_name(result), peakMemory / 1e6, baselinePeakMemory / 1e6))
+    return regressions
+
+def _name(result):
+    """Name a benchmark result by case and size."""
+    if result.get("size") is None:
+        return result.get("case")
+    return "%s (%i rows)" % (result.get("case"), result.get("size"))
+
+def _describe(result):
+    """Describe a benchmark result."""
+    description = "%s: %.2fms, %.2f MB peak" % (_name(result), result.get("seconds") * 1e3, result.get("peak_memory_bytes") / 1e6)
+    if result.get("baseline_seconds"):
+        description += " (%+.0f%% time vs baseline)" % (100 * (result.get("seconds") / result.get("baseline_seconds") - 1))
+    return description
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.suite")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="comma-separated history sizes")
+    parser.add_argument("--cases", default="", help="comma-separated case names or prefixes (default: all)")
+    parser.add_argument("--repetitions", type=int, default=REPETITIONS)
+    parser.add_argument("--output", help="path to write JSON results to")
+    parser.add_argument("--baseline", help="path of JSON results to compare against")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="allowed fractional slowdown")
+    args = parser.parse_args()
+
+    # run selected cases
+    prefixes = [prefix for prefix in args.cases.split(",") if prefix]
+    caseNames = [caseName for caseName in CASES if not prefixes or any(caseName.startswith(prefix) for prefix in prefixes)]
+    sizes = [int(size) for size in args.sizes.split(",")]
+    results = run(caseNames, sizes, repetitions=args.repetitions)
+
+    # compare against baseline
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as baselineFile:
+            regressions = compare(results, json.load(baselineFile).get("results"), args.tolerance)
+
+    # write and display results
+    report = {"python": platform.python_version(), "numpy": numpy.__version__, "machine": platform.machine(), "results": results}
+    if args.output:
+        with open(args.output, "w") as outputFile:
+            json.dump(report, outputFile, indent=2)
+    for result in results:
+        print(_describe(result))
+    if regressions:
+        print("\n".join(["regressions:"] + regressions))
+        sys.exit(1)
@@ -0,0 +1,52 @@
+"""Synthetic benchmark data module."""
+import constants
+import datetime
+import numpy
+from db import history
+from db import models
+
+SECONDS_IN_DAY = 3600 * 24
+
+def priceHistory(ticker, size, days=None):
+    """Generate a random walk price history of evenly spaced prices ending now (within the lookback window by default)."""
+    days = days or constants.LOOKBACK_DAYS
+    random = numpy.random.RandomState(size)
+    mids = 100 + numpy.cumsum(random.normal(0, 0.1, size))
+    spreads = random.uniform(0.01, 0.1, size)
+    vwaps = mids + random.normal(0, 0.5, size)
+    spacing = numpy.timedelta64(int(days * SECONDS_IN_DAY * 1e6 / max(size, 1)), "us")
+    utcDatetimes = numpy.datetime64(datetime.datetime.utcnow(), "us") - numpy.arange(size)[::-1] * spacing
+    return history.PriceHistory(ticker, utcDatetimes, mids + spreads, mids - spreads, mids + 1, mids - 1, vwaps)
+
+def priceModels(priceHistory):
+    """Convert a price history into price database entries."""
+    return [models.Price(priceHistory.ticker, ask, bid, high, low, vwap, utcDatetime=utcDatetime)
+            for utcDatetime, ask, bid, high, low, vwap in zip(priceHistory.utc_datetime.astype(datetime.datetime).tolist(),
+                                                              priceHistory.ask.tolist(),
+                                                              priceHistory.bid.tolist(),
+                                                              priceHistory.high.tolist(),
+                                                              priceHistory.low.tolist(),
+                                                              priceHistory.vwap.tolist())]
+
+def equityModels(size, days=None):
+    """Generate random walk equity entries of evenly spaced snapshots ending now."""
+    days = days or constants.LOOKBACK_DAYS
+    random = numpy.random.RandomState(size)
+    equities = 1000 + numpy.cumsum(random.normal(0, 1, size))
+    balancesUSD = equities * random.uniform(0.4, 0.6, size)
+    now = datetime.datetime.utcnow()
+    spacing = datetime.timedelta(days=days) / max(size, 1)
+    entries = []
+    for i, (equity, balanceUSD) in enumerate(zip(equities.tolist(), balancesUSD.tolist())):
+        entry = models.Equity(balanceUSD, equity, 0.0)
+        entry.utc_datetime = now - (size - i) * spacing
+        entries.append(entry)
+    return entries
+
+def currentPrices(priceHistory):
+    """Get current prices following the last price of a price history."""
+    return {"ask": float(priceHistory.ask[-1]),
+            "bid": float(priceHistory.bid[-1]),
+            "high": float(priceHistory.high[-1]),
+            "low": float(priceHistory.low[-1]),
+            "vwap": float(priceHistory.vwap[-1])}
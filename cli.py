@@ -1,5 +1,7 @@
 """BitBot dynamic command-line interface module."""
 import app
+import logger
+import metrics
 import sys
 
 USAGE = "usage: python cli.py [api] [arguments]"
@@ -21,4 +23,9 @@ if __name__ == "__main__":
         print("command not found: %s" % commandName)
         sys.exit()
     else:
-        api(*args)
+        try:
+            api(*args)
+        finally:
+            # display per-stage timing summary after logged records
+            logger.flush()
+            print("\n".join(["stage timings:"] + metrics.registry.summary()))
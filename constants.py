@@ -5,6 +5,18 @@ import json
 # api
 API_ROOT = "/api/v1"
 
+# logging
+LOG_BATCH_SIZE = int(os.environ.get("LOG_BATCH_SIZE", 256))
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "info")
+LOG_QUEUE_SIZE = int(os.environ.get("LOG_QUEUE_SIZE", 10000))
+
+# outbound http connections
+HTTP_CONNECT_TIMEOUT_SEC = float(os.environ.get("HTTP_CONNECT_TIMEOUT_SEC", 3.05))
+HTTP_READ_TIMEOUT_SEC = float(os.environ.get("HTTP_READ_TIMEOUT_SEC", 30))
+HTTP_POOL_CONNECTIONS = int(os.environ.get("HTTP_POOL_CONNECTIONS", 4))
+HTTP_POOL_MAXSIZE = int(os.environ.get("HTTP_POOL_MAXSIZE", 10))
+HTTP_COMPRESSION = os.environ.get("HTTP_COMPRESSION", "true").lower() == "true"
+
 # notifications
 MY_EMAIL = os.environ.get("MY_EMAIL")
 MAILGUN_API_KEY = os.environ.get("MAILGUN_API_KEY")
@@ -12,18 +24,23 @@ MAILGUN_DOMAIN = os.environ.get("MAILGUN_DOMAIN")
 MAILGUN_API_URL = "https://api.mailgun.net/v3/%s" % MAILGUN_DOMAIN
 
 # database operations
+MONGODB_BATCH_SIZE = 1000
 MONGODB_NAME = "bitbot"
 MONGODB_EXCLUDE_PROPS = ["id", "_id"]
 MONGODB_SORT_ASC = 1
 MONGODB_SORT_DESC = -1
 MONGODB_URI = os.environ.get("MONGODB_URI")
+PRICE_BUCKETED_STORAGE = os.environ.get("PRICE_BUCKETED_STORAGE") == "True"
 MONGODB_URI_DEV = "mongodb://127.0.0.1:27017/%s" % MONGODB_NAME
 if not MONGODB_URI:
     MONGODB_URI = MONGODB_URI_DEV
 
 # kraken API constants
 KRAKEN_API_BASE = "https://api.kraken.com/0/"
-KRAKEN_API_CALL_INTERVAL_SEC = 0.5
+KRAKEN_API_TIER = os.environ.get("KRAKEN_API_TIER", "starter")
+KRAKEN_QUERY_WORKERS = int(os.environ.get("KRAKEN_QUERY_WORKERS", 4))
+KRAKEN_PRICE_CACHE_TTL_SEC = float(os.environ.get("KRAKEN_PRICE_CACHE_TTL_SEC", 5))
+KRAKEN_WEBSOCKET_URL = os.environ.get("KRAKEN_WEBSOCKET_URL", "wss://ws.kraken.com")
 KRAKEN_KEY = os.environ.get("KRAKEN_KEY")
 KRAKEN_SECRET = os.environ.get("KRAKEN_SECRET")
 
@@ -34,6 +51,7 @@ with open("kraken/config.json") as config:
 KRAKEN_BALANCE_CONFIGS = KRAKEN_CONFIG["balances"]
 KRAKEN_CRYPTO_CONFIGS = KRAKEN_CONFIG["cryptocurrencies"]
 KRAKEN_PRICE_CONFIGS = KRAKEN_CONFIG["prices"]
+KRAKEN_RATE_LIMIT_CONFIGS = KRAKEN_CONFIG["rate_limits"]
 SUPPORTED_BALANCES = KRAKEN_BALANCE_CONFIGS.keys()
 SUPPORTED_TICKERS = KRAKEN_CRYPTO_CONFIGS.keys()
 SUPPORTED_PRICE_TYPES = KRAKEN_PRICE_CONFIGS.keys()
@@ -47,3 +65,22 @@ LOOKBACK_DAYS = int(os.environ.get("LOOKBACK_DAYS"))
 MARGIN_LEVEL_MINIMUM = int(os.environ.get("MARGIN_LEVEL_MINIMUM"))
 PERCENT_DEVIATION_OPEN_THRESHOLD = float(os.environ.get("PERCENT_DEVIATION_OPEN_THRESHOLD"))
 PERCENT_TRAILING_CLOSE_THRESHOLD = float(os.environ.get("PERCENT_TRAILING_CLOSE_THRESHOLD"))
+
+# analysis parameters
+PRICE_DEVIATION_MAX_AGE_MIN = int(os.environ.get("PRICE_DEVIATION_MAX_AGE_MIN", 15))
+PRICE_DEVIATION_REBUILD_HOURS = int(os.environ.get("PRICE_DEVIATION_REBUILD_HOURS", 24))
+
+# backtesting (kraken taker fee, and margin opening and rollover fees)
+BACKTEST_FEE_RATE = float(os.environ.get("BACKTEST_FEE_RATE", 0.0026))
+BACKTEST_MARGIN_FEE_RATE = float(os.environ.get("BACKTEST_MARGIN_FEE_RATE", 0.0002))
+BACKTEST_ROLLOVER_HOURS = 4
+BACKTEST_SWEEP_WORKERS = int(os.environ.get("BACKTEST_SWEEP_WORKERS", 0))  # defaults to one per cpu
+
+# visualizations
+VISUALIZATION_CACHE_TTL_SEC = int(os.environ.get("VISUALIZATION_CACHE_TTL_SEC", 30))
+VISUALIZER_RENDER_WORKERS = int(os.environ.get("VISUALIZER_RENDER_WORKERS", 0))
+
+# streaming price ingestion
+INGEST_BUFFER_SIZE = int(os.environ.get("INGEST_BUFFER_SIZE", 4096))
+INGEST_FLUSH_INTERVAL_SEC = int(os.environ.get("INGEST_FLUSH_INTERVAL_SEC", 300))
+INGEST_RESOLUTION_SEC = int(os.environ.get("INGEST_RESOLUTION_SEC", 60))
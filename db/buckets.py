@@ -0,0 +1,103 @@
+"""BitBot bucketed price storage module."""
+import constants
+import datetime
+import numpy
+
+COLLECTION_NAME = "price_bucket"
+BUCKET_COLUMNS = ["utc_datetime", "ask", "bid", "high", "low", "vwap"]
+
+def bucketDatetime(utcDatetime):
+    """Get the starting datetime of the bucket holding a price."""
+    return utcDatetime.replace(minute=0, second=0, microsecond=0)
+
+def bucketDatetimeFilter(datetimeFilter):
+    """Widen a price datetime filter to match the buckets holding those prices."""
+    bucketFilter = {}
+    for operator, utcDatetime in datetimeFilter.items():
+        if operator in ("$gt", "$gte"):
+            bucketFilter["$gte"] = bucketDatetime(utcDatetime)
+        else:
+            bucketFilter[operator] = utcDatetime
+    return bucketFilter
+
+def appendUpdates(priceHistory):
+    """Get upserts that append new prices to the end of their buckets."""
+    updates = []
+    for utcDatetime, hourHistory in _split(priceHistory):
+        updates.append(({"ticker": priceHistory.ticker, "utc_datetime": utcDatetime},
+                        {"$push": {"prices.%s" % column: {"$each": values} for column, values in _columns(hourHistory).items()},
+                         "$inc": {"count": len(hourHistory)}}))
+    return updates
+
+def migrationUpdates(priceHistory, firstDatetimes):
+    """Get upserts that copy prices into buckets, only prepending prices older than existing buckets.
+
+    Args:
+        priceHistory: prices of whole hours to copy
+        firstDatetimes: datetime of the first price of each existing bucket by bucket datetime
+    """
+    updates = []
+    for utcDatetime, hourHistory in _split(priceHistory):
+        bucketFilter = {"ticker": priceHistory.ticker, "utc_datetime": utcDatetime}
+        firstDatetime = firstDatetimes.get(utcDatetime)
+        if not firstDatetime:
+            updates.append((bucketFilter, {"$setOnInsert": dict({"prices": _columns(hourHistory)}, count=len(hourHistory))}))
+            continue
+
+        # prepend prices stored before the bucket was started
+        olderHistory = hourHistory[:numpy.searchsorted(hourHistory.utc_datetime, numpy.datetime64(firstDatetime, "us"))]
+        if len(olderHistory):
+            updates.append((bucketFilter,
+                            {"$push": {"prices.%s" % column: {"$each": values, "$position": 0}
+                                       for column, values in _columns(olderHistory).items()},
+                             "$inc": {"count": len(olderHistory)}}))
+    return updates
+
+def fetchFirstDatetimes(mongodb, ticker, datetimeFilter):
+    """Fetch the datetime of the first price of each existing bucket of a cryptocurrency."""
+    queryFilter = {"ticker": ticker, "utc_datetime": bucketDatetimeFilter(datetimeFilter)}
+    projection = {"_id": False, "utc_datetime": True, "prices.utc_datetime": True}
+    return {bucket.get("utc_datetime"): bucket.get("prices").get("utc_datetime")[0]
+            for bucket in mongodb.find(COLLECTION_NAME, filter=queryFilter, projection=projection)
+            if bucket.get("prices", {}).get("utc_datetime")}
+
+def fetchColumns(mongodb, datetimeFilters, columns):
+    """Fetch the buckets of multiple tickers in a single query, unrolled into columns of each ticker.
+
+    Buckets are matched by hour, so prices outside the datetime filters are included.
+    """
+    queryFilter = {"$or": [{"ticker": ticker, "utc_datetime": bucketDatetimeFilter(datetimeFilter)}
+                           for ticker, datetimeFilter in datetimeFilters.items()]}
+    querySort = ("utc_datetime", constants.MONGODB_SORT_ASC)
+    projection = dict({"_id": False, "ticker": True, "prices.utc_datetime": True},
+                      **{"prices.%s" % column: True for column in columns})
+    tickerColumns = {}
+    for bucket in mongodb.find(COLLECTION_NAME, filter=queryFilter, sort=querySort, projection=projection,
+                               batchSize=constants.MONGODB_BATCH_SIZE, lazy=True):
+        values = tickerColumns.setdefault(bucket.get("ticker"), {column: [] for column in ["utc_datetime"] + columns})
+        for column, columnValues in values.items():
+            columnValues.extend(bucket.get("prices").get(column))
+    return tickerColumns
+
+def streamColumns(mongodb, ticker, datetimeFilter, columns):
+    """Stream the columns of each bucket of a cryptocurrency (including prices outside the datetime filter)."""
+    queryFilter = {"ticker": ticker, "utc_datetime": bucketDatetimeFilter(datetimeFilter)}
+    querySort = ("utc_datetime", constants.MONGODB_SORT_ASC)
+    projection = dict({"_id": False, "prices.utc_datetime": True}, **{"prices.%s" % column: True for column in columns})
+    for bucket in mongodb.find(COLLECTION_NAME, filter=queryFilter, sort=querySort, projection=projection,
+                               batchSize=constants.MONGODB_BATCH_SIZE, lazy=True):
+        yield bucket.get("prices")
+
+def _split(priceHistory):
+    """Split a price history into the hours of its buckets."""
+    if not len(priceHistory):
+        return []
+    hours = priceHistory.utc_datetime.astype("datetime64[h]")
+    starts = numpy.flatnonzero(numpy.append(True, hours[1:] != hours[:-1]))
+    ends = numpy.append(starts[1:], len(hours))
+    return [(hours[start].astype("datetime64[us]").astype(datetime.datetime), priceHistory[start:end])
+            for start, end in zip(starts.tolist(), ends.tolist())]
+
+def _columns(priceHistory):
+    """Get the stored columns of a price history as lists."""
+    return {column: getattr(priceHistory, column).tolist() for column in BUCKET_COLUMNS}
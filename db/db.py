@@ -2,46 +2,244 @@
 import constants
 import flask_pymongo
 import logger
+import metrics
 import os
+import pymongo
+
+INDEX_OPTIONS_CONFLICT_CODE = 85
+RETENTION_SEC = constants.HISTORY_RETENTION_DAYS * 24 * 3600
+
+# indexes of each collection: (collection name, keys, options)
+INDEXES = [("equity", [("utc_datetime", constants.MONGODB_SORT_ASC)], {"expireAfterSeconds": RETENTION_SEC}),
+           ("mean_reversion_analysis", [("ticker", constants.MONGODB_SORT_ASC)], {"unique": True}),
+           ("position", [("transaction_id", constants.MONGODB_SORT_ASC)], {"unique": True}),
+           ("price", [("ticker", constants.MONGODB_SORT_ASC), ("utc_datetime", constants.MONGODB_SORT_ASC),  # covers price history reads
+                      ("ask", constants.MONGODB_SORT_ASC), ("bid", constants.MONGODB_SORT_ASC), ("vwap", constants.MONGODB_SORT_ASC)], {}),
+           ("price", [("utc_datetime", constants.MONGODB_SORT_ASC)], {"expireAfterSeconds": RETENTION_SEC}),
+           ("price_1d", [("ticker", constants.MONGODB_SORT_ASC), ("utc_datetime", constants.MONGODB_SORT_ASC)], {"unique": True}),
+           ("price_1h", [("ticker", constants.MONGODB_SORT_ASC), ("utc_datetime", constants.MONGODB_SORT_ASC)], {"unique": True}),
+           ("price_bucket", [("ticker", constants.MONGODB_SORT_ASC), ("utc_datetime", constants.MONGODB_SORT_ASC)], {"unique": True}),
+           ("price_bucket", [("utc_datetime", constants.MONGODB_SORT_ASC)], {"expireAfterSeconds": RETENTION_SEC + 3600}),
+           ("price_deviation", [("ticker", constants.MONGODB_SORT_ASC)], {"unique": True}),
+           ("visualization", [("name", constants.MONGODB_SORT_ASC)], {"unique": True})]
+
+# indexes superseded by declared indexes: (collection name, index name)
+OBSOLETE_INDEXES = [("price", "ticker_1_utc_datetime_1")]
 
 class BitBotDB:
     """Object to communication with the BitBot database."""
-    def __init__(self, app):
+    def __init__(self, app, uri=None):
         self.app = app
         self.logger = logger.Logger("MongoDB")
 
         # initialize mongo connection
-        app.config["MONGO_URI"] = constants.MONGODB_URI
+        app.config["MONGO_URI"] = uri or constants.MONGODB_URI
         self.mongo = flask_pymongo.PyMongo(app)
 
+    def ensureIndexes(self):
+        """Create declared indexes (and update expiration of existing TTL indexes), run on each release."""
+        for collectionName, keys, options in INDEXES:
+            try:
+                self.mongo.db[collectionName].create_index(keys, **options)
+            except pymongo.errors.OperationFailure as err:
+                if err.code != INDEX_OPTIONS_CONFLICT_CODE or "expireAfterSeconds" not in options:
+                    raise
+
+                # retention changed: update expiration of the existing TTL index
+                self.mongo.db.command("collMod", collectionName,
+                                      index={"keyPattern": dict(keys), "expireAfterSeconds": options.get("expireAfterSeconds")})
+                self.logger.log("updated expiration of %s index on the %s collection" % (str(keys), collectionName))
+
+        # drop superseded indexes
+        for collectionName, indexName in OBSOLETE_INDEXES:
+            if indexName in self.mongo.db[collectionName].index_information():
+                self.mongo.db[collectionName].drop_index(indexName)
+                self.logger.log("dropped %s index on the %s collection" % (indexName, collectionName))
+        self.logger.log("ensured %i indexes" % len(INDEXES))
+
+    def unitOfWork(self):
+        """Start a unit of work that batches writes until flushed."""
+        return UnitOfWork(self)
+
+    def explain(self, collectionName, filter={}, sort=(), projection=None, pipeline=None):
+        """Get the stages of the winning query plan of a query (or of an aggregation pipeline)."""
+        if pipeline:
+            explanation = self.mongo.db.command("explain", {"aggregate": collectionName, "pipeline": pipeline, "cursor": {}},
+                                                verbosity="queryPlanner")
+        else:
+            cursor = self.mongo.db[collectionName].find(filter, projection)
+            if sort:
+                cursor = cursor.sort(*sort)
+            explanation = cursor.explain()
+
+        # find query planner (nested in the first stage if only part of the pipeline runs as a query)
+        queryPlanner = explanation.get("queryPlanner")
+        if not queryPlanner:
+            queryPlanner = explanation.get("stages")[0].get("$cursor").get("queryPlanner")
+        winningPlan = queryPlanner.get("winningPlan")
+
+        # collect stages of the plan tree (slot based plans nest the tree in queryPlan)
+        stages = []
+        plans = [winningPlan.get("queryPlan", winningPlan)]
+        while plans:
+            plan = plans.pop()
+            stages.append(plan.get("stage"))
+            plans.extend(plan.get("inputStages", []))
+            for inputName in ("inputStage", "outerStage", "innerStage"):
+                if inputName in plan:
+                    plans.append(plan.get(inputName))
+        return stages
+
     def delete(self, collectionName, filter):
         """Delete an entry in the collection."""
-        self.mongo.db[collectionName].delete_one(filter)
-        self.logger.log("deleted 1 entry from the %s collection" % collectionName)
+        with metrics.span("mongodb.delete.%s" % collectionName):
+            self.mongo.db[collectionName].delete_one(filter)
+        self.logger.debug("deleted 1 entry", fields={"collection": collectionName})
 
     def deleteMany(self, collectionName, filter):
         """Delete mutliple entries in the collection."""
-        count = self.mongo.db[collectionName].delete_many(filter).deleted_count
+        with metrics.span("mongodb.delete_many.%s" % collectionName):
+            count = self.mongo.db[collectionName].delete_many(filter).deleted_count
         self.logger.log("deleted %i entries from the %s collection" % (count, collectionName))
 
     def insert(self, model):
         """Insert a single entry into the collection."""
-        self.mongo.db[model.collectionName].insert_one(model.__dict__)
-        self.logger.log("inserted 1 entry into the %s collection" % model.collectionName)
+        with metrics.span("mongodb.insert.%s" % model.collectionName):
+            self.mongo.db[model.collectionName].insert_one(model.__dict__)
+        self.logger.debug("inserted 1 entry", fields={"collection": model.collectionName})
 
     def insertMany(self, models):
         """Insert mutliple entries into the collection."""
-        self.mongo.db[models[0].collectionName].insert([model.__dict__ for model in models])
+        with metrics.span("mongodb.insert_many.%s" % models[0].collectionName):
+            self.mongo.db[models[0].collectionName].insert([model.__dict__ for model in models])
         self.logger.log("inserted %i entries into the %s collection" % (len(models), models[0].collectionName))
 
-    def find(self, collectionName, filter={}, sort=()):
-        """Find a single entry in the collection."""
+    def aggregate(self, collectionName, pipeline, rows=len):
+        """Run an aggregation pipeline on the collection (counting rows read from the results if grouped)."""
+        with metrics.span("mongodb.aggregate.%s" % collectionName) as span:
+            results = list(self.mongo.db[collectionName].aggregate(pipeline, allowDiskUse=True))
+            span.rows = rows(results)
+        return results
+
+    def find(self, collectionName, filter={}, sort=(), projection=None, batchSize=None, lazy=False):
+        """Find entries in the collection (lazily streamed in batches if requested)."""
+        cursor = self.mongo.db[collectionName].find(filter, projection)
         if sort:
-            return list(self.mongo.db[collectionName].find(filter).sort(*sort))
-        return list(self.mongo.db[collectionName].find(filter))
+            cursor = cursor.sort(*sort)
+        if batchSize:
+            cursor = cursor.batch_size(batchSize)
+        if lazy:
+            return _stream("mongodb.find.%s" % collectionName, cursor)
+        with metrics.span("mongodb.find.%s" % collectionName) as span:
+            documents = list(cursor)
+            span.rows = len(documents)
+        return documents
 
-    def update(self, collectionName, filter, update):
+    def update(self, collectionName, filter, update, upsert=False):
         """Update a single entry in the collection."""
         update = {"$set": update}
-        self.mongo.db[collectionName].update_one(filter, update)
-        self.logger.log("updated 1 entry in the %s collection" % collectionName)
+        with metrics.span("mongodb.update.%s" % collectionName):
+            self.mongo.db[collectionName].update_one(filter, update, upsert=upsert)
+        self.logger.debug("updated 1 entry", fields={"collection": collectionName})
+
+    def upsertMany(self, collectionName, updates):
+        """Upsert mutliple entries in the collection with update operators in a single batch."""
+        if not updates:
+            return
+        requests = [pymongo.UpdateOne(filter, update, upsert=True) for filter, update in updates]
+        with metrics.span("mongodb.bulk_write.%s" % collectionName):
+            result = self.mongo.db[collectionName].bulk_write(requests, ordered=False)
+        self.logger.log("upserted %i entries in the %s collection" % (result.upserted_count + result.modified_count, collectionName))
+
+class UnitOfWork:
+    """Object to accumulate writes during a session and flush them as unordered bulk writes.
+
+    Usable as a context manager that flushes on exit, so writes recorded before
+    an error are still stored (without masking the error), and keeps the failed
+    operations of the final flush in failures for the caller to check.
+    """
+    def __init__(self, bitbotdb):
+        self.bitbotdb = bitbotdb
+        self.logger = logger.Logger("UnitOfWork")
+        self.operations = {}  # (description, request) by collection name
+        self.failures = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, errorType, error, traceback):
+        if not errorType:
+            self.failures = self.flush()
+            return
+
+        # keep the original error raised if the flush fails too
+        try:
+            self.failures = self.flush()
+        except Exception as err:
+            self.logger.error("unable to flush unit of work after error", fields={"error": repr(err), "cause": repr(error)})
+
+    def delete(self, collectionName, filter):
+        """Record the deletion of an entry in the collection."""
+        self._add(collectionName, "delete %s" % str(filter), pymongo.DeleteOne(filter))
+
+    def insert(self, model):
+        """Record the insertion of a single entry into the collection."""
+        self._add(model.collectionName, "insert %s" % str(model.__dict__), pymongo.InsertOne(model.__dict__))
+
+    def update(self, collectionName, filter, update, upsert=False):
+        """Record the update of a single entry in the collection."""
+        self._add(collectionName, "update %s" % str(filter), pymongo.UpdateOne(filter, {"$set": update}, upsert=upsert))
+
+    def flush(self):
+        """Write all recorded operations with one unordered bulk write per collection.
+
+        Operations of collections whose bulk write fails outright (e.g. on a network
+        error) are kept to be flushed again, and an error listing the collections
+        written and not written is raised after all collections are attempted.
+
+        Returns:
+            list of (collection name, operation description, error message) of failed operations
+        """
+        failures = []
+        writtenCollectionNames = []
+        unwrittenErrors = {}
+        operations, self.operations = self.operations, {}
+        for collectionName, collectionOperations in operations.items():
+            requests = [request for _, request in collectionOperations]
+            try:
+                with metrics.span("mongodb.bulk_write.%s" % collectionName):
+                    result = self.bitbotdb.mongo.db[collectionName].bulk_write(requests, ordered=False)
+            except pymongo.errors.BulkWriteError as err:
+                result = err.details
+                for writeError in err.details.get("writeErrors", []):
+                    description = collectionOperations[writeError.get("index")][0]
+                    failures.append((collectionName, description, writeError.get("errmsg")))
+                    self.logger.error("unable to %s in the %s collection" % (description, collectionName), fields={"error": writeError.get("errmsg")})
+                counts = (result.get("nInserted"), result.get("nModified") + result.get("nUpserted"), result.get("nRemoved"))
+            except pymongo.errors.PyMongoError as err:
+                # keep operations in an unknown state to be flushed again
+                unwrittenErrors[collectionName] = repr(err)
+                self.operations.setdefault(collectionName, []).extend(collectionOperations)
+                self.logger.error("unable to write %i operations in the %s collection" % (len(collectionOperations), collectionName),
+                                  fields={"error": repr(err)})
+                continue
+            else:
+                counts = (result.inserted_count, result.modified_count + result.upserted_count, result.deleted_count)
+            writtenCollectionNames.append(collectionName)
+            self.logger.log("inserted %i, updated %i and deleted %i entries in the %s collection" % (counts + (collectionName,)))
+
+        # raise error if any collection was not written
+        if unwrittenErrors:
+            raise RuntimeError("unable to flush unit of work (written: %s, not written: %s)" % (writtenCollectionNames, unwrittenErrors))
+        return failures
+
+    def _add(self, collectionName, description, request):
+        """Record an operation on the collection."""
+        self.operations.setdefault(collectionName, []).append((description, request))
+
+def _stream(stageName, cursor):
+    """Stream documents from a cursor, timing the stage until the cursor is exhausted (including time spent by the consumer)."""
+    with metrics.span(stageName) as span:
+        for document in cursor:
+            span.rows += 1
+            yield document
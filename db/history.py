@@ -0,0 +1,237 @@
+"""BitBot price history cache module."""
+import constants
+import datetime
+import logger
+import numpy
+import threading
+from db import buckets
+
+ANALYSIS_COLUMNS = ["ask", "bid", "vwap"]
+PRICE_COLUMNS = ["ask", "bid", "high", "low", "vwap"]
+
+class PriceHistory:
+    """Object to store the columnar price history of a cryptocurrency (unfetched columns are None)."""
+    def __init__(self, ticker, utcDatetimes, asks, bids, highs, lows, vwaps):
+        self.ticker = ticker
+        self.utc_datetime = utcDatetimes
+        self.ask = asks
+        self.bid = bids
+        self.high = highs
+        self.low = lows
+        self.vwap = vwaps
+
+    def __len__(self):
+        return len(self.utc_datetime)
+
+    @classmethod
+    def empty(cls, ticker, columns=ANALYSIS_COLUMNS):
+        """Create an empty price history."""
+        return cls.fromColumns(ticker, {column: [] for column in columns})
+
+    @classmethod
+    def fromDocuments(cls, ticker, documents, columns=PRICE_COLUMNS):
+        """Create a price history from (possibly lazily fetched) price entries in the database."""
+        values = {column: [] for column in ["utc_datetime"] + columns}
+        for document in documents:
+            for column, columnValues in values.items():
+                columnValues.append(document.get(column))
+        return cls.fromColumns(ticker, values)
+
+    @classmethod
+    def fromColumns(cls, ticker, columns):
+        """Create a price history from columns grouped by the database."""
+        utcDatetimes = numpy.array(columns.get("utc_datetime", []), dtype="datetime64[us]")
+        return cls(ticker, utcDatetimes, *[numpy.array(columns.get(column), dtype=float) if column in columns else None
+                                           for column in PRICE_COLUMNS])
+
+    @property
+    def mid(self):
+        """Mid prices between ask and bid."""
+        return (self.ask + self.bid) / 2
+
+    @property
+    def timestamps(self):
+        """Unix timestamps of all prices."""
+        return self.utc_datetime.astype("datetime64[us]").astype(float) / 1e6
+
+    @property
+    def latestDatetime(self):
+        """Datetime of the most recent price."""
+        if not len(self):
+            return None
+        return self.datetimeAt(-1)
+
+    def datetimeAt(self, index):
+        """Get the datetime of the price at an index."""
+        return self.utc_datetime[index].astype(datetime.datetime)
+
+    def extend(self, other):
+        """Create a new price history with newer prices appended."""
+        if not len(other):
+            return self
+        return PriceHistory(self.ticker,
+                            numpy.concatenate([self.utc_datetime, other.utc_datetime]),
+                            *[numpy.concatenate([getattr(self, column), getattr(other, column)])
+                              if getattr(self, column) is not None and getattr(other, column) is not None else None
+                              for column in PRICE_COLUMNS])
+
+    def since(self, startingDatetime):
+        """View of the price history at or after a datetime."""
+        startIndex = numpy.searchsorted(self.utc_datetime, numpy.datetime64(startingDatetime, "us"), side="left")
+        return self[startIndex:]
+
+    def after(self, startingDatetime):
+        """View of the price history strictly after a datetime."""
+        startIndex = numpy.searchsorted(self.utc_datetime, numpy.datetime64(startingDatetime, "us"), side="right")
+        return self[startIndex:]
+
+    def before(self, endingDatetime):
+        """View of the price history strictly before a datetime."""
+        endIndex = numpy.searchsorted(self.utc_datetime, numpy.datetime64(endingDatetime, "us"), side="left")
+        return self[:endIndex]
+
+    def __getitem__(self, index):
+        if not isinstance(index, (slice, numpy.ndarray)):
+            raise TypeError("price history only supports slicing and index arrays")
+        return PriceHistory(self.ticker,
+                            self.utc_datetime[index],
+                            *[getattr(self, column)[index] if getattr(self, column) is not None else None
+                              for column in PRICE_COLUMNS])
+
+class PriceHistoryCache:
+    """Object to incrementally cache price history within the lookback window."""
+    def __init__(self, mongodb):
+        self.mongodb = mongodb
+        self.logger = logger.Logger("PriceHistoryCache")
+        self.histories = {}
+        self.lock = threading.Lock()
+
+    def get(self, ticker, startingDatetime=None):
+        """Get the price history of a cryptocurrency since a datetime (defaults to lookback window)."""
+        windowStartingDatetime = self._windowStartingDatetime()
+        with self.lock:
+            history = self._refresh([ticker], windowStartingDatetime).get(ticker)
+
+        # serve from cache if request falls within the lookback window
+        if not startingDatetime:
+            return history
+        if startingDatetime >= windowStartingDatetime:
+            return history.since(startingDatetime)
+
+        # fall back to streaming from the database for requests older than the lookback window
+        if constants.PRICE_BUCKETED_STORAGE:
+            datetimeFilters = {ticker: {"$gte": startingDatetime}}
+            return fetchPriceHistories(self.mongodb, datetimeFilters).get(ticker, PriceHistory.empty(ticker))
+        queryFilter, querySort, projection = priceHistoryQuery(ticker, {"$gte": startingDatetime})
+        documents = self.mongodb.find("price", filter=queryFilter, sort=querySort, projection=projection,
+                                      batchSize=constants.MONGODB_BATCH_SIZE, lazy=True)
+        return PriceHistory.fromDocuments(ticker, documents, columns=ANALYSIS_COLUMNS)
+
+    def add(self, priceHistories):
+        """Append newly stored prices to cached price histories."""
+        with self.lock:
+            for ticker, priceHistory in priceHistories.items():
+                history = self.histories.get(ticker)
+                if history is not None and len(history):
+                    self.histories[ticker] = history.extend(priceHistory.after(history.latestDatetime))
+
+    def getMany(self, tickers):
+        """Get the lookback window price history of multiple cryptocurrencies."""
+        with self.lock:
+            return self._refresh(tickers, self._windowStartingDatetime())
+
+    def _refresh(self, tickers, windowStartingDatetime):
+        """Fetch prices newer than the last cached prices and trim prices outside the window."""
+        datetimeFilters = {}
+        for ticker in tickers:
+            history = self.histories.get(ticker)
+            if history is None or not len(history):
+                datetimeFilters[ticker] = {"$gte": windowStartingDatetime}
+            else:
+                datetimeFilters[ticker] = {"$gt": history.latestDatetime}
+
+        # append new prices and trim outdated prices
+        newHistories = self._fetch(datetimeFilters)
+        histories = {}
+        for ticker in tickers:
+            history = self.histories.get(ticker, PriceHistory.empty(ticker))
+            newHistory = newHistories.get(ticker, PriceHistory.empty(ticker))
+            history = history.extend(newHistory).since(windowStartingDatetime)
+            self.histories[ticker] = histories[ticker] = history
+        self.logger.debug("cached new prices", fields={"prices": sum(len(newHistory) for newHistory in newHistories.values()), "tickers": len(tickers)})
+        return histories
+
+    def _fetch(self, datetimeFilters):
+        """Fetch prices of all tickers in a single query."""
+        return fetchPriceHistories(self.mongodb, datetimeFilters)
+
+    def _windowStartingDatetime(self):
+        """Get the starting datetime of the lookback window."""
+        return datetime.datetime.utcnow() - datetime.timedelta(days=constants.LOOKBACK_DAYS)
+
+# comparisons of datetime filter operators
+DATETIME_FILTER_OPERATORS = {"$gt": numpy.greater, "$gte": numpy.greater_equal, "$lt": numpy.less, "$lte": numpy.less_equal}
+
+def fetchPriceHistories(mongodb, datetimeFilters, columns=ANALYSIS_COLUMNS, bucketed=None):
+    """Fetch the price histories of multiple tickers in a single query grouped into columns by the database."""
+    if not datetimeFilters:
+        return {}
+    if bucketed is None:
+        bucketed = constants.PRICE_BUCKETED_STORAGE
+
+    # unroll buckets and trim prices outside the requested datetimes
+    if bucketed:
+        return {ticker: _filterPrices(PriceHistory.fromColumns(ticker, tickerColumns), datetimeFilters.get(ticker))
+                for ticker, tickerColumns in buckets.fetchColumns(mongodb, datetimeFilters, columns).items()}
+    return {columns.get("_id"): PriceHistory.fromColumns(columns.get("_id"), columns)
+            for columns in mongodb.aggregate("price", priceHistoryPipeline(datetimeFilters, columns), rows=_countGroupedPrices)}
+
+def priceHistoryPipeline(datetimeFilters, columns=ANALYSIS_COLUMNS):
+    """Get the aggregation pipeline grouping the prices of multiple tickers into columns (covered by the price index)."""
+    queryFilter = {"$or": [{"ticker": ticker, "utc_datetime": datetimeFilter}
+                           for ticker, datetimeFilter in datetimeFilters.items()]}
+    return [{"$match": queryFilter},
+            {"$sort": {"utc_datetime": constants.MONGODB_SORT_ASC}},
+            {"$group": dict({"_id": "$ticker", "utc_datetime": {"$push": "$utc_datetime"}},
+                            **{column: {"$push": "$%s" % column} for column in columns})}]
+
+def priceHistoryQuery(ticker, datetimeFilter, columns=ANALYSIS_COLUMNS):
+    """Get the filter, sort and projection of a price history query of a cryptocurrency (covered by the price index)."""
+    queryFilter = {"ticker": ticker, "utc_datetime": datetimeFilter}
+    querySort = ("utc_datetime", constants.MONGODB_SORT_ASC)
+    projection = dict({"_id": False, "utc_datetime": True}, **{column: True for column in columns})
+    return queryFilter, querySort, projection
+
+def streamPriceHistory(mongodb, ticker, datetimeFilter, columns=ANALYSIS_COLUMNS):
+    """Stream the price history of a cryptocurrency in chunks of at most a database batch."""
+    if constants.PRICE_BUCKETED_STORAGE:
+        for bucketColumns in buckets.streamColumns(mongodb, ticker, datetimeFilter, columns):
+            priceHistory = _filterPrices(PriceHistory.fromColumns(ticker, bucketColumns), datetimeFilter)
+            if len(priceHistory):
+                yield priceHistory
+        return
+
+    # group lazily fetched prices into chunks
+    queryFilter, querySort, projection = priceHistoryQuery(ticker, datetimeFilter, columns)
+    documents = []
+    for document in mongodb.find("price", filter=queryFilter, sort=querySort, projection=projection,
+                                 batchSize=constants.MONGODB_BATCH_SIZE, lazy=True):
+        documents.append(document)
+        if len(documents) == constants.MONGODB_BATCH_SIZE:
+            yield PriceHistory.fromDocuments(ticker, documents, columns=columns)
+            documents = []
+    if documents:
+        yield PriceHistory.fromDocuments(ticker, documents, columns=columns)
+
+def _filterPrices(priceHistory, datetimeFilter):
+    """Order prices by datetime and select prices matching a datetime filter."""
+    if len(priceHistory) > 1 and (priceHistory.utc_datetime[1:] < priceHistory.utc_datetime[:-1]).any():
+        priceHistory = priceHistory[numpy.argsort(priceHistory.utc_datetime, kind="stable")]
+    matches = numpy.ones(len(priceHistory), dtype=bool)
+    for operator, utcDatetime in datetimeFilter.items():
+        matches &= DATETIME_FILTER_OPERATORS.get(operator)(priceHistory.utc_datetime, numpy.datetime64(utcDatetime, "us"))
+    return priceHistory if matches.all() else priceHistory[matches]
+
+def _countGroupedPrices(groups):
+    """Count the prices read into the columns of each grouped ticker."""
+    return sum(len(group.get("utc_datetime")) for group in groups)
@@ -20,6 +20,16 @@ class Equity(BitBotModel):
         self.margin_used = marginUsed
         self.utc_datetime = datetime.datetime.utcnow()
 
+class MeanReversionAnalysis(BitBotModel):
+    """Database entry representing the mean reversion analysis of the latest price snapshot."""
+    collectionName = "mean_reversion_analysis"
+
+    def __init__(self, ticker, analysis, watermarkDatetime):
+        self.ticker = ticker
+        self.__dict__.update(analysis.__dict__)
+        self.watermark_utc_datetime = watermarkDatetime
+        self.utc_datetime = datetime.datetime.utcnow()
+
 class Position(BitBotModel):
     """Database entry representing a trade position."""
     collectionName = "position"
@@ -28,17 +38,45 @@ class Position(BitBotModel):
         self.ticker = ticker
         self.transaction_id = transactionId
         self.description = description
+        self.actionable_price = None
+        self.actionable_datetime_utc = None
+        self.tracked_utc_datetime = None
+        self.utc_datetime = datetime.datetime.utcnow()
+
+class PriceDeviation(BitBotModel):
+    """Database entry representing running sums of price deviations from the VWAP."""
+    collectionName = "price_deviation"
+
+    def __init__(self, ticker, count, deviationSum, deviationsSquaredSum, windowDatetime, latestDatetime, rebuiltDatetime):
+        self.ticker = ticker
+        self.count = count
+        self.deviation_sum = deviationSum
+        self.deviations_squared_sum = deviationsSquaredSum
+        self.lookback_days = constants.LOOKBACK_DAYS
+        self.window_utc_datetime = windowDatetime
+        self.latest_utc_datetime = latestDatetime
+        self.rebuilt_utc_datetime = rebuiltDatetime
         self.utc_datetime = datetime.datetime.utcnow()
 
 class Price(BitBotModel):
     """Database entry representing an asset price."""
     collectionName = "price"
 
-    def __init__(self, ticker, ask, bid, high, low, vwap):
+    def __init__(self, ticker, ask, bid, high, low, vwap, utcDatetime=None):
         self.ticker = ticker
         self.ask = ask
         self.bid = bid
         self.high = high
         self.low = low
         self.vwap = vwap
+        self.utc_datetime = utcDatetime or datetime.datetime.utcnow()
+
+class Visualization(BitBotModel):
+    """Database entry representing a rendered visualization image."""
+    collectionName = "visualization"
+
+    def __init__(self, name, image, versionDatetime):
+        self.name = name
+        self.image = image
+        self.version_utc_datetime = versionDatetime
         self.utc_datetime = datetime.datetime.utcnow()
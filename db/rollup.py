@@ -0,0 +1,92 @@
+"""BitBot price rollup module."""
+import constants
+import datetime
+import numpy
+from db import history
+
+EXPIRY_MARGIN = datetime.timedelta(hours=1)  # raw prices keep expiring while rollups are rebuilt
+
+# numpy datetime units of each rollup resolution
+RESOLUTION_UNITS = {"1h": "h", "1d": "D"}
+
+def collectionName(resolution):
+    """Get the collection name of a rollup resolution."""
+    if resolution not in RESOLUTION_UNITS:
+        raise RuntimeError("price resolution not supported: %s" % resolution)
+    return "price_%s" % resolution
+
+def summarize(priceHistory, resolution):
+    """Summarize a price history into open/high/low/close mid prices and VWAP sums per interval."""
+    if not len(priceHistory):
+        return []
+    intervals = priceHistory.utc_datetime.astype("datetime64[%s]" % RESOLUTION_UNITS.get(resolution))
+    starts = numpy.flatnonzero(numpy.append(True, intervals[1:] != intervals[:-1]))
+    ends = numpy.append(starts[1:], len(intervals)) - 1
+
+    # aggregate each interval at once
+    mids = priceHistory.mid
+    summaries = zip(intervals[starts].astype("datetime64[us]").tolist(),
+                    mids[starts].tolist(),
+                    numpy.maximum.reduceat(mids, starts).tolist(),
+                    numpy.minimum.reduceat(mids, starts).tolist(),
+                    mids[ends].tolist(),
+                    numpy.add.reduceat(priceHistory.vwap, starts).tolist(),
+                    (ends - starts + 1).tolist())
+    return [{"ticker": priceHistory.ticker, "utc_datetime": utcDatetime, "open": _open, "high": high, "low": low,
+             "close": close, "vwap_sum": vwapSum, "count": count}
+            for utcDatetime, _open, high, low, close, vwapSum, count in summaries]
+
+def incrementalUpdates(priceHistory, resolution):
+    """Get upserts that merge new prices into existing rollups."""
+    updates = []
+    for summary in summarize(priceHistory, resolution):
+        updates.append(({"ticker": summary.get("ticker"), "utc_datetime": summary.get("utc_datetime")},
+                        {"$setOnInsert": {"open": summary.get("open")},
+                         "$max": {"high": summary.get("high")},
+                         "$min": {"low": summary.get("low")},
+                         "$set": {"close": summary.get("close")},
+                         "$inc": {"vwap_sum": summary.get("vwap_sum"), "count": summary.get("count")}}))
+    return updates
+
+def replacementUpdates(priceHistory, resolution, horizonDatetime):
+    """Get upserts that overwrite rollups rebuilt from complete intervals of raw prices.
+
+    Intervals starting before the horizon (raw prices may have expired) are skipped.
+    """
+    priceHistory = priceHistory.since(firstCompleteDatetime(horizonDatetime, resolution))
+    return [({"ticker": summary.get("ticker"), "utc_datetime": summary.get("utc_datetime")}, {"$set": summary})
+            for summary in summarize(priceHistory, resolution)]
+
+def firstCompleteDatetime(horizonDatetime, resolution):
+    """Get the start of the first interval starting at or after a datetime."""
+    utcDatetime = numpy.datetime64(horizonDatetime, "us")
+    interval = utcDatetime.astype("datetime64[%s]" % RESOLUTION_UNITS.get(resolution))
+    if interval < utcDatetime:
+        interval += 1
+    return interval.astype("datetime64[us]").astype(datetime.datetime)
+
+def retentionHorizon():
+    """Get the datetime after which raw prices are retained throughout a rebuild."""
+    return datetime.datetime.utcnow() - datetime.timedelta(days=constants.HISTORY_RETENTION_DAYS) + EXPIRY_MARGIN
+
+def fetchHistory(mongodb, ticker, startingDatetime, resolution):
+    """Fetch rolled up price history (closing mid price is used as both ask and bid)."""
+    queryFilter = {"ticker": ticker, "utc_datetime": {"$gte": startingDatetime}}
+    querySort = ("utc_datetime", constants.MONGODB_SORT_ASC)
+    projection = {"_id": False, "utc_datetime": True, "high": True, "low": True, "close": True, "vwap_sum": True, "count": True}
+    columns = {"utc_datetime": [], "close": [], "high": [], "low": [], "vwap_sum": [], "count": []}
+    for document in mongodb.find(collectionName(resolution), filter=queryFilter, sort=querySort, projection=projection,
+                                 batchSize=constants.MONGODB_BATCH_SIZE, lazy=True):
+        for column, values in columns.items():
+            values.append(document.get(column))
+
+    # convert rollups to a columnar price history
+    closes = numpy.array(columns.get("close"), dtype=float)
+    vwaps = numpy.array(columns.get("vwap_sum"), dtype=float) / numpy.maximum(numpy.array(columns.get("count"), dtype=float), 1)
+    return history.PriceHistory(ticker,
+                                numpy.array(columns.get("utc_datetime"), dtype="datetime64[us]"),
+                                closes,
+                                closes.copy(),
+                                numpy.array(columns.get("high"), dtype=float),
+                                numpy.array(columns.get("low"), dtype=float),
+                                vwaps)
@@ -0,0 +1,130 @@
+"""BitBot streaming price ingestion module."""
+import assistant
+import constants
+import datetime
+import json
+import logger
+import numpy
+import time
+import websocket
+from db import models
+
+MAXIMUM_RECONNECT_DELAY_SEC = 60
+RECEIVE_TIMEOUT_SEC = 10
+TICK_COLUMNS = ["timestamp", "ask", "bid", "high", "low", "vwap"]
+
+class TickBuffer:
+    """Object to hold the most recent price ticks of a cryptocurrency in a ring buffer."""
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.ticks = numpy.zeros((capacity, len(TICK_COLUMNS)))
+        self.count = 0  # total ticks appended
+
+    def append(self, timestamp, prices):
+        """Append a price tick, overwriting the oldest tick when full."""
+        self.ticks[self.count % self.capacity] = [timestamp] + [prices.get(column) for column in TICK_COLUMNS[1:]]
+        self.count += 1
+
+    def since(self, position):
+        """Get ticks appended since a position (oldest first)."""
+        position = max(position, self.count - self.capacity)
+        return self.ticks[numpy.arange(position, self.count) % self.capacity]
+
+    @property
+    def latest(self):
+        """Most recent tick."""
+        return self.ticks[(self.count - 1) % self.capacity] if self.count else None
+
+class PriceIngestor:
+    """Object to ingest streaming ticker prices of all supported cryptocurrencies."""
+    def __init__(self, onFlush, url=constants.KRAKEN_WEBSOCKET_URL):
+        self.logger = logger.Logger("PriceIngestor")
+        self.onFlush = onFlush
+        self.url = url
+        self.buffers = {ticker: TickBuffer(constants.INGEST_BUFFER_SIZE) for ticker in constants.SUPPORTED_TICKERS}
+        self.flushedPositions = {ticker: 0 for ticker in constants.SUPPORTED_TICKERS}
+        self.lastFlush = time.monotonic()
+        self.reconnectDelay = 1
+
+        # map websocket pairs back to tickers
+        self.tickers = {constants.KRAKEN_CRYPTO_CONFIGS.get(ticker).get("websocket_pair"): ticker
+                        for ticker in constants.SUPPORTED_TICKERS}
+
+    def run(self):
+        """Ingest prices until interrupted, reconnecting on connection failures."""
+        while True:
+            try:
+                self._stream()
+            except (websocket.WebSocketException, OSError) as err:
+                self.logger.log("price stream disconnected: %s (reconnecting in %is)" % (repr(err), self.reconnectDelay))
+                time.sleep(self.reconnectDelay)
+                self.reconnectDelay = min(self.reconnectDelay * 2, MAXIMUM_RECONNECT_DELAY_SEC)
+
+    def flush(self):
+        """Store downsampled ticks received since the last flush."""
+        snapshots = []
+        for ticker, buffer in self.buffers.items():
+            ticks = buffer.since(self.flushedPositions.get(ticker))
+            self.flushedPositions[ticker] = buffer.count
+
+            # carry the latest tick forward if no new ticks were received
+            if not len(ticks):
+                if buffer.latest is None:
+                    continue
+                ticks = buffer.latest.reshape(1, -1).copy()
+                ticks[0, 0] = time.time()
+
+            # downsample to the last tick of each resolution interval
+            intervals = numpy.floor(ticks[:, 0] / constants.INGEST_RESOLUTION_SEC)
+            isLastOfInterval = numpy.append(intervals[1:] != intervals[:-1], True)
+            for timestamp, ask, bid, high, low, vwap in ticks[isLastOfInterval].tolist():
+                utcDatetime = datetime.datetime.utcfromtimestamp(timestamp)
+                snapshots.append(models.Price(ticker, ask, bid, high, low, vwap, utcDatetime=utcDatetime))
+
+        # hand off snapshots to be stored
+        self.lastFlush = time.monotonic()
+        self.logger.log("flushing %i price snapshots" % len(snapshots))
+        if not snapshots:
+            return
+        try:
+            self.onFlush(snapshots)
+        except Exception as err:
+            self.logger.log("unable to store price snapshots: %s" % repr(err))
+
+    def _stream(self):
+        """Subscribe to the ticker feed and buffer ticks, flushing periodically."""
+        connection = websocket.create_connection(self.url, timeout=RECEIVE_TIMEOUT_SEC)
+        try:
+            connection.send(json.dumps({"event": "subscribe",
+                                        "pair": list(self.tickers.keys()),
+                                        "subscription": {"name": "ticker"}}))
+            self.logger.log("subscribed to %i ticker feeds at %s" % (len(self.tickers), self.url))
+            self.reconnectDelay = 1
+            while True:
+                try:
+                    message = connection.recv()
+                except websocket.WebSocketTimeoutException:
+                    message = None
+                else:
+                    if not message:
+                        raise websocket.WebSocketConnectionClosedException("price stream closed")
+                    try:
+                        self._handle(json.loads(message))
+                    except (AttributeError, IndexError, KeyError, TypeError, ValueError) as err:
+                        self.logger.error("unable to handle price message", fields={"error": repr(err), "message": message[:200]})
+                if time.monotonic() - self.lastFlush >= constants.INGEST_FLUSH_INTERVAL_SEC:
+                    self.flush()
+        finally:
+            connection.close()
+
+    def _handle(self, message):
+        """Buffer a ticker update (events such as heartbeats are dictionaries and ignored).
+
+        Message format: (https://docs.kraken.com/websockets/#message-ticker)
+            [340, {"a": ["9718.5", 1, "1.0"], "b": [...], "h": [...], "l": [...], "p": [...], ...}, "ticker", "XBT/USD"]
+        """
+        if not isinstance(message, list) or len(message) < 4 or message[-2] != "ticker":
+            return
+        ticker = self.tickers.get(message[-1])
+        if ticker:
+            self.buffers.get(ticker).append(time.time(), assistant.parsePrices(message[1]))
@@ -0,0 +1,75 @@
+"""BitBot Kraken API response cache module."""
+import threading
+import time
+
+class _Fetch:
+    """Object to share the result of an in-flight fetch with waiting callers."""
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+class CoalescingCache:
+    """Object to cache a response for a short time and coalesce concurrent fetches.
+
+    Callers arriving while a fetch is in flight wait on that fetch instead of
+    starting their own.
+    """
+    def __init__(self, ttlSec, clock=time.monotonic):
+        self.ttlSec = ttlSec
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.value = None
+        self.expires = None
+        self.inflight = None
+
+        # expose counters for tuning the ttl
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def get(self, fetch):
+        """Get the cached value, fetching it if expired."""
+        with self.lock:
+            if self.expires is not None and self.clock() < self.expires:
+                self.hits += 1
+                return self.value
+
+            # wait on the in-flight fetch if there is one
+            if self.inflight:
+                self.coalesced += 1
+                inflight = self.inflight
+                isLeader = False
+            else:
+                self.misses += 1
+                inflight = self.inflight = _Fetch()
+                isLeader = True
+
+        # fetch and share result with waiting callers
+        if isLeader:
+            try:
+                inflight.value = fetch()
+            except BaseException as err:
+                inflight.error = err
+                raise
+            finally:
+                # release waiting callers even if the fetch was interrupted
+                with self.lock:
+                    if not inflight.error:
+                        self.value = inflight.value
+                        self.expires = self.clock() + self.ttlSec
+                    self.inflight = None
+                inflight.done.set()
+        else:
+            inflight.done.wait()
+
+        # return fetched value
+        if isinstance(inflight.error, Exception):
+            raise inflight.error
+        if inflight.error:
+            raise RuntimeError("in-flight fetch was interrupted")
+        return inflight.value
+
+    def stats(self):
+        """Get cache hit and miss counters."""
+        return {"hits": self.hits, "misses": self.misses, "coalesced": self.coalesced}
@@ -2,14 +2,61 @@
 import constants
 import krakenex
 import math
+import metrics
+import network
+import threading
 import time
-
-kraken = krakenex.API(key=constants.KRAKEN_KEY, secret=constants.KRAKEN_SECRET)
+from concurrent import futures
+from kraken import cache
+from kraken import limiter
+
+class KrakenAPI(krakenex.API):
+    """Krakenex API client with pooled connections, thread-safe requests and strictly increasing nonces across threads."""
+    def __init__(self, key, secret):
+        super().__init__(key=key, secret=secret)
+        self.session = network.getSession()
+        self.nonceLock = threading.Lock()
+        self.lastNonce = 0
+
+    def _nonce(self):
+        """Generate a nonce greater than any previously generated nonce."""
+        with self.nonceLock:
+            self.lastNonce = max(int(1000 * time.time()), self.lastNonce + 1)
+            return self.lastNonce
+
+    def _query(self, urlpath, data, headers=None, timeout=None):
+        """Send a request and decode its response without storing it on the shared client.
+
+        Krakenex stores each response on the client before decoding it, so
+        concurrent requests could read each other's responses.
+        """
+        # send public calls as GET like newer krakenex releases (the pinned 2.1.0 POSTs every call)
+        if "/public/" in urlpath:
+            response = self.session.get(self.uri + urlpath, params=data or {}, headers=headers or {}, timeout=timeout)
+        else:
+            response = self.session.post(self.uri + urlpath, data=data or {}, headers=headers or {}, timeout=timeout)
+        if response.status_code not in (200, 201, 202):
+            response.raise_for_status()
+        return response.json(**self._json_options)
+
+kraken = KrakenAPI(key=constants.KRAKEN_KEY, secret=constants.KRAKEN_SECRET)
 
 DEFAULT_LEVERAGE = 2
+INVALID_NONCE_ERROR = "EAPI:Invalid nonce"
+MAXIMUM_INVALID_NONCE_RETRIES = 3
 MAXIMUM_TRANSACTION_IDS = 50
+RATE_LIMIT_ERROR = "EAPI:Rate limit exceeded"
 TRADE_VALUE_TEMPLATE = "%.{precision}f"
 
+# model kraken public and private API call counters
+_publicRateLimit = constants.KRAKEN_RATE_LIMIT_CONFIGS.get("public")
+_privateRateLimit = constants.KRAKEN_RATE_LIMIT_CONFIGS.get("private").get(constants.KRAKEN_API_TIER)
+publicCallCounter = limiter.CallCounter(_publicRateLimit.get("maximum"), _publicRateLimit.get("decay_per_sec"))
+privateCallCounter = limiter.CallCounter(_privateRateLimit.get("maximum"), _privateRateLimit.get("decay_per_sec"))
+
+# cache current prices briefly to share them between concurrent requests
+priceCache = cache.CoalescingCache(constants.KRAKEN_PRICE_CACHE_TTL_SEC)
+
 ############################
 ##  Prices
 ############################
@@ -30,6 +77,10 @@ def getPrices():
             "o": "9675.60000"
         }
     """
+    return priceCache.get(_fetchPrices)
+
+def _fetchPrices():
+    """Fetch all current prices of all supported cryptocurrencies from Kraken."""
     # gather support crypto asset pairs
     assetPairs = []
     for ticker in constants.SUPPORTED_TICKERS:
@@ -108,19 +159,31 @@ def getOrders(transactionIds):
     orders = {}
 
     # split up into seperate queries if maximum orders exceeded
+    chunks = []
     queriesRequired = math.ceil(len(transactionIds) / MAXIMUM_TRANSACTION_IDS)
     for query in range(queriesRequired):
         startIndex = query * MAXIMUM_TRANSACTION_IDS
         endIndex = (query + 1) * MAXIMUM_TRANSACTION_IDS
+        chunks.append(transactionIds[startIndex:endIndex])
 
-        # query orders and combine results
-        requestData = {"txid": ",".join(transactionIds[startIndex:endIndex])}
-        resp = _executeRequest(kraken.query_private, "QueryOrders", requestData=requestData)
-        orders.update(resp.get("result"))
+    # query orders concurrently (bounded by the private call counter) and combine results in order
+    if len(chunks) > 1:
+        with futures.ThreadPoolExecutor(max_workers=constants.KRAKEN_QUERY_WORKERS) as executor:
+            results = list(executor.map(_queryOrders, chunks))
+    else:
+        results = [_queryOrders(chunk) for chunk in chunks]
+    for result in results:
+        orders.update(result)
 
     # return combined results
     return orders
 
+def _queryOrders(transactionIds):
+    """Query information on a chunk of previously executed orders."""
+    requestData = {"txid": ",".join(transactionIds)}
+    resp = _executeRequest(kraken.query_private, "QueryOrders", requestData=requestData)
+    return resp.get("result")
+
 ############################
 ##  Trading
 ############################
@@ -184,14 +247,22 @@ def sell(ticker, volume, price=None, leverage=None):
 
 def _executeRequest(api, requestName, requestData={}):
     """Execute a request to the Kraken API."""
-    resp = api(requestName, requestData)
-
-    # raise error if necessary
-    if resp.get("error") or "result" not in resp:
-        raise RuntimeError("unable to execute Kraken %s request: %s" % (requestName, resp.get("error")))
-
-    # pause to avoid spamming exchange
-    time.sleep(constants.KRAKEN_API_CALL_INTERVAL_SEC)
-
-    # return response
-    return resp
+    with metrics.span("kraken.%s" % requestName):
+        # wait for call counter budget to avoid spamming exchange
+        callCounter = publicCallCounter if api == kraken.query_public else privateCallCounter
+        for attempt in range(MAXIMUM_INVALID_NONCE_RETRIES + 1):
+            callCounter.acquire(constants.KRAKEN_RATE_LIMIT_CONFIGS.get("costs").get(requestName, 1))
+            resp = api(requestName, dict(requestData))
+
+            # retry if a concurrent request with a greater nonce arrived first (request was rejected)
+            if INVALID_NONCE_ERROR not in resp.get("error", []):
+                break
+
+        # raise error if necessary
+        if resp.get("error") or "result" not in resp:
+            if RATE_LIMIT_ERROR in resp.get("error", []):
+                callCounter.saturate()
+            raise RuntimeError("unable to execute Kraken %s request: %s" % (requestName, resp.get("error")))
+
+        # return response
+        return resp
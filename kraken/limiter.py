@@ -0,0 +1,40 @@
+"""BitBot Kraken API rate limiter module."""
+import threading
+import time
+
+class CallCounter:
+    """Object to model a Kraken API call counter that decays over time.
+
+    Every call increases the counter by its cost and the counter decays at a fixed
+    rate, so calls only block once the counter would exceed its maximum.
+    (https://support.kraken.com/hc/en-us/articles/206548367)
+    """
+    def __init__(self, maximum, decayPerSec, clock=time.monotonic, sleep=time.sleep):
+        self.maximum = maximum
+        self.decayPerSec = decayPerSec
+        self.clock = clock
+        self.sleep = sleep
+        self.count = 0.0
+        self.lock = threading.Lock()
+        self.updated = clock()
+
+    def acquire(self, cost=1):
+        """Wait until a call fits within the counter, then count it."""
+        with self.lock:
+            self._decay()
+            while self.count + cost > self.maximum:
+                self.sleep((self.count + cost - self.maximum) / self.decayPerSec)
+                self._decay()
+            self.count += cost
+
+    def saturate(self):
+        """Fill the counter (e.g. after the exchange reports the limit was exceeded)."""
+        with self.lock:
+            self._decay()
+            self.count = self.maximum
+
+    def _decay(self):
+        """Decay the counter by the time elapsed since the last update."""
+        now = self.clock()
+        self.count = max(0.0, self.count - (now - self.updated) * self.decayPerSec)
+        self.updated = now
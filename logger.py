@@ -1,37 +1,152 @@
 """BitBot logger module."""
+import atexit
+import collections
+import constants
+import datetime
+import json
+import os
+import sys
+import threading
+import time
 
-SEPERATOR = "------------------------------------------------------------------"
-MONEY_EXCHANGE_INDICATOR = "***"
+FLUSH_TIMEOUT_SEC = 5
+FLUSH_POLL_SEC = 0.1
+
+# log levels by name (records below the configured level are discarded at the call site)
+LEVELS = {"debug": 10, "info": 20, "error": 40}
+LEVEL = LEVELS.get(constants.LOG_LEVEL.lower(), LEVELS.get("info"))
+
+class LogWriter:
+    """Object to write queued log records as JSON lines in batches from a background thread.
+
+    Logging never blocks the caller: records are only appended to a queue, and
+    dropped (and counted) while the queue is full or the stream fails. The
+    thread is started lazily in each process, so forked workers write their
+    own records.
+    """
+    def __init__(self, stream=None):
+        self.stream = stream
+        self.lock = threading.Lock()
+        self.pid = None
+        self.thread = None
+        self.records = collections.deque()
+        self.dropped = 0
+        self.wakeup = threading.Event()
+        self.written = threading.Condition()
+        self.writing = False
+
+    def write(self, record):
+        """Queue a record to be written."""
+        if self.pid != os.getpid():
+            self._start()
+        if len(self.records) >= constants.LOG_QUEUE_SIZE:
+            self.dropped += 1
+            return
+        self.records.append(record)
+        if not self.wakeup.is_set():
+            self.wakeup.set()
+
+    def flush(self, timeout=FLUSH_TIMEOUT_SEC):
+        """Wait until all queued records are written (returns whether they were written within the timeout)."""
+        if self.pid != os.getpid():
+            return True
+        self.wakeup.set()
+        deadline = time.monotonic() + timeout
+        with self.written:
+            # stop waiting if the writer thread died
+            while (self.records or self.writing) and self.thread.is_alive():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self.written.wait(min(remaining, FLUSH_POLL_SEC))
+        return not self.records
+
+    def _start(self):
+        """Start the writer thread of this process."""
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            self.records.clear()
+            self.dropped = 0
+            self.thread = threading.Thread(target=self._run, name="LogWriter", daemon=True)
+            self.thread.start()
+            self.pid = os.getpid()
+
+    def _run(self):
+        """Write records in batches of all records queued since the last write."""
+        while True:
+            self.wakeup.wait()
+            self.wakeup.clear()
+            with self.written:
+                self.writing = True
+            try:
+                while self.records:
+                    batch = []
+                    while self.records and len(batch) < constants.LOG_BATCH_SIZE:
+                        batch.append(self.records.popleft())
+                    try:
+                        self._writeBatch(batch)
+                    except Exception:
+                        self.dropped += len(batch)  # reported once the stream recovers
+            finally:
+                with self.written:
+                    self.writing = False
+                    self.written.notify_all()
+
+    def _writeBatch(self, batch):
+        """Serialize and write a batch of records, reporting records dropped since the last batch."""
+        dropped = self.dropped
+        if dropped:
+            batch = batch + [_record("Logger", "error", "dropped %i records (queue full or stream failed)" % dropped, None)]
+        lines = [json.dumps(_serialize(record), default=str) for record in batch]
+        stream = self.stream or sys.stdout
+        stream.write("\n".join(lines) + "\n")
+        stream.flush()
+        self.dropped -= dropped
 
 class Logger:
-    """Object to log events to the console."""
+    """Object to log structured events of a component."""
     def __init__(self, componentName):
         self.componentName = componentName
-        self.prefix = "{%s} ::" % self.componentName
-
-    def log(self, text, subcomponents=[], moneyExchanged=False, seperate=False):
-        """Log a message to the console."""
-        # open with seperator
-        if seperate or moneyExchanged:
-            self._seperate()
-
-        # log message with subcomponents
-        message = "%s %s" % (self.prefix, text)
-        if moneyExchanged:
-            message = "%s %s" % (MONEY_EXCHANGE_INDICATOR, message)
-        print(message)
-        for subcomponent in subcomponents:
-            self._logSubcomponent(subcomponent)
-
-        # close with seperator
-        if seperate or moneyExchanged:
-            self._seperate(close=True)
-
-    def _logSubcomponent(self, subcomponent):
-        """Log the subcomponent of a log message."""
-        print("\t%s" % subcomponent)
-
-    def _seperate(self, close=False):
-        """Print log seperator."""
-        template = "%s\n" if close else "\n%s"
-        print(template % SEPERATOR)
+
+    def log(self, text, subcomponents=[], moneyExchanged=False, seperate=False, fields=None):
+        """Log an info message (separators are no longer written; kept for compatibility)."""
+        if LEVEL > LEVELS.get("info"):
+            return
+        if subcomponents or moneyExchanged:
+            fields = dict(fields or {})
+            if subcomponents:
+                fields["subcomponents"] = list(subcomponents)
+            if moneyExchanged:
+                fields["money_exchanged"] = True
+        writer.write(_record(self.componentName, "info", text, fields))
+
+    def debug(self, text, fields=None):
+        """Log a debug message (discarded unless debug logging is enabled)."""
+        if LEVEL > LEVELS.get("debug"):
+            return
+        writer.write(_record(self.componentName, "debug", text, fields))
+
+    def error(self, text, fields=None):
+        """Log an error message."""
+        writer.write(_record(self.componentName, "error", text, fields))
+
+def _record(componentName, level, text, fields):
+    """Create a log record (fields are copied so later changes by the caller are not logged)."""
+    return (time.time(), level, componentName, text, dict(fields) if fields else None)
+
+def _serialize(record):
+    """Convert a log record into its JSON structure (in the writer thread)."""
+    timestamp, level, componentName, text, fields = record
+    structure = {"utc_datetime": datetime.datetime.utcfromtimestamp(timestamp).isoformat(), "level": level,
+                 "component": componentName, "message": text}
+    if fields:
+        structure["fields"] = fields
+    return structure
+
+def flush():
+    """Wait until all logged records are written."""
+    writer.flush()
+
+writer = LogWriter()
+atexit.register(flush)
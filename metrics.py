@@ -0,0 +1,103 @@
+"""BitBot latency metrics module."""
+import bisect
+import functools
+import threading
+import time
+
+# upper bounds of latency histogram buckets in seconds
+LATENCY_BUCKETS_SEC = [0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30]
+METRIC_PREFIX = "bitbot_stage"
+
+class StageStats:
+    """Object to store the latency histogram and counters of a stage."""
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.rows = 0
+        self.seconds = 0.0
+        self.maxSeconds = 0.0
+        self.bucketCounts = [0] * len(LATENCY_BUCKETS_SEC)
+
+class Registry:
+    """Object to aggregate span latencies and counters by stage (shared by all threads of a process)."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stages = {}
+
+    def record(self, stageName, seconds, error=False, rows=0):
+        """Record a call of a stage."""
+        bucket = bisect.bisect_left(LATENCY_BUCKETS_SEC, seconds)
+        with self.lock:
+            stats = self.stages.setdefault(stageName, StageStats())
+            stats.calls += 1
+            stats.errors += 1 if error else 0
+            stats.rows += rows
+            stats.seconds += seconds
+            stats.maxSeconds = max(stats.maxSeconds, seconds)
+            if bucket < len(LATENCY_BUCKETS_SEC):
+                stats.bucketCounts[bucket] += 1
+
+    def summary(self):
+        """Summarize calls, errors, rows read and latency of each stage (slowest total first)."""
+        with self.lock:
+            stages = sorted(self.stages.items(), key=lambda stage: stage[1].seconds, reverse=True)
+            return ["%s: %i calls, %i errors, %i rows, %.3fs total, %.1fms mean, %.1fms max"
+                    % (stageName, stats.calls, stats.errors, stats.rows, stats.seconds,
+                       1000 * stats.seconds / stats.calls, 1000 * stats.maxSeconds)
+                    for stageName, stats in stages]
+
+    def prometheus(self):
+        """Render stage metrics in the Prometheus text exposition format."""
+        lines = ["# HELP %s_duration_seconds Latency of instrumented stages." % METRIC_PREFIX,
+                 "# TYPE %s_duration_seconds histogram" % METRIC_PREFIX]
+        counters = {"errors": [], "rows_read": []}
+        with self.lock:
+            for stageName, stats in sorted(self.stages.items()):
+                label = 'stage="%s"' % stageName.replace("\\", "\\\\").replace('"', '\\"')
+                cumulativeCount = 0
+                for upperBound, count in zip(LATENCY_BUCKETS_SEC, stats.bucketCounts):
+                    cumulativeCount += count
+                    lines.append('%s_duration_seconds_bucket{%s,le="%g"} %i' % (METRIC_PREFIX, label, upperBound, cumulativeCount))
+                lines.append('%s_duration_seconds_bucket{%s,le="+Inf"} %i' % (METRIC_PREFIX, label, stats.calls))
+                lines.append("%s_duration_seconds_sum{%s} %f" % (METRIC_PREFIX, label, stats.seconds))
+                lines.append("%s_duration_seconds_count{%s} %i" % (METRIC_PREFIX, label, stats.calls))
+                counters["errors"].append("%s_errors_total{%s} %i" % (METRIC_PREFIX, label, stats.errors))
+                counters["rows_read"].append("%s_rows_read_total{%s} %i" % (METRIC_PREFIX, label, stats.rows))
+
+        # add counters of all stages
+        for counterName, counterLines in counters.items():
+            lines.append("# HELP %s_%s_total %s of instrumented stages." % (METRIC_PREFIX, counterName, counterName.replace("_", " ").capitalize()))
+            lines.append("# TYPE %s_%s_total counter" % (METRIC_PREFIX, counterName))
+            lines.extend(counterLines)
+        return "\n".join(lines) + "\n"
+
+class Span:
+    """Object to time a stage as a context manager, counting the rows it reads and whether it raised."""
+    def __init__(self, stageName):
+        self.stageName = stageName
+        self.rows = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, errorType, error, traceback):
+        isError = errorType is not None and not issubclass(errorType, GeneratorExit)  # closed streams are not errors
+        registry.record(self.stageName, time.perf_counter() - self.start, error=isError, rows=self.rows)
+        return False
+
+registry = Registry()
+
+def span(stageName):
+    """Time a stage."""
+    return Span(stageName)
+
+def timed(stageName):
+    """Decorate a function to time each call as a stage."""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with Span(stageName):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,50 @@
+"""BitBot pooled HTTP session module."""
+import constants
+import requests
+import threading
+from requests import adapters
+
+_session = None
+_sessionLock = threading.Lock()
+
+class PooledSession(requests.Session):
+    """Object to share keep-alive connection pools between all outbound clients."""
+    def __init__(self):
+        super().__init__()
+        self.headers.update({"User-Agent": "BitBot"})
+        self.headers.update({"Accept-Encoding": "gzip, deflate" if constants.HTTP_COMPRESSION else "identity"})
+        self.timeout = (constants.HTTP_CONNECT_TIMEOUT_SEC, constants.HTTP_READ_TIMEOUT_SEC)
+
+        # size connection pools for concurrent requests to each host
+        self.adapter = adapters.HTTPAdapter(pool_connections=constants.HTTP_POOL_CONNECTIONS,
+                                            pool_maxsize=constants.HTTP_POOL_MAXSIZE)
+        self.mount("https://", self.adapter)
+        self.mount("http://", self.adapter)
+
+    def request(self, method, url, **kwargs):
+        """Send a request with default connect and read timeouts."""
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.timeout
+        return super().request(method, url, **kwargs)
+
+    def connectionStats(self):
+        """Get connection reuse stats of each host."""
+        stats = {}
+        pools = self.adapter.poolmanager.pools
+        for poolKey in pools.keys():
+            pool = pools.get(poolKey)
+            if not pool:
+                continue
+            hostStats = stats.setdefault(pool.host, {"requests": 0, "connections": 0, "reused": 0})
+            hostStats["requests"] += pool.num_requests
+            hostStats["connections"] += pool.num_connections
+            hostStats["reused"] += max(pool.num_requests - pool.num_connections, 0)
+        return stats
+
+def getSession():
+    """Get the shared pooled session."""
+    global _session
+    with _sessionLock:
+        if not _session:
+            _session = PooledSession()
+        return _session
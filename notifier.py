@@ -1,7 +1,7 @@
 """BitBot notifications module."""
 import constants
 import logger
-import requests
+import network
 
 # initialize logger
 logger = logger.Logger("Notifier")
@@ -16,12 +16,12 @@ class Notifier:
         self.logger.log("sending notification via email to %s: %s" % (constants.MY_EMAIL, subject))
 
         # request email notification via mailgun API
-        resp = requests.post(constants.MAILGUN_API_URL + "/messages",
-                             auth=("api", constants.MAILGUN_API_KEY),
-                             data={"from": "BitBot Notifier <bitbotnotifier@%s>" % constants.MAILGUN_DOMAIN,
-                                   "to": [constants.MY_EMAIL],
-                                   "subject": subject,
-                                   "text": body})
+        resp = network.getSession().post(constants.MAILGUN_API_URL + "/messages",
+                                         auth=("api", constants.MAILGUN_API_KEY),
+                                         data={"from": "BitBot Notifier <bitbotnotifier@%s>" % constants.MAILGUN_DOMAIN,
+                                               "to": [constants.MY_EMAIL],
+                                               "subject": subject,
+                                               "text": body})
 
         # log notification status
         if resp.status_code == 200:
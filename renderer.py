@@ -0,0 +1,81 @@
+"""BitBot pre-rendered visualization module."""
+import constants
+import hashlib
+import logger
+import threading
+import time
+from concurrent import futures
+from db import models
+
+class Rendering:
+    """Object to hold a rendered visualization image."""
+    def __init__(self, name, image, versionDatetime, renderedDatetime):
+        self.name = name
+        self.image = image
+        self.version_utc_datetime = versionDatetime
+        self.rendered_utc_datetime = renderedDatetime
+        self.etag = hashlib.sha1(image).hexdigest()
+        self.checked = time.monotonic()  # when the database was last checked for a newer rendering
+
+class Renderer:
+    """Object to render visualizations in the background and serve the latest renderings from memory.
+
+    Renderings are stored in the database so renderings from scheduled snapshot
+    commands are picked up by web workers, which only check for newer renderings
+    once the cached rendering is older than the cache TTL.
+    """
+    def __init__(self, mongodb):
+        self.mongodb = mongodb
+        self.logger = logger.Logger("Renderer")
+        self.renderings = {}
+        self.requests = {}  # latest unrendered (version datetime, visualize) by name
+        self.pending = set()
+        self.lock = threading.Lock()
+        self.executor = futures.ThreadPoolExecutor(max_workers=1)
+
+    def get(self, name):
+        """Get the latest rendering of a visualization (None if never rendered)."""
+        with self.lock:
+            rendering = self.renderings.get(name)
+        if rendering and time.monotonic() - rendering.checked < constants.VISUALIZATION_CACHE_TTL_SEC:
+            return rendering
+
+        # only fetch the image if a newer rendering was stored
+        projection = {"_id": False, "version_utc_datetime": True}
+        versions = self.mongodb.find(models.Visualization.collectionName, filter={"name": name}, projection=projection)
+        if not versions:
+            return None
+        if rendering and rendering.version_utc_datetime >= versions[0].get("version_utc_datetime"):
+            rendering.checked = time.monotonic()
+            return rendering
+        document = self.mongodb.find(models.Visualization.collectionName, filter={"name": name})[0]
+        rendering = Rendering(name, bytes(document.get("image")), document.get("version_utc_datetime"), document.get("utc_datetime"))
+        with self.lock:
+            self.renderings[name] = rendering
+        return rendering
+
+    def render(self, name, versionDatetime, visualize):
+        """Render and store a visualization in the background (replacing older requests not yet rendered)."""
+        with self.lock:
+            self.requests[name] = (versionDatetime, visualize)
+            if name in self.pending:
+                return
+            self.pending.add(name)
+        self.executor.submit(self._render, name)
+
+    def _render(self, name):
+        """Render and store the latest requested versions of a visualization until none are left."""
+        while True:
+            with self.lock:
+                if name not in self.requests:
+                    self.pending.discard(name)
+                    return
+                versionDatetime, visualize = self.requests.pop(name)
+            try:
+                model = models.Visualization(name, visualize(), versionDatetime)
+                self.mongodb.update(model.collectionName, {"name": name}, model.__dict__, upsert=True)
+                with self.lock:
+                    self.renderings[name] = Rendering(name, model.image, versionDatetime, model.utc_datetime)
+                self.logger.log("rendered %s visualization" % name)
+            except Exception as err:
+                self.logger.log("unable to render %s visualization: %s" % (name, repr(err)))
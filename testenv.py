@@ -0,0 +1,20 @@
+"""BitBot test environment module.
+
+Provides defaults for required environment variables so tests and benchmarks
+can run without a configured deployment (run from the repository root).
+"""
+import os
+
+def setDefaults(name):
+    """Set defaults for required environment variables not already set, using a database named after the caller."""
+    os.environ.setdefault("BASE_COST_USD", "10")
+    os.environ.setdefault("DEFAULT_LEVERAGE", "2")
+    os.environ.setdefault("HISTORY_RETENTION_DAYS", "60")
+    os.environ.setdefault("LOOKBACK_DAYS", "14")
+    os.environ.setdefault("MARGIN_LEVEL_MINIMUM", "150")
+    os.environ.setdefault("PERCENT_DEVIATION_OPEN_THRESHOLD", "2.0")
+    os.environ.setdefault("PERCENT_TRAILING_CLOSE_THRESHOLD", "0.02")
+    os.environ.setdefault("KRAKEN_KEY", name)
+    os.environ.setdefault("KRAKEN_SECRET", "c2VjcmV0")
+    os.environ.setdefault("MONGODB_URI", "mongodb://127.0.0.1:27017/bitbot_%s" % name)
+    os.environ.setdefault("LOG_LEVEL", "error")
@@ -0,0 +1,4 @@
+"""BitBot tests package."""
+import testenv
+
+testenv.setDefaults("test")
@@ -0,0 +1,33 @@
+"""Strategy backtester tests."""
+import backtester
+import numpy
+import pytest
+from algos import mean_reversion
+from db import history
+
+START_DATETIME = numpy.datetime64("2020-09-13T00:00", "us")
+
+def _priceHistory(size):
+    """Create a random walk price history with a price every minute."""
+    random = numpy.random.default_rng(7)
+    utcDatetimes = START_DATETIME + numpy.arange(size) * numpy.timedelta64(60, "s")
+    vwaps = 100 + numpy.cumsum(random.normal(0, 0.1, size))
+    mids = vwaps + random.normal(0, 1, size)
+    return history.PriceHistory("BTC", utcDatetimes, mids + 0.05, mids - 0.05, None, None, vwaps)
+
+def test_replay_step_matches_live_analysis():
+    priceHistory = _priceHistory(3 * 24 * 60)
+    standardDeviations = backtester.Backtester({"BTC": priceHistory}, lookbackDays=1)._standardDeviations(priceHistory)
+    for i in [24 * 60, 2 * 24 * 60 + 17, len(priceHistory) - 1]:
+        # live analysis of the current price against the stored lookback window (excluding the current price)
+        isStored = (priceHistory.utc_datetime >= priceHistory.utc_datetime[i] - numpy.timedelta64(1, "D")) & (numpy.arange(len(priceHistory)) < i)
+        storedHistory = history.PriceHistory("BTC", priceHistory.utc_datetime[isStored], priceHistory.ask[isStored],
+                                             priceHistory.bid[isStored], None, None, priceHistory.vwap[isStored])
+        currentPrices = {"ask": priceHistory.ask[i], "bid": priceHistory.bid[i], "vwap": priceHistory.vwap[i]}
+        analysis = mean_reversion.MeanReversion(currentPrices, storedHistory).analyze()
+        assert standardDeviations[i] == pytest.approx(analysis.standard_deviation)
+        assert abs(priceHistory.mid[i] - priceHistory.vwap[i]) / standardDeviations[i] == pytest.approx(analysis.current_percent_deviation)
+
+def test_first_price_has_no_lookback_window():
+    priceHistory = _priceHistory(10)
+    assert backtester.Backtester({"BTC": priceHistory}, lookbackDays=1)._standardDeviations(priceHistory)[0] == 0
@@ -0,0 +1,39 @@
+"""Kraken API response cache tests."""
+import pytest
+import threading
+import time
+from kraken import cache
+
+def test_interrupted_fetch_releases_waiters():
+    coalescingCache = cache.CoalescingCache(60)
+    fetching, release = threading.Event(), threading.Event()
+    waiterErrors = []
+
+    def interruptedFetch():
+        fetching.set()
+        release.wait()
+        raise KeyboardInterrupt()
+
+    def waiter():
+        try:
+            coalescingCache.get(lambda: "unused")
+        except RuntimeError as err:
+            waiterErrors.append(err)
+
+    # leader is interrupted while another caller waits on its fetch
+    leader = threading.Thread(target=lambda: pytest.raises(KeyboardInterrupt, coalescingCache.get, interruptedFetch))
+    leader.start()
+    fetching.wait()
+    waitingThread = threading.Thread(target=waiter)
+    waitingThread.start()
+    while not coalescingCache.coalesced:
+        time.sleep(0.001)
+    release.set()
+    leader.join(5)
+    waitingThread.join(5)
+    assert not waitingThread.is_alive()
+    assert len(waiterErrors) == 1
+
+    # next caller fetches again
+    assert coalescingCache.get(lambda: "price") == "price"
+    assert coalescingCache.stats() == {"hits": 0, "misses": 2, "coalesced": 1}
@@ -0,0 +1,26 @@
+"""Price history fetching tests."""
+import datetime
+import flask
+import metrics
+import types
+from db import db
+from db import history
+
+class FakeCollection:
+    """Object to stand in for the price collection, returning prices grouped into columns by ticker."""
+    def __init__(self, groups):
+        self.groups = groups
+
+    def aggregate(self, pipeline, allowDiskUse=False):
+        return iter(self.groups)
+
+def test_grouped_fetch_counts_prices_read(monkeypatch):
+    monkeypatch.setattr(metrics, "registry", metrics.Registry())
+    now = datetime.datetime.utcnow()
+    groups = [{"_id": ticker, "utc_datetime": [now] * count, "ask": [1.0] * count, "bid": [1.0] * count, "vwap": [1.0] * count}
+              for ticker, count in [("BTC", 3), ("ETH", 5)]]
+    mongodb = db.BitBotDB(flask.Flask(__name__))
+    mongodb.mongo = types.SimpleNamespace(db={"price": FakeCollection(groups)})
+    priceHistories = history.fetchPriceHistories(mongodb, {"BTC": {"$gte": now}, "ETH": {"$gte": now}}, bucketed=False)
+    assert {ticker: len(priceHistory) for ticker, priceHistory in priceHistories.items()} == {"BTC": 3, "ETH": 5}
+    assert metrics.registry.stages.get("mongodb.aggregate.price").rows == 8
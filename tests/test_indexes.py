@@ -0,0 +1,138 @@
+"""Database index tests (query plans are checked against the MongoDB server at MONGODB_TEST_URI, skipped if unavailable)."""
+import constants
+import datetime
+import flask
+import os
+import pymongo
+import pytest
+import types
+from db import buckets
+from db import db
+from db import history
+from db import models
+from db import rollup
+from pymongo import uri_parser
+
+MONGODB_TEST_URI = os.environ.get("MONGODB_TEST_URI", "mongodb://127.0.0.1:27017/bitbot_test")
+PRICE_COUNT = 500
+
+class FakeCollection:
+    """Object to stand in for a collection, recording created and dropped indexes."""
+    def __init__(self, database, name):
+        self.database = database
+        self.name = name
+
+    def create_index(self, keys, **options):
+        if self.name in self.database.conflicts and "expireAfterSeconds" in options:
+            raise pymongo.errors.OperationFailure("index options conflict", code=db.INDEX_OPTIONS_CONFLICT_CODE)
+        self.database.created.append((self.name, keys, options))
+
+    def index_information(self):
+        return {indexName: {} for collectionName, indexName in self.database.existing if collectionName == self.name}
+
+    def drop_index(self, indexName):
+        self.database.dropped.append((self.name, indexName))
+
+class FakeDatabase:
+    """Object to stand in for a database, with TTL indexes of some collections created under other options."""
+    def __init__(self, conflicts=(), existing=()):
+        self.conflicts = conflicts
+        self.existing = existing
+        self.created = []
+        self.dropped = []
+        self.commands = []
+
+    def __getitem__(self, collectionName):
+        return FakeCollection(self, collectionName)
+
+    def command(self, *args, **kwargs):
+        self.commands.append((args, kwargs))
+
+@pytest.fixture(scope="module")
+def mongodb():
+    databaseName = uri_parser.parse_uri(MONGODB_TEST_URI).get("database")
+    if not databaseName or databaseName == constants.MONGODB_NAME:
+        raise RuntimeError("MONGODB_TEST_URI must name a dedicated test database")
+    client = pymongo.MongoClient(MONGODB_TEST_URI, serverSelectionTimeoutMS=1000)
+    try:
+        client.admin.command("ping")
+    except pymongo.errors.PyMongoError:
+        pytest.skip("no MongoDB server at %s" % MONGODB_TEST_URI)
+    client.drop_database(databaseName)
+
+    # store entries so query plans are chosen over data
+    mongodb = db.BitBotDB(flask.Flask(__name__), uri=MONGODB_TEST_URI)
+    mongodb.ensureIndexes()
+    now = datetime.datetime.utcnow()
+    for ticker in constants.SUPPORTED_TICKERS:
+        mongodb.mongo.db["price"].insert_many([models.Price(ticker, 101.0, 99.0, 102.0, 98.0, 100.0, utcDatetime=now - datetime.timedelta(minutes=i)).__dict__
+                                               for i in range(PRICE_COUNT)])
+        for collectionName in [rollup.collectionName(resolution) for resolution in rollup.RESOLUTION_UNITS] + [buckets.COLLECTION_NAME]:
+            mongodb.mongo.db[collectionName].insert_one({"ticker": ticker, "utc_datetime": buckets.bucketDatetime(now)})
+    mongodb.mongo.db["equity"].insert_many([{"equity": 100.0, "utc_datetime": now - datetime.timedelta(hours=i)} for i in range(PRICE_COUNT)])
+    mongodb.mongo.db["visualization"].insert_one(models.Visualization("price_BTC", b"", now).__dict__)
+    yield mongodb
+    client.drop_database(databaseName)
+
+def _indexKeys(collectionName, **options):
+    """Get the key names of the declared index of a collection with options."""
+    return [[key for key, direction in keys] for name, keys, indexOptions in db.INDEXES
+            if name == collectionName and indexOptions == options]
+
+def test_price_index_covers_history_query_fields():
+    priceKeys, = _indexKeys("price")
+    assert priceKeys[:2] == ["ticker", "utc_datetime"]  # equality then range and sort
+    startingDatetime = datetime.datetime.utcnow()
+    queryFilter, querySort, projection = history.priceHistoryQuery("BTC", {"$gte": startingDatetime})
+    assert set(queryFilter) | {querySort[0]} <= set(priceKeys[:2])
+    assert projection.get("_id") is False
+    assert {field for field, included in projection.items() if included} <= set(priceKeys)
+    match, sort, group = history.priceHistoryPipeline({"BTC": {"$gte": startingDatetime}})
+    assert all(set(queryFilter) <= set(priceKeys[:2]) for queryFilter in match.get("$match").get("$or"))
+    assert set(sort.get("$sort")) <= set(priceKeys)
+    assert {accumulator.get("$push").lstrip("$") for field, accumulator in group.get("$group").items() if field != "_id"} <= set(priceKeys)
+
+def test_declared_indexes_expire_with_retention():
+    assert _indexKeys("price", expireAfterSeconds=db.RETENTION_SEC) == [["utc_datetime"]]
+    assert _indexKeys("equity", expireAfterSeconds=db.RETENTION_SEC) == [["utc_datetime"]]
+    assert _indexKeys("position", unique=True) == [["transaction_id"]]
+    for collectionName in [rollup.collectionName(resolution) for resolution in rollup.RESOLUTION_UNITS] + [buckets.COLLECTION_NAME]:
+        assert _indexKeys(collectionName, unique=True) == [["ticker", "utc_datetime"]]
+
+def test_ensure_indexes_updates_expiration_and_drops_superseded_indexes():
+    mongodb = db.BitBotDB(flask.Flask(__name__), uri=MONGODB_TEST_URI)
+    database = FakeDatabase(conflicts=("equity",), existing=db.OBSOLETE_INDEXES)
+    mongodb.mongo = types.SimpleNamespace(db=database)
+    mongodb.ensureIndexes()
+    assert [index for index in database.created if index[0] != "equity"] == [index for index in db.INDEXES if index[0] != "equity"]
+    assert database.commands == [(("collMod", "equity"), {"index": {"keyPattern": {"utc_datetime": constants.MONGODB_SORT_ASC},
+                                                                     "expireAfterSeconds": db.RETENTION_SEC}})]
+    assert database.dropped == db.OBSOLETE_INDEXES
+
+def _assertIndexed(stages, covered=False):
+    """Assert a query plan reads an index without sorting in memory (or fetching documents if covered)."""
+    assert "IXSCAN" in stages, stages
+    assert "COLLSCAN" not in stages and "SORT" not in stages, stages
+    if covered:
+        assert "FETCH" not in stages, stages
+
+def test_price_history_queries_are_covered(mongodb):
+    startingDatetime = datetime.datetime.utcnow() - datetime.timedelta(days=constants.LOOKBACK_DAYS)
+    datetimeFilters = {ticker: {"$gte": startingDatetime} for ticker in constants.SUPPORTED_TICKERS}
+    _assertIndexed(mongodb.explain("price", pipeline=history.priceHistoryPipeline(datetimeFilters)), covered=True)
+    _assertIndexed(mongodb.explain("price", pipeline=history.priceHistoryPipeline({"BTC": {"$gt": startingDatetime}})), covered=True)
+    queryFilter, querySort, projection = history.priceHistoryQuery("BTC", {"$gte": startingDatetime})
+    _assertIndexed(mongodb.explain("price", filter=queryFilter, sort=querySort, projection=projection), covered=True)
+
+def test_history_queries_are_indexed(mongodb):
+    startingDatetime = datetime.datetime.utcnow() - datetime.timedelta(days=constants.LOOKBACK_DAYS)
+    querySort = ("utc_datetime", constants.MONGODB_SORT_ASC)
+    for collectionName in [rollup.collectionName(resolution) for resolution in rollup.RESOLUTION_UNITS] + [buckets.COLLECTION_NAME]:
+        _assertIndexed(mongodb.explain(collectionName, filter={"ticker": "BTC", "utc_datetime": {"$gte": startingDatetime}}, sort=querySort))
+    _assertIndexed(mongodb.explain("equity", filter={"utc_datetime": {"$gte": startingDatetime}}, sort=querySort))
+    _assertIndexed(mongodb.explain("visualization", filter={"name": "price_BTC"}))
+
+def test_superseded_indexes_are_dropped(mongodb):
+    mongodb.mongo.db["price"].create_index([("ticker", constants.MONGODB_SORT_ASC), ("utc_datetime", constants.MONGODB_SORT_ASC)])
+    mongodb.ensureIndexes()
+    assert "ticker_1_utc_datetime_1" not in mongodb.mongo.db["price"].index_information()
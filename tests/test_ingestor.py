@@ -0,0 +1,107 @@
+"""Streaming price ingestion tests."""
+import constants
+import datetime
+import ingestor
+import json
+import pytest
+import types
+import websocket
+
+START_TIMESTAMP = 1600000020.0  # start of a minute
+TICK_INTERVAL_SEC = 20
+
+class FakeClock:
+    """Object to stand in for wall and monotonic clocks, advanced by each received message."""
+    def __init__(self):
+        self.now = START_TIMESTAMP
+
+    def __call__(self):
+        return self.now
+
+class FakeConnection:
+    """Object to stand in for the Kraken websocket, receiving a message every tick interval."""
+    def __init__(self, clock, messages):
+        self.clock = clock
+        self.messages = list(messages)
+        self.sent = []
+        self.closed = False
+
+    def send(self, message):
+        self.sent.append(json.loads(message))
+
+    def recv(self):
+        if not self.messages:
+            return ""
+        self.clock.now += TICK_INTERVAL_SEC
+        message = self.messages.pop(0)
+        return message if isinstance(message, str) else json.dumps(message)
+
+    def close(self):
+        self.closed = True
+
+def _tickerMessage(pair, price):
+    """Create a ticker update of a price."""
+    tickerInfo = {"a": [str(price), 1, "1.0"], "b": [str(price - 1), 1, "1.0"], "h": [str(price), str(price)],
+                  "l": [str(price), str(price)], "p": [str(price), str(price)]}
+    return [340, tickerInfo, "ticker", pair]
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(ingestor, "time", types.SimpleNamespace(time=clock, monotonic=clock, sleep=None))
+    monkeypatch.setattr(constants, "INGEST_BUFFER_SIZE", 8)
+    monkeypatch.setattr(constants, "INGEST_FLUSH_INTERVAL_SEC", 300)
+    monkeypatch.setattr(constants, "INGEST_RESOLUTION_SEC", 60)
+    return clock
+
+def test_tick_buffer_wraps_around():
+    buffer = ingestor.TickBuffer(4)
+    assert buffer.latest is None
+    for timestamp in range(6):
+        buffer.append(timestamp, {"ask": timestamp, "bid": timestamp, "high": timestamp, "low": timestamp, "vwap": timestamp})
+    assert buffer.count == 6
+    assert buffer.latest[0] == 5
+    assert buffer.since(0)[:, 0].tolist() == [2, 3, 4, 5]  # oldest ticks were overwritten
+    assert buffer.since(4)[:, 0].tolist() == [4, 5]
+    assert not len(buffer.since(6))
+
+def test_stream_flushes_downsampled_snapshots(clock, monkeypatch):
+    # heartbeats and unsupported pairs are ignored; BTC ticks outnumber the buffer between flushes
+    messages = [{"event": "heartbeat"}, _tickerMessage("ETH/USD", 200), _tickerMessage("DOGE/USD", 1)]
+    messages += [_tickerMessage("XBT/USD", 1000 + tick) for tick in range(4, 31)]
+    connection = FakeConnection(clock, messages)
+    monkeypatch.setattr(websocket, "create_connection", lambda url, timeout: connection)
+    flushes = []
+    priceIngestor = ingestor.PriceIngestor(flushes.append)
+    with pytest.raises(websocket.WebSocketConnectionClosedException):
+        priceIngestor._stream()
+    assert connection.closed
+    assert connection.sent[0].get("subscription") == {"name": "ticker"}
+    assert len(flushes) == 2
+
+    # first flush keeps the last tick of each minute among the 8 most recent ticks
+    snapshots = {}
+    for snapshot in flushes[0]:
+        snapshots.setdefault(snapshot.ticker, []).append((snapshot.utc_datetime, snapshot.ask))
+    assert snapshots.get("ETH") == [(datetime.datetime.utcfromtimestamp(START_TIMESTAMP + 40), 200)]
+    assert snapshots.get("BTC") == [(datetime.datetime.utcfromtimestamp(START_TIMESTAMP + seconds), 1000 + seconds / TICK_INTERVAL_SEC)
+                                    for seconds in [160, 220, 280, 300]]
+    assert flushes[0][0].bid == flushes[0][0].ask - 1
+
+    # second flush carries the latest ETH price forward to the flush time
+    snapshots = {snapshot.ticker: snapshot for snapshot in flushes[1]}
+    assert snapshots.get("ETH").utc_datetime == datetime.datetime.utcfromtimestamp(clock.now)
+    assert snapshots.get("ETH").ask == 200
+    assert [snapshot.ask for snapshot in flushes[1] if snapshot.ticker == "BTC"] == [1023, 1026, 1029, 1030]
+
+def test_stream_skips_malformed_messages(clock, monkeypatch):
+    # malformed frames are logged and skipped without dropping the connection
+    messages = ["{not json", [340, "prices", "ticker", "XBT/USD"], [340, {"a": ["1000.0"]}, "ticker", "XBT/USD"],
+                [340, {"a": [], "b": [], "h": [], "l": [], "p": []}, "ticker", "XBT/USD"], _tickerMessage("XBT/USD", 1000)]
+    connection = FakeConnection(clock, messages)
+    monkeypatch.setattr(websocket, "create_connection", lambda url, timeout: connection)
+    priceIngestor = ingestor.PriceIngestor(None)
+    with pytest.raises(websocket.WebSocketConnectionClosedException):
+        priceIngestor._stream()
+    assert priceIngestor.buffers.get("BTC").count == 1
+    assert priceIngestor.buffers.get("BTC").latest[1] == 1000
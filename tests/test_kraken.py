@@ -0,0 +1,40 @@
+"""Kraken API wrapper tests."""
+import random
+import time
+from kraken import kraken
+from kraken import limiter
+
+class FakeResponse:
+    """Object to stand in for a requests response (yielding to other threads while it is read)."""
+    def __init__(self, result):
+        self.result = result
+
+    @property
+    def status_code(self):
+        time.sleep(random.random() / 1000)
+        return 200
+
+    def json(self, **kwargs):
+        return {"error": [], "result": self.result}
+
+class FakeSession:
+    """Object to answer QueryOrders requests like Kraken (after a random latency)."""
+    def post(self, url, data=None, headers=None, timeout=None):
+        transactionIds = data.get("txid").split(",")
+        time.sleep(random.random() / 1000)
+        return FakeResponse({transactionId: {"status": "closed", "userref": transactionId}
+                             for transactionId in transactionIds})
+
+def test_concurrent_order_chunks_are_merged(monkeypatch):
+    client = kraken.KrakenAPI(key="test", secret="dGVzdA==")
+    client.session = FakeSession()
+    monkeypatch.setattr(kraken, "kraken", client)
+    monkeypatch.setattr(kraken, "privateCallCounter", limiter.CallCounter(float("inf"), 1))
+    monkeypatch.setattr(kraken.constants, "KRAKEN_QUERY_WORKERS", 8)
+
+    # query enough orders for concurrent chunks (repeated to expose interleaving)
+    transactionIds = ["O%06i-TEST-ORDER0" % i for i in range(8 * kraken.MAXIMUM_TRANSACTION_IDS + 7)]
+    for _ in range(20):
+        orders = kraken.getOrders(transactionIds)
+        assert list(orders.keys()) == transactionIds
+        assert all(order.get("userref") == transactionId for transactionId, order in orders.items())
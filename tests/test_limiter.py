@@ -0,0 +1,65 @@
+"""Kraken API call counter tests."""
+import pytest
+from kraken import kraken
+from kraken import limiter
+
+class FakeClock:
+    """Object to stand in for the monotonic clock, advanced only by fake sleeps."""
+    def __init__(self):
+        self.now = 100.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+def _callCounter(maximum=15, decayPerSec=0.5):
+    clock = FakeClock()
+    return limiter.CallCounter(maximum, decayPerSec, clock=clock, sleep=clock.sleep), clock
+
+def test_counter_decays_over_time():
+    callCounter, clock = _callCounter()
+    for _ in range(10):
+        callCounter.acquire()
+    assert callCounter.count == 10
+    clock.now += 4  # decays 2 calls
+    callCounter.acquire()
+    assert callCounter.count == pytest.approx(9)
+    clock.now += 60  # decays to empty, never below
+    callCounter.acquire(cost=2)
+    assert callCounter.count == pytest.approx(2)
+    assert not clock.sleeps
+
+def test_acquire_blocks_at_limit():
+    callCounter, clock = _callCounter()
+    for _ in range(15):
+        callCounter.acquire()
+    assert not clock.sleeps
+
+    # waits until the counter decays enough for the call
+    callCounter.acquire(cost=2)
+    assert clock.sleeps == [pytest.approx(4)]
+    assert callCounter.count == pytest.approx(15)
+
+def test_zero_cost_calls_never_block():
+    callCounter, clock = _callCounter()
+    callCounter.saturate()
+    callCounter.acquire(cost=0)
+    assert not clock.sleeps
+
+def test_saturate_after_rate_limit_error(monkeypatch):
+    callCounter, clock = _callCounter()
+    monkeypatch.setattr(kraken, "privateCallCounter", callCounter)
+
+    def rateLimited(requestName, requestData):
+        return {"error": [kraken.RATE_LIMIT_ERROR]}
+    with pytest.raises(RuntimeError):
+        kraken._executeRequest(rateLimited, "Balance")
+    assert callCounter.count == 15
+
+    # next call backs off until the counter decays
+    callCounter.acquire()
+    assert clock.sleeps == [pytest.approx(2)]
@@ -0,0 +1,26 @@
+"""Linear regression tests."""
+import numpy
+import pytest
+from algos import linear_regression
+
+def test_rolling_regression_matches_window_fit():
+    random = numpy.random.RandomState(0)
+    timestamps = 1600000000 + numpy.cumsum(random.uniform(30, 90, 400))
+    prices = 100 + numpy.cumsum(random.normal(0, 0.5, 400))
+    rollingRegression = linear_regression.RollingRegression(3600, capacity=8)  # wraps and grows
+    assert rollingRegression.update(timestamps[0], prices[0]) is None
+
+    # update one snapshot (or a few) at a time and compare against a fit of the window
+    i = 1
+    while i < len(timestamps):
+        size = 1 + i % 3
+        analysis = rollingRegression.update(timestamps[i:i + size], prices[i:i + size])
+        latest = min(i + size, len(timestamps)) - 1
+        inWindow = (timestamps >= timestamps[latest] - 3600) & (numpy.arange(len(timestamps)) <= latest)
+        slope, intercept = numpy.polyfit(timestamps[inWindow] - timestamps[0], prices[inWindow], 1)
+        assert analysis.count == inWindow.sum()
+        assert analysis.slope == pytest.approx(slope, rel=1e-6, abs=1e-9)
+        assert analysis.trend_price == pytest.approx(intercept + slope * (timestamps[latest] - timestamps[0]), rel=1e-9)
+        i += size
+    assert rollingRegression.count == inWindow.sum()
+    assert len(rollingRegression.timestamps) < 400
@@ -0,0 +1,60 @@
+"""Structured logger tests."""
+import io
+import json
+import logger
+import pytest
+import time
+
+class BrokenStream:
+    """Object to stand in for a stream that fails on every write."""
+    def write(self, text):
+        raise OSError("stream closed")
+
+    def flush(self):
+        pass
+
+class ExitingStream:
+    """Object to stand in for a stream whose write ends the writing thread."""
+    def write(self, text):
+        raise SystemExit()
+
+def _record(text):
+    return logger._record("Test", "info", text, {"ticker": "BTC"})
+
+def test_flush_writes_queued_records():
+    stream = io.StringIO()
+    writer = logger.LogWriter(stream=stream)
+    for i in range(10):
+        writer.write(_record("record %i" % i))
+    assert writer.flush()
+    lines = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert [line.get("message") for line in lines] == ["record %i" % i for i in range(10)]
+    assert lines[0].get("fields") == {"ticker": "BTC"}
+
+def test_stream_errors_do_not_hang_flush():
+    writer = logger.LogWriter(stream=BrokenStream())
+    writer.write(_record("lost"))
+    start = time.monotonic()
+    assert writer.flush(timeout=2)
+    assert time.monotonic() - start < 1
+    assert writer.thread.is_alive()
+
+    # records dropped while the stream failed are reported once it recovers
+    writer.stream = io.StringIO()
+    writer.write(_record("written"))
+    assert writer.flush()
+    messages = [json.loads(line).get("message") for line in writer.stream.getvalue().splitlines()]
+    assert messages == ["written", "dropped 1 records (queue full or stream failed)"]
+
+@pytest.mark.filterwarnings("ignore::pytest.PytestUnhandledThreadExceptionWarning")
+def test_flush_returns_if_writer_thread_died():
+    writer = logger.LogWriter(stream=ExitingStream())
+    writer.write(_record("exits"))
+    writer.thread.join(2)
+    assert not writer.thread.is_alive()
+
+    # records queued after the writer thread died are reported as unwritten
+    writer.write(_record("unwritten"))
+    start = time.monotonic()
+    assert not writer.flush(timeout=2)
+    assert time.monotonic() - start < 1
@@ -0,0 +1,11 @@
+"""Pooled HTTP session tests."""
+import network
+
+def test_compression_is_requested_by_default():
+    session = network.PooledSession()
+    assert session.headers.get("Accept-Encoding") == "gzip, deflate"
+
+def test_compression_can_be_disabled(monkeypatch):
+    monkeypatch.setattr(network.constants, "HTTP_COMPRESSION", False)
+    session = network.PooledSession()
+    assert session.headers.get("Accept-Encoding") == "identity"
@@ -0,0 +1,39 @@
+"""Pre-rendered visualization tests."""
+import renderer
+import threading
+
+class FakeDB:
+    """Object to stand in for the database, recording stored visualizations."""
+    def __init__(self):
+        self.stored = []
+
+    def update(self, collectionName, filter, update, upsert=False):
+        self.stored.append(update.get("version_utc_datetime"))
+
+def test_render_requested_while_pending_follows_pending_render():
+    mongodb = FakeDB()
+    visualizationRenderer = renderer.Renderer(mongodb)
+    rendering, release = threading.Event(), threading.Event()
+    rendered = []
+
+    def visualize(version):
+        def render():
+            rendering.set()
+            release.wait(5)
+            rendered.append(version)
+            return b"image %i" % version
+        return render
+
+    # newer snapshots arrive while the first render is running
+    visualizationRenderer.render("BTC", 1, visualize(1))
+    rendering.wait(5)
+    visualizationRenderer.render("BTC", 2, visualize(2))
+    visualizationRenderer.render("BTC", 3, visualize(3))
+    release.set()
+    visualizationRenderer.executor.shutdown(wait=True)
+
+    # only the latest pending request is rendered after the running render
+    assert rendered == [1, 3]
+    assert mongodb.stored == [1, 3]
+    assert visualizationRenderer.renderings.get("BTC").image == b"image 3"
+    assert not visualizationRenderer.pending and not visualizationRenderer.requests
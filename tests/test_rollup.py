@@ -0,0 +1,32 @@
+"""Price rollup tests."""
+import datetime
+import numpy
+from db import history
+from db import rollup
+
+def _priceHistory(startingDatetime, endingDatetime, intervalMinutes=20):
+    """Create a price history with a price every interval."""
+    utcDatetimes = numpy.arange(numpy.datetime64(startingDatetime, "us"), numpy.datetime64(endingDatetime, "us"),
+                                numpy.timedelta64(intervalMinutes, "m"))
+    mids = numpy.arange(len(utcDatetimes), dtype=float)
+    return history.PriceHistory("BTC", utcDatetimes, mids + 1, mids - 1, None, None, mids)
+
+def test_first_complete_datetime():
+    assert rollup.firstCompleteDatetime(datetime.datetime(2020, 1, 1, 10, 30), "1h") == datetime.datetime(2020, 1, 1, 11)
+    assert rollup.firstCompleteDatetime(datetime.datetime(2020, 1, 1, 10, 30), "1d") == datetime.datetime(2020, 1, 2)
+    assert rollup.firstCompleteDatetime(datetime.datetime(2020, 1, 1), "1d") == datetime.datetime(2020, 1, 1)
+
+def test_replacement_skips_intervals_before_horizon():
+    priceHistory = _priceHistory(datetime.datetime(2020, 1, 1, 9, 40), datetime.datetime(2020, 1, 3))
+    horizonDatetime = datetime.datetime(2020, 1, 1, 10, 30)
+
+    # hourly rollups start at the first whole hour after the horizon
+    updates = rollup.replacementUpdates(priceHistory, "1h", horizonDatetime)
+    assert updates[0][0].get("utc_datetime") == datetime.datetime(2020, 1, 1, 11)
+    assert all(update.get("$set").get("count") == 3 for _, update in updates)
+
+    # daily rollups skip the partly retained first day
+    updates = rollup.replacementUpdates(priceHistory, "1d", horizonDatetime)
+    assert [filter.get("utc_datetime") for filter, _ in updates] == [datetime.datetime(2020, 1, 2)]
+    assert updates[0][1].get("$set").get("count") == 72
+    assert updates[0][1].get("$set").get("open") == 43
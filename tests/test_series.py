@@ -0,0 +1,54 @@
+"""Series API argument tests."""
+import app
+import datetime
+import json
+import numpy
+import pytest
+
+@pytest.mark.parametrize("value, expected", [("1600000000", datetime.datetime(2020, 9, 13, 12, 26, 40)),
+                                             ("2020-09-13T12:26:40Z", datetime.datetime(2020, 9, 13, 12, 26, 40)),
+                                             ("2020-09-13T14:26:40+02:00", datetime.datetime(2020, 9, 13, 12, 26, 40))])
+def test_parse_datetime_arg(value, expected):
+    with app.app.test_request_context("/?start=%s" % value.replace("+", "%2B")):
+        assert app._parseDatetimeArg("start", None) == expected
+
+@pytest.mark.parametrize("value", ["1e20", "-1e20", "inf", "nan", "0001-01-01T00:00:00%2B01:00", "yesterday"])
+def test_out_of_range_datetimes_are_bad_requests(value):
+    resp = app.app.test_client().get("/api/v1/series/equity?start=%s" % value)
+    assert resp.status_code == 400
+
+@pytest.mark.parametrize("value", ["nan", "inf", "1e20", "1e6", "-5", "0", "week"])
+def test_invalid_lookback_days_are_bad_requests(value):
+    resp = app.app.test_client().get("/api/v1/visualize/BTC?days=%s" % value)
+    assert resp.status_code == 400
+
+def _seriesChunks(timestamps, chunkSize):
+    """Stream a sine wave price series with a cosine VWAP in chunks."""
+    for start in range(0, len(timestamps), chunkSize):
+        chunkTimestamps = timestamps[start:start + chunkSize]
+        yield {"utc_datetime": (chunkTimestamps * 1000000).astype("datetime64[us]"),
+               "price": numpy.sin(chunkTimestamps / 600.0),
+               "vwap": numpy.cos(chunkTimestamps / 600.0)}
+
+def test_series_is_downsampled_while_streaming():
+    timestamps = numpy.arange(1600000000, 1600000000 + 7 * 24 * 3600, 60, dtype="int64")
+    startingDatetime = datetime.datetime.utcfromtimestamp(int(timestamps[0]))
+    endingDatetime = datetime.datetime.utcfromtimestamp(int(timestamps[-1]) + 60)
+    lines = list(app._seriesLines(_seriesChunks(timestamps, 1000), "price", 101, startingDatetime, endingDatetime))
+    assert len(lines) == 1
+    points = [json.loads(line) for line in lines[0].splitlines()]
+
+    # each bucket keeps its lowest and highest price
+    assert len(points) == 100
+    assert [point.get("utc_datetime") for point in points] == sorted(point.get("utc_datetime") for point in points)
+    assert min(point.get("price") for point in points) == pytest.approx(-1, abs=1e-3)
+    assert max(point.get("price") for point in points) == pytest.approx(1, abs=1e-3)
+    for point in points:
+        timestamp = datetime.datetime.fromisoformat(point.get("utc_datetime")).replace(tzinfo=datetime.timezone.utc).timestamp()
+        assert point.get("vwap") == pytest.approx(numpy.cos(timestamp / 600.0))
+
+def test_downsampling_skips_missing_values():
+    chunk = {"utc_datetime": numpy.array(["2020-09-13T12:00", "2020-09-13T12:01", "2020-09-13T12:02"], dtype="datetime64[us]"),
+             "equity": numpy.array([numpy.nan, 2.0, 1.0])}
+    lines = list(app._seriesLines(iter([chunk]), "equity", 4, datetime.datetime(2020, 9, 13, 12), datetime.datetime(2020, 9, 13, 12, 3)))
+    assert [json.loads(line).get("equity") for line in lines[0].splitlines()] == [2.0, 1.0]
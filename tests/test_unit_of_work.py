@@ -0,0 +1,69 @@
+"""Database unit of work tests."""
+import pymongo
+import pytest
+import types
+from db import db
+from db import models
+
+class FakeCollection:
+    """Object to stand in for a collection, optionally dropping its connection on the first bulk write or rejecting inserts."""
+    def __init__(self, failures=0, rejectInserts=False):
+        self.failures = failures
+        self.rejectInserts = rejectInserts
+        self.written = []
+
+    def bulk_write(self, requests, ordered=True):
+        if self.failures:
+            self.failures -= 1
+            raise pymongo.errors.AutoReconnect("connection reset")
+        if self.rejectInserts:
+            writeErrors = [{"index": index, "errmsg": "duplicate key"} for index, request in enumerate(requests)
+                           if isinstance(request, pymongo.InsertOne)]
+            raise pymongo.errors.BulkWriteError({"writeErrors": writeErrors, "nInserted": 0, "nModified": 0, "nUpserted": 0,
+                                                 "nRemoved": len(requests) - len(writeErrors)})
+        self.written.extend(requests)
+        return types.SimpleNamespace(inserted_count=0, modified_count=0, upserted_count=len(requests), deleted_count=0)
+
+def test_flush_keeps_operations_of_unwritten_collections():
+    collections = {"position": FakeCollection(failures=1), "price_deviation": FakeCollection()}
+    unitOfWork = db.UnitOfWork(types.SimpleNamespace(mongo=types.SimpleNamespace(db=collections)))
+    unitOfWork.update("position", {"transaction_id": "A"}, {"actionable_price": 1.0})
+    unitOfWork.update("price_deviation", {"ticker": "BTC"}, {"count": 2}, upsert=True)
+
+    # other collections are written and the failed collection is reported
+    with pytest.raises(RuntimeError) as err:
+        unitOfWork.flush()
+    assert "price_deviation" in str(err.value) and "AutoReconnect" in str(err.value)
+    assert len(collections.get("price_deviation").written) == 1
+    assert list(unitOfWork.operations.keys()) == ["position"]
+
+    # kept operations are written by the next flush
+    assert unitOfWork.flush() == []
+    assert collections.get("position").written == [pymongo.UpdateOne({"transaction_id": "A"}, {"$set": {"actionable_price": 1.0}}, upsert=False)]
+    assert len(collections.get("price_deviation").written) == 1
+    assert not unitOfWork.operations
+
+def _unitOfWork(collections):
+    """Create a unit of work writing to fake collections."""
+    return db.UnitOfWork(types.SimpleNamespace(mongo=types.SimpleNamespace(db=collections)))
+
+def test_exit_keeps_failed_writes():
+    unitOfWork = _unitOfWork({"position": FakeCollection(rejectInserts=True)})
+    with unitOfWork:
+        unitOfWork.delete("position", {"transaction_id": "A"})
+        unitOfWork.insert(models.Position("BTC", "B", "buy 1 XBTUSD @ market"))
+    assert [(collectionName, description.startswith("insert"), error) for collectionName, description, error in unitOfWork.failures] == \
+        [("position", True, "duplicate key")]
+
+def test_exit_does_not_mask_errors_of_the_block():
+    collections = {"position": FakeCollection(failures=1), "price_deviation": FakeCollection()}
+    unitOfWork = _unitOfWork(collections)
+    with pytest.raises(KeyError):
+        with unitOfWork:
+            unitOfWork.update("position", {"transaction_id": "A"}, {"actionable_price": 1.0})
+            unitOfWork.update("price_deviation", {"ticker": "BTC"}, {"count": 2}, upsert=True)
+            raise KeyError("BTC")
+
+    # writes recorded before the error are still attempted
+    assert len(collections.get("price_deviation").written) == 1
+    assert list(unitOfWork.operations.keys()) == ["position"]
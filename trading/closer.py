@@ -25,8 +25,7 @@ class Closer(trader.BitBotTrader):
         # return approval
         _approval = thresholdMet or meanReverted
         if _approval:
-            self.logger.log(self.analysis.__dict__)
-            self.logger.log("%s close approved!" % self.ticker)
+            self.logger.log("%s close approved!" % self.ticker, fields=self.analysis.__dict__)
         return _approval
 
     ############################
@@ -49,7 +48,7 @@ class Closer(trader.BitBotTrader):
                                            price=self.analysis.current_price,
                                            leverage=self.analysis.leverage)
         except Exception as err:
-            self.logger.log("unable to close %s position: %s" % (self.ticker, str(err)))
+            self.logger.error("unable to close %s position: %s" % (self.ticker, str(err)))
             return None, None, None
 
         # return order confirmation if trade was successful
@@ -17,8 +17,7 @@ class Opener(trader.BitBotTrader):
 
         # return approval
         if _approval:
-            self.logger.log(self.analysis.__dict__)
-            self.logger.log("%s position approved!" % self.ticker)
+            self.logger.log("%s position approved!" % self.ticker, fields=self.analysis.__dict__)
         return _approval
 
     ############################
@@ -53,7 +52,7 @@ class Opener(trader.BitBotTrader):
                                            volume=volume,
                                            leverage=leverage)
         except Exception as err:
-            self.logger.log("unable to open %s position: %s" % (self.ticker, str(err)))
+            self.logger.error("unable to open %s position: %s" % (self.ticker, str(err)))
             return None, None
 
         # return order confirmation if trade was successful
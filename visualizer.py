@@ -1,116 +1,167 @@
 """BitBot data visualization module."""
 import constants
 import datetime
+import io
 import math
-import matplotlib
 import numpy
-from matplotlib import pyplot
+import threading
+from concurrent import futures
+from matplotlib import figure
+from matplotlib.backends import backend_agg
 from algos import mean_reversion
 
 CHROME_IMAGE_BACKGROUND_COLOR_HEX = "#0e0e0e"
+FIGURE_DPI = 100
+FIGURE_SIZE_INCHES = (6.4, 4.8)
 SECONDS_IN_DAY = 3600 * 24
 
-# ensure Flask doesn't try to create GUI windows
-matplotlib.use("Agg")
+# downsample series to one point per horizontal pixel
+DOWNSAMPLE_POINTS = int(FIGURE_SIZE_INCHES[0] * FIGURE_DPI)
+
+# dark theme applied to every figure
+STYLE = {"background": CHROME_IMAGE_BACKGROUND_COLOR_HEX,
+         "text": "lightgrey",
+         "grid": {"color": "silver", "linestyle": "--", "linewidth": 0.65, "alpha": 0.2}}
+
+_renderPool = None
+_renderPoolLock = threading.Lock()
 
 def visualizeEquity(currentEquity, currentBalanceUSD, equityHistory):
-    """Generate a visualization of account equity balance."""
+    """Generate a .png visualization of account equity balance."""
     # aggregate data
     balanceUSD, equity, timestamps = [], [], []
     for entry in equityHistory:
-        balanceUSD.append([entry.get("usd_balance")])
-        equity.append([entry.get("equity")])
-        timestamps.append([entry.get("utc_datetime").timestamp()])
+        balanceUSD.append(entry.get("usd_balance"))
+        equity.append(entry.get("equity"))
+        timestamps.append(entry.get("utc_datetime").timestamp())
 
     # add current valuations
-    balanceUSD.append([currentBalanceUSD])
-    equity.append([currentEquity])
-    timestamps.append([datetime.datetime.utcnow().timestamp()])
-
-    # reset visualization
-    _reset()
+    balanceUSD.append(currentBalanceUSD)
+    equity.append(currentEquity)
+    timestamps.append(datetime.datetime.utcnow().timestamp())
 
-    # generate historical equity balance visualization
-    pyplot.title("Account History")
-    pyplot.ylabel("Value ($)")
-    pyplot.xlabel("Time (days)")
+    # downsample equity history
+    timestamps, equity, balanceUSD = numpy.array(timestamps), numpy.array(equity), numpy.array(balanceUSD)
+    indices = downsample(timestamps, equity, DOWNSAMPLE_POINTS)
+    timestamps = timestamps[indices]
 
     # plot equity history
-    pyplot.plot(timestamps, equity, color="cornflowerblue", linewidth=2.5, label="Equity ($%.2f)" % currentEquity)
-    pyplot.plot(timestamps, balanceUSD, color="darkorange", label="USD Balance ($%.2f)" % currentBalanceUSD)
-
-    # add day ticks to the x-axis
-    _tick(timestamps)
-
-    # render visualization
-    return _render()
+    series = [(timestamps, equity[indices], {"color": "cornflowerblue", "linewidth": 2.5, "label": "Equity ($%.2f)" % currentEquity}),
+              (timestamps, balanceUSD[indices], {"color": "darkorange", "label": "USD Balance ($%.2f)" % currentBalanceUSD})]
+    return _draw("Account History", "Value ($)", series)
 
 def visualizePrice(ticker, currentPrices, priceHistory):
-    """Generate a visualization of cryptocurrency price analysis."""
+    """Generate a .png visualization of cryptocurrency price analysis."""
     # analyze price data
     meanReversion = mean_reversion.MeanReversion(currentPrices, priceHistory)
-    analysis = meanReversion.analyze()
+    meanReversion.analyze()
     currentPrice = meanReversion.currentPrice
     currentVWAP = meanReversion.currentVWAP
 
     # aggregate metrics
-    prices, vwaps, timestamps = [], [], []
-    for entry in priceHistory:
-        vwaps.append([entry.get("vwap")])
-        prices.append([meanReversion.calculatePrice(entry)])
-        timestamps.append([entry.get("utc_datetime").timestamp()])
-    vwaps.append([currentVWAP])
-    prices.append([currentPrice])
-    timestamps.append([datetime.datetime.utcnow().timestamp()])
-
-    # clear any previous visualizations
-    _reset()
-
-    # generate historical price visualization
+    vwaps = numpy.append(priceHistory.vwap, currentVWAP)
+    prices = numpy.append(priceHistory.mid, currentPrice)
+    timestamps = numpy.append(priceHistory.timestamps, datetime.datetime.utcnow().timestamp())
+
+    # downsample all series to the points that preserve the shape of the price history
+    indices = downsample(timestamps, prices, DOWNSAMPLE_POINTS)
+    timestamps = timestamps[indices]
+
+    # plot bollinger bands, then price history with VWAP
+    series = [(timestamps, meanReversion.upperBollinger[indices], {"color": "red", "linewidth": 1.25, "alpha": 0.5, "label": "Bollinger (+/- %.1f SD)" % constants.PERCENT_DEVIATION_OPEN_THRESHOLD}),
+              (timestamps, meanReversion.lowerBollinger[indices], {"color": "red", "linewidth": 1.25, "alpha": 0.5}),
+              (timestamps, prices[indices], {"color": "cornflowerblue", "linewidth": 1.5, "label": "Price ($%.3f)" % currentPrice}),
+              (timestamps, vwaps[indices], {"color": "darkorange", "linewidth": 1.5, "label": "VWAP ($%.3f)" % currentVWAP})]
     name = constants.KRAKEN_CRYPTO_CONFIGS.get(ticker).get("name")
-    pyplot.title("%s History" % name)
-    pyplot.ylabel("Price ($)")
-    pyplot.xlabel("Time (days)")
-
-    # plot bollinger bands
-    pyplot.plot(timestamps, meanReversion.upperBollinger, color="red", linewidth=1.25, alpha=0.5, label="Bollinger (+/- %.1f SD)" % constants.PERCENT_DEVIATION_OPEN_THRESHOLD)
-    pyplot.plot(timestamps, meanReversion.lowerBollinger, color="red", linewidth=1.25, alpha=0.5)
-
-    # plot price history with VWAP and trend line
-    pyplot.plot(timestamps, prices, color="cornflowerblue", linewidth=1.5, label=("Price ($%.3f)" % currentPrice))
-    pyplot.plot(timestamps, vwaps, color="darkorange", linewidth=1.5, label="VWAP ($%.3f)" % currentVWAP)
-
-    # add day ticks to the x-axis
-    _tick(timestamps)
+    return _draw("%s History" % name, "Price ($)", series)
+
+def downsample(x, y, threshold):
+    """Select indices of the points that best preserve the shape of a series.
+
+    Uses largest triangle three buckets: the first and last points are kept and
+    one point is kept per bucket in between, chosen to form the largest triangle
+    with the previously kept point and the average of the next bucket.
+    (https://skemman.is/bitstream/1946/15343/3/SS_MSthesis.pdf)
+    """
+    size = len(x)
+    if threshold < 3 or size <= threshold:
+        return numpy.arange(size)
+    edges = numpy.linspace(1, size - 1, threshold - 1).astype(int)
+    indices = numpy.zeros(threshold, dtype=int)
+    indices[-1] = size - 1
+    selected = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+
+        # average the next bucket (the last point follows the final bucket)
+        if bucket + 2 < len(edges):
+            nextStart, nextEnd = edges[bucket + 1], edges[bucket + 2]
+            averageX, averageY = x[nextStart:nextEnd].mean(), y[nextStart:nextEnd].mean()
+        else:
+            averageX, averageY = x[-1], y[-1]
+
+        # keep the point forming the largest triangle
+        areas = numpy.abs((x[selected] - averageX) * (y[start:end] - y[selected])
+                          - (x[selected] - x[start:end]) * (averageY - y[selected]))
+        selected = start + int(numpy.argmax(areas))
+        indices[bucket + 1] = selected
+    return indices
+
+def _draw(title, ylabel, series):
+    """Render a chart in the render pool if configured, otherwise in the calling thread."""
+    if constants.VISUALIZER_RENDER_WORKERS:
+        return _getRenderPool().submit(_render, title, ylabel, series).result()
+    return _render(title, ylabel, series)
+
+def _getRenderPool():
+    """Get the shared render worker pool."""
+    global _renderPool
+    with _renderPoolLock:
+        if not _renderPool:
+            _renderPool = futures.ProcessPoolExecutor(max_workers=constants.VISUALIZER_RENDER_WORKERS)
+        return _renderPool
+
+def _render(title, ylabel, series):
+    """Render .png image of a chart on its own figure (safe to call concurrently)."""
+    _figure = figure.Figure(figsize=FIGURE_SIZE_INCHES, dpi=FIGURE_DPI)
+    canvas = backend_agg.FigureCanvasAgg(_figure)
+    axes = _figure.add_subplot(1, 1, 1)
+    _style(_figure, axes)
+
+    # plot series
+    axes.set_title(title)
+    axes.set_ylabel(ylabel)
+    axes.set_xlabel("Time (days)")
+    for x, y, options in series:
+        axes.plot(x, y, **options)
+
+    # add day ticks to the x-axis and legend
+    _tick(axes, series[0][0][0])
+    legend = axes.legend(facecolor=STYLE.get("background"), edgecolor=STYLE.get("background"))
+    for text in legend.get_texts():
+        text.set_color(STYLE.get("text"))
 
     # render visualization
-    return _render()
-
-def _render():
-    """Render .png image from visualization."""
-    pyplot.legend()
-    figure = pyplot.gcf()
-    figure.patch.set_facecolor(CHROME_IMAGE_BACKGROUND_COLOR_HEX)  # dark theme
-    return matplotlib.backends.backend_agg.FigureCanvasAgg(figure)
-
-def _reset():
-    """Clear visualization and set dark theme."""
-    pyplot.clf()
-    pyplot.cla()
-    pyplot.close()
-    pyplot.rc("text", color="lightgrey")
-    pyplot.rc("axes", facecolor=CHROME_IMAGE_BACKGROUND_COLOR_HEX)
-    pyplot.rc("axes", edgecolor=CHROME_IMAGE_BACKGROUND_COLOR_HEX)
-    pyplot.rc("axes", labelcolor="lightgrey")
-    pyplot.rc("xtick", color="lightgrey")
-    pyplot.rc("ytick", color="lightgrey")
-    pyplot.grid(color="silver", linestyle="--", linewidth=0.65, alpha=0.2)
-
-def _tick(timestamps):
+    image = io.BytesIO()
+    canvas.print_png(image)
+    return image.getvalue()
+
+def _style(_figure, axes):
+    """Apply the dark theme to a figure."""
+    _figure.patch.set_facecolor(STYLE.get("background"))
+    axes.set_facecolor(STYLE.get("background"))
+    for spine in axes.spines.values():
+        spine.set_edgecolor(STYLE.get("background"))
+    axes.title.set_color(STYLE.get("text"))
+    axes.xaxis.label.set_color(STYLE.get("text"))
+    axes.yaxis.label.set_color(STYLE.get("text"))
+    axes.tick_params(colors=STYLE.get("text"))
+    axes.grid(**STYLE.get("grid"))
+
+def _tick(axes, startingTimestamp):
     """Add ticks for time on the x-axis."""
     # set x-axis ticks to incrementing days
     labels = []
-    startingTimestamp = timestamps[0][0]
     currentTimestamp = datetime.datetime.utcnow().timestamp()
     ticks = numpy.arange(startingTimestamp, currentTimestamp, step=(SECONDS_IN_DAY * 2))  # two day steps
     for tickTimestamp in ticks:
@@ -121,4 +172,5 @@ def _tick(timestamps):
     ticks = numpy.append(ticks, currentTimestamp)
     currentDaysFromStart = (currentTimestamp - startingTimestamp) / SECONDS_IN_DAY
     labels.append("%i" % math.ceil(currentDaysFromStart))
-    pyplot.xticks(ticks, labels)
+    axes.set_xticks(ticks)
+    axes.set_xticklabels(labels)